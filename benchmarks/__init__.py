@@ -0,0 +1,13 @@
+"""
+Offline benchmarks for the bot's hot paths.
+
+Synthetic Discord channels and a stub LLM replace the live services, so the
+numbers only depend on our code and the configured simulated latencies.
+
+    python -m benchmarks run [stages...]
+    python -m benchmarks compare <base-commit> <head-commit>
+"""
+import os
+
+# Offline: use litellm's bundled model cost map instead of fetching it on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
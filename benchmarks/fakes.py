@@ -0,0 +1,337 @@
+"""Synthetic Discord sources and stub LLMs for offline benchmarks."""
+import asyncio
+import bisect
+import datetime
+import io
+import math
+import random
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from discord.utils import snowflake_time, time_snowflake
+
+from bot.services.discord.domain import DiscordPost
+from bot.services.llm.repository import LLMRepository
+from bot.services.llm.scheduler import Priority
+
+# Discord returns at most 100 messages per history request
+HISTORY_PAGE_SIZE = 100
+
+_WORDS = (
+    "release", "deploy", "review", "anime", "episode", "plan", "meeting", "bug", "fix", "idea",
+    "today", "tomorrow", "schedule", "design", "draft", "feedback", "test", "music", "game", "lunch",
+    "今日", "明日", "作業", "確認", "進捗", "レビュー", "アニメ", "リリース", "ありがとう", "よろしく",
+)
+
+
+@dataclass
+class FakeAuthor:
+    display_name: str
+    bot: bool = False
+
+
+@dataclass
+class FakeAttachment:
+    url: str
+    filename: str
+    size: int
+
+
+@dataclass
+class FakeMessage:
+    id: int
+    author: FakeAuthor
+    content: str
+    attachments: List[FakeAttachment] = field(default_factory=list)
+
+    @property
+    def created_at(self) -> datetime.datetime:
+        return snowflake_time(self.id)
+
+
+class FakeSource:
+    """
+    A channel or thread whose `history` pages like the Discord API.
+
+    Every page of up to 100 messages costs `latency` seconds.
+    """
+
+    def __init__(self, source_id: int, name: str, messages: List[FakeMessage], latency: float = 0.0):
+        self.id = source_id
+        self.name = name
+        self.latency = latency
+        self.messages = sorted(messages, key=lambda m: m.id)
+        self._ids = [m.id for m in self.messages]
+        self.last_message_id = self._ids[-1] if self._ids else None
+        self.requests = 0
+
+    async def history(
+        self,
+        limit: Optional[int] = 100,
+        after=None,
+        before=None,
+        oldest_first: bool = True
+    ) -> AsyncIterator[FakeMessage]:
+        low = bisect.bisect_right(self._ids, _to_snowflake(after, high=True)) if after is not None else 0
+        high = bisect.bisect_left(self._ids, _to_snowflake(before)) if before is not None else len(self._ids)
+        window = self.messages[low:high] if oldest_first else self.messages[low:high][::-1]
+        if limit is not None:
+            window = window[:limit]
+        for start in range(0, max(len(window), 1), HISTORY_PAGE_SIZE):
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for message in window[start:start + HISTORY_PAGE_SIZE]:
+                yield message
+
+
+class FakeThread(FakeSource):
+    @property
+    def archive_timestamp(self) -> datetime.datetime:
+        # Threads are archived after their last message (creation if empty)
+        return snowflake_time(self.last_message_id or self.id)
+
+
+class FakeChannel(FakeSource):
+    """A text channel with active threads (`threads`) and archived ones (`archived_threads`)."""
+
+    def __init__(self, *args, threads: List[FakeThread] = (), archived: List[FakeThread] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = list(threads)
+        self.archived = list(archived)
+
+    async def archived_threads(
+        self,
+        limit: Optional[int] = 100,
+        before=None,
+        private: bool = False,
+        joined: bool = False
+    ) -> AsyncIterator[FakeThread]:
+        """Archived threads, most recently archived first, one request per page of 100."""
+        threads = sorted(self.archived, key=lambda thread: thread.archive_timestamp, reverse=True)
+        if limit is not None:
+            threads = threads[:limit]
+        for start in range(0, max(len(threads), 1), HISTORY_PAGE_SIZE):
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            for thread in threads[start:start + HISTORY_PAGE_SIZE]:
+                yield thread
+
+
+@dataclass
+class ChannelSpec:
+    """Shape of a synthetic channel."""
+    threads: int = 10
+    archived_threads: int = 5
+    # Extra threads (half active, half archived) whose messages all predate the window
+    inactive_threads: int = 0
+    messages_per_source: int = 500
+    attachments_per_message: float = 0.1  # Average, drawn per message
+    bot_ratio: float = 0.05
+    authors: int = 50
+    window_hours: float = 24.0
+    latency: float = 0.0  # Per history page
+    seed: int = 0
+
+
+def make_channel(spec: ChannelSpec, end: Optional[datetime.datetime] = None) -> FakeChannel:
+    """Build a reproducible channel whose messages are spread over the last `window_hours`."""
+    rng = random.Random(spec.seed)
+    end = end or datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    start = end - datetime.timedelta(hours=spec.window_hours)
+    bot_author = FakeAuthor("anisecord", bot=True)
+    used_ids = set()
+
+    def messages(window_start: datetime.datetime = start) -> List[FakeMessage]:
+        result = []
+        for _ in range(spec.messages_per_source):
+            posted_at = window_start + datetime.timedelta(seconds=rng.uniform(0, spec.window_hours * 3600))
+            message_id = time_snowflake(posted_at) + rng.randrange(1 << 22)
+            while message_id in used_ids:
+                message_id += 1
+            used_ids.add(message_id)
+            # A fresh author and name string per message, as discord.py decodes them from each payload
+            author = bot_author if rng.random() < spec.bot_ratio else FakeAuthor(f"user{rng.randrange(spec.authors):03d}")
+            attachments = [
+                FakeAttachment(
+                    url=f"https://cdn.discordapp.com/attachments/{message_id}/{index}/photo{index}.jpg",
+                    filename=f"photo{index}.jpg",
+                    size=rng.randrange(100_000, 4_000_000)
+                )
+                for index in range(_poisson(rng, spec.attachments_per_message))
+            ]
+            result.append(FakeMessage(message_id, author, _sentence(rng), attachments))
+        return result
+
+    def source_id(window_start: datetime.datetime = start) -> int:
+        return time_snowflake(window_start) - rng.randrange(1, 1 << 40)
+
+    threads = [
+        FakeThread(source_id(), f"thread-{index}", messages(), latency=spec.latency)
+        for index in range(spec.threads)
+    ]
+    archived = [
+        FakeThread(source_id(), f"archived-{index}", messages(), latency=spec.latency)
+        for index in range(spec.archived_threads)
+    ]
+    earlier = start - datetime.timedelta(hours=spec.window_hours)
+    inactive = [
+        FakeThread(source_id(earlier), f"inactive-{index}", messages(earlier), latency=spec.latency)
+        for index in range(spec.inactive_threads)
+    ]
+    threads += inactive[::2]
+    archived += inactive[1::2]
+    return FakeChannel(source_id(), "general", messages(), latency=spec.latency, threads=threads, archived=archived)
+
+
+def make_messages(count: int, spec: ChannelSpec) -> List[FakeMessage]:
+    """Build `count` messages shaped by `spec` (authors, attachments, bots), oldest first."""
+    return make_channel(ChannelSpec(
+        threads=0,
+        archived_threads=0,
+        messages_per_source=count,
+        attachments_per_message=spec.attachments_per_message,
+        bot_ratio=spec.bot_ratio,
+        authors=spec.authors,
+        window_hours=spec.window_hours,
+        seed=spec.seed
+    )).messages
+
+
+def make_posts(count: int, seed: int = 0, threads: int = 10) -> List[DiscordPost]:
+    """Build `count` posts directly (no fetch), oldest first."""
+    rng = random.Random(seed)
+    started = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    posts = []
+    for index in range(count):
+        thread = rng.randrange(threads + 1)
+        posts.append(DiscordPost(
+            author_name=f"user{rng.randrange(50):03d}",
+            content=_sentence(rng),
+            posted_at=started + datetime.timedelta(seconds=index * 10),
+            message_id=str(1_000_000 + index),
+            thread_name=f"thread-{thread}" if thread else None
+        ))
+    return posts
+
+
+def make_jpeg(width: int, height: int, seed: int = 0, quality: int = 92) -> bytes:
+    """Photo-sized JPEG with gradients and noise (compresses like a real photo, not like a flat image)."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    noise = Image.effect_noise((width, height), 40 + rng.randrange(20))
+    gradient = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (noise, gradient, gradient.transpose(Image.Transpose.ROTATE_90).resize((width, height))))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class StubLLMRepository(LLMRepository):
+    """LLMRepository that answers locally after `latency` seconds, without any provider call."""
+
+    def __init__(self, latency: float = 0.5, output_chars: int = 800, chunk_chars: int = 40):
+        super().__init__(model_name="stub/benchmark", api_key="")
+        self.latency = latency
+        self.output_chars = output_chars
+        self.chunk_chars = chunk_chars
+        self.calls = 0
+
+    async def generate_content(
+        self,
+        input_content,
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        response_format: Optional[Dict[str, Any]] = None,
+        cacheable: Optional[Callable[[str], bool]] = None
+    ) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return self._output()
+
+    async def stream_content(
+        self,
+        input_content,
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> AsyncIterator[str]:
+        self.calls += 1
+        output = self._output()
+        chunks = max(1, len(output) // self.chunk_chars)
+        for index in range(chunks):
+            await asyncio.sleep(self.latency / chunks)
+            yield output[index * self.chunk_chars:(index + 1) * self.chunk_chars if index < chunks - 1 else None]
+
+    def _output(self) -> str:
+        return ("summary " * (self.output_chars // 8 + 1))[:self.output_chars]
+
+
+@dataclass
+class LatencyProfile:
+    """Latency of a stub model: `latency` seconds, or `tail_latency` for a `tail_fraction` of the calls."""
+    latency: float = 0.2
+    tail_latency: float = 2.0
+    tail_fraction: float = 0.05
+
+
+class StubCompletion:
+    """
+    Stand-in for `litellm.acompletion` (the `completion` backend of LLMRepository),
+    answering after a latency drawn from the model's profile. Streams deliver
+    their first chunk after that latency, then the rest without delay.
+    """
+
+    def __init__(self, profiles: Dict[str, LatencyProfile], output_chars: int = 800, chunk_chars: int = 40, seed: int = 0):
+        self.profiles = profiles
+        self.output_chars = output_chars
+        self.chunk_chars = chunk_chars
+        self.calls: Dict[str, int] = {}
+        self.cancelled = 0
+        self._rng = random.Random(seed)
+
+    async def __call__(self, model: str, messages: list, stream: bool = False, **kwargs):
+        self.calls[model] = self.calls.get(model, 0) + 1
+        profile = self.profiles[model]
+        latency = profile.tail_latency if self._rng.random() < profile.tail_fraction else profile.latency
+        output = ("summary " * (self.output_chars // 8 + 1))[:self.output_chars]
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=self.output_chars // 4)
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=output))], usage=usage)
+        return self._stream(output, usage)
+
+    async def _stream(self, output: str, usage) -> AsyncIterator[SimpleNamespace]:
+        for start in range(0, len(output), self.chunk_chars):
+            delta = SimpleNamespace(content=output[start:start + self.chunk_chars])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            await asyncio.sleep(0)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+def _sentence(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(3, 40)))
+
+
+def _poisson(rng: random.Random, mean: float) -> int:
+    """Small Poisson sample (Knuth), enough for attachment counts."""
+    if mean <= 0:
+        return 0
+    limit = math.exp(-mean)
+    count, product = 0, rng.random()
+    while product > limit:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+def _to_snowflake(value, high: bool = False) -> int:
+    if isinstance(value, datetime.datetime):
+        return time_snowflake(value, high=high)
+    return value.id
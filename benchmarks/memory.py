@@ -0,0 +1,87 @@
+"""
+Memory of a history window: bytes per post with the compact DiscordPost
+versus the previous layout (plain frozen dataclass, list of attachment URLs,
+one name string per post).
+
+    python -m benchmarks.memory [--posts 50000]
+"""
+import argparse
+import datetime
+import gc
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+from bot.services.discord.repository import DiscordRepository
+from .fakes import ChannelSpec, FakeAuthor, FakeMessage, make_messages
+
+
+@dataclass(frozen=True)
+class LegacyDiscordPost:
+    """DiscordPost as it was before the compact layout, kept as the reference."""
+    author_name: str
+    content: str
+    posted_at: datetime.datetime
+    message_id: str
+    thread_name: Optional[str] = None
+    attachment_urls: List[str] = field(default_factory=list)
+
+
+def _legacy_post(message: FakeMessage, thread_name: str = None) -> LegacyDiscordPost:
+    return LegacyDiscordPost(
+        author_name=message.author.display_name,
+        content=message.content,
+        posted_at=message.created_at,
+        message_id=str(message.id),
+        thread_name=thread_name,
+        attachment_urls=[a.url for a in message.attachments]
+    )
+
+
+def _decoded(message: FakeMessage) -> FakeMessage:
+    """Copy of a message with freshly decoded strings, like discord.py builds one per payload."""
+    return FakeMessage(
+        message.id,
+        FakeAuthor(message.author.display_name.encode().decode()),
+        message.content.encode().decode(),
+        message.attachments
+    )
+
+
+def retained_bytes(convert: Callable[[FakeMessage], object], messages: List[FakeMessage]) -> int:
+    """Bytes still allocated after converting every message (then dropped) and keeping the results."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        posts = [convert(_decoded(message)) for message in messages]
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del posts
+    return after - before
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory", description=__doc__)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--attachments", type=float, default=0.1, help="Average attachments per message")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    messages = make_messages(args.posts, ChannelSpec(attachments_per_message=args.attachments, bot_ratio=0, seed=args.seed))
+    repository = DiscordRepository()
+    layouts = {
+        "legacy": lambda message: _legacy_post(message, thread_name="general"),
+        "compact": lambda message: repository._to_discord_post(message, thread_name="general"),
+    }
+    results = {name: retained_bytes(convert, messages) for name, convert in layouts.items()}
+
+    for name, total in results.items():
+        print(f"{name:<8} {total / (1024 * 1024):8.1f}MiB  {total / len(messages):6.0f} B/post")
+    saved = results["legacy"] - results["compact"]
+    print(f"saved    {saved / (1024 * 1024):8.1f}MiB  ({saved / results['legacy']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
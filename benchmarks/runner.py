@@ -0,0 +1,258 @@
+"""Run benchmark stages, store results per commit and compare runs."""
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .fakes import ChannelSpec
+from .stages import STAGES, BenchmarkConfig, Stage
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Relative change beyond which `compare` flags a metric
+REGRESSION_THRESHOLD = 0.10
+
+
+@dataclass
+class StageResult:
+    """Measurements of one stage."""
+    iterations: int
+    items: int
+    throughput: float      # Items per second
+    p50: float             # Seconds per iteration
+    p99: float
+    mean: float
+    peak_memory_bytes: int  # tracemalloc peak of one extra iteration
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def measure(stage: Stage, config: BenchmarkConfig, iterations: int, warmup: int = 1) -> StageResult:
+    """Time `iterations` runs of a stage, then measure its peak memory in a separate traced run."""
+    state = await stage.setup(config)
+    try:
+        with _quiet():
+            for _ in range(warmup):
+                await stage.run(state)
+
+            durations = []
+            items = 0
+            for _ in range(iterations):
+                started = time.perf_counter()
+                items += await stage.run(state)
+                durations.append(time.perf_counter() - started)
+
+            # Traced separately: tracemalloc slows allocations down too much to time with it on
+            tracemalloc.start()
+            try:
+                await stage.run(state)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+    finally:
+        stage.teardown(state)
+
+    total = sum(durations)
+    return StageResult(
+        iterations=iterations,
+        items=items,
+        throughput=items / total if total else 0.0,
+        p50=percentile(durations, 0.50),
+        p99=percentile(durations, 0.99),
+        mean=statistics.fmean(durations),
+        peak_memory_bytes=peak
+    )
+
+
+async def run_stages(
+    names: List[str],
+    config: BenchmarkConfig,
+    iterations: int,
+    warmup: int
+) -> tuple[Dict[str, StageResult], Dict[str, str]]:
+    """Measure each stage. Returns the results and the error of every stage that raised."""
+    results = {}
+    failures = {}
+    for name in names:
+        print(f"Running {name}: {STAGES[name].description}")
+        try:
+            results[name] = await measure(STAGES[name], config, iterations, warmup)
+        except Exception as e:
+            failures[name] = f"{type(e).__name__}: {e}"
+            print(f"  FAILED: {failures[name]}")
+            continue
+        print(f"  {_format_result(results[name])}")
+    return results, failures
+
+
+def save_results(results: Dict[str, StageResult], config: BenchmarkConfig, path: Optional[Path] = None) -> Path:
+    """Write a run to `results/<commit>.json` (a `-dirty` suffix marks uncommitted changes)."""
+    commit, dirty = _git_revision()
+    path = path or RESULTS_DIR / f"{commit}{'-dirty' if dirty else ''}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "commit": commit,
+        "dirty": dirty,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": dataclasses.asdict(config),
+        "stages": {name: dataclasses.asdict(result) for name, result in results.items()},
+    }
+    path.write_text(json.dumps(payload, indent=2, ensure_ascii=False) + "\n")
+    return path
+
+
+def load_results(reference: str) -> dict:
+    """Load a run by file path or commit prefix."""
+    path = Path(reference)
+    if not path.exists():
+        matches = sorted(RESULTS_DIR.glob(f"{reference}*.json"))
+        if not matches:
+            raise FileNotFoundError(f"No results for {reference!r} in {RESULTS_DIR}")
+        path = matches[-1]
+    return json.loads(path.read_text())
+
+
+def compare(base: dict, head: dict) -> List[str]:
+    """Describe per-stage changes from `base` to `head`, flagging regressions and stages missing from `head`."""
+    lines = [f"{base['commit']} -> {head['commit']}"]
+    if base["config"] != head["config"]:
+        lines.append("warning: the runs used different workloads; numbers are not comparable")
+
+    # (field, higher is better)
+    fields = [("throughput", True), ("p50", False), ("p99", False), ("peak_memory_bytes", False)]
+    for name in sorted(set(base["stages"]) | set(head["stages"])):
+        before, after = base["stages"].get(name), head["stages"].get(name)
+        if before is None:
+            lines.append(f"{name}: only in head")
+            continue
+        if after is None:
+            # A stage that stopped running (or failed) is not a non-regression
+            lines.append(f"{name}: only in base  MISSING")
+            continue
+        lines.append(f"{name}:")
+        for field_name, higher_is_better in fields:
+            old, new = before[field_name], after[field_name]
+            change = (new - old) / old if old else 0.0
+            worse = change < -REGRESSION_THRESHOLD if higher_is_better else change > REGRESSION_THRESHOLD
+            flag = "  REGRESSION" if worse else ""
+            lines.append(f"  {field_name:<18} {_format_value(field_name, old):>12} -> {_format_value(field_name, new):>12} ({change:+.1%}){flag}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    run = subcommands.add_parser("run", help="Run stages and store the results for the current commit")
+    run.add_argument("stages", nargs="*", default=list(STAGES), help=f"Stages to run (default: all of {', '.join(STAGES)})")
+    run.add_argument("--iterations", type=int, default=10)
+    run.add_argument("--warmup", type=int, default=1)
+    run.add_argument("--threads", type=int, default=10, help="Active threads in the synthetic channel")
+    run.add_argument("--archived-threads", type=int, default=5)
+    run.add_argument("--inactive-threads", type=int, default=0, help="Extra threads with no messages in the window")
+    run.add_argument("--messages", type=int, default=500, help="Messages per channel/thread")
+    run.add_argument("--attachments", type=float, default=0.1, help="Average attachments per message")
+    run.add_argument("--discord-latency", type=float, default=0.0, help="Seconds per history page")
+    run.add_argument("--posts", type=int, default=5000, help="Posts used by the prompt stages")
+    run.add_argument("--chunk-tokens", type=int, default=30000)
+    run.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per stub LLM call")
+    run.add_argument("--llm-tail-latency", type=float, default=2.0, help="Seconds of a slow stub LLM call")
+    run.add_argument("--llm-tail-fraction", type=float, default=0.05, help="Share of slow stub LLM calls")
+    run.add_argument("--images", type=int, default=3)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--output", type=Path, help="Result file (default: results/<commit>.json)")
+    run.add_argument("--no-save", action="store_true")
+
+    diff = subcommands.add_parser("compare", help="Compare two stored runs (commit prefixes or paths)")
+    diff.add_argument("base")
+    diff.add_argument("head")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        lines = compare(load_results(args.base), load_results(args.head))
+        print("\n".join(lines))
+        sys.exit(1 if any(line.endswith(("REGRESSION", "MISSING")) for line in lines) else 0)
+
+    unknown = [name for name in args.stages if name not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+
+    config = BenchmarkConfig(
+        channel=ChannelSpec(
+            threads=args.threads,
+            archived_threads=args.archived_threads,
+            inactive_threads=args.inactive_threads,
+            messages_per_source=args.messages,
+            attachments_per_message=args.attachments,
+            latency=args.discord_latency,
+            seed=args.seed
+        ),
+        posts=args.posts,
+        chunk_tokens=args.chunk_tokens,
+        llm_latency=args.llm_latency,
+        llm_tail_latency=args.llm_tail_latency,
+        llm_tail_fraction=args.llm_tail_fraction,
+        images=args.images
+    )
+    results, failures = asyncio.run(run_stages(args.stages, config, args.iterations, args.warmup))
+    if failures:
+        # Never store a partial run: it would become a baseline missing the broken stages
+        print(f"{len(failures)} stage(s) failed: {', '.join(failures)}; results not saved")
+        sys.exit(1)
+    if not args.no_save and results:
+        print(f"Saved {save_results(results, config, args.output)}")
+
+
+def _format_result(result: StageResult) -> str:
+    return (
+        f"{result.throughput:,.0f} items/s  p50 {result.p50 * 1000:.1f}ms  p99 {result.p99 * 1000:.1f}ms  "
+        f"peak {result.peak_memory_bytes / (1024 * 1024):.1f}MiB"
+    )
+
+
+def _format_value(field_name: str, value: float) -> str:
+    if field_name == "peak_memory_bytes":
+        return f"{value / (1024 * 1024):.1f}MiB"
+    if field_name == "throughput":
+        return f"{value:,.0f}/s"
+    return f"{value * 1000:.1f}ms"
+
+
+def _git_revision() -> tuple[str, bool]:
+    root = Path(__file__).resolve().parent.parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", True
+    return commit, dirty
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silence the pipeline's progress prints while measuring."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
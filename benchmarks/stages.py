@@ -0,0 +1,195 @@
+"""Pipeline stages measured by the benchmark runner."""
+import asyncio
+import base64
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict
+
+from bot.features.sns_x.compaction import ChatLogEncoder
+from bot.features.sns_x.domain import SnsXDomain
+from bot.features.sns_x.summarizer import SnsXSummarizer
+from bot.services.discord.repository import DiscordRepository
+from bot.services.llm.image import Image, preprocess_images
+from bot.services.llm.latency import LatencyTracker
+from bot.services.llm.repository import LLMRepository
+from bot.services.llm.routing import RoutingPolicy
+from .fakes import (
+    ChannelSpec,
+    LatencyProfile,
+    StubCompletion,
+    StubLLMRepository,
+    make_channel,
+    make_jpeg,
+    make_messages,
+    make_posts,
+)
+
+
+@dataclass
+class BenchmarkConfig:
+    """Workload shared by every stage. Stored with the results, so runs are only compared like for like."""
+    channel: ChannelSpec = field(default_factory=ChannelSpec)
+    fetch_concurrency: int = 4
+    posts: int = 5000
+    chunk_tokens: int = 30000
+    llm_latency: float = 0.2
+    llm_tail_latency: float = 2.0   # Slow outliers of the LLM call stages
+    llm_tail_fraction: float = 0.05
+    llm_calls: int = 20             # Concurrent calls per iteration of the LLM call stages
+    images: int = 3
+    image_width: int = 3024
+    image_height: int = 4032
+    image_workers: int = 2
+
+
+@dataclass
+class Stage:
+    """
+    One measured step.
+
+    `setup` builds the inputs once (not measured); `run` is measured and
+    returns the number of items it processed (for throughput).
+    """
+    name: str
+    description: str
+    setup: Callable[[BenchmarkConfig], Awaitable[Any]]
+    run: Callable[[Any], Awaitable[int]]
+    teardown: Callable[[Any], None] = lambda state: None
+
+
+async def _setup_fetch(config: BenchmarkConfig):
+    channel = make_channel(config.channel)
+    end = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+    return channel, end - datetime.timedelta(hours=config.channel.window_hours), config.fetch_concurrency
+
+
+async def _run_fetch(state) -> int:
+    channel, after, concurrency = state
+    posts = await DiscordRepository(max_concurrency=concurrency).fetch_messages(channel, after=after)
+    return len(posts)
+
+
+async def _setup_posts(config: BenchmarkConfig):
+    return make_posts(config.posts, seed=config.channel.seed), config
+
+
+async def _run_draft_prompt(state) -> int:
+    posts, _ = state
+    SnsXDomain.create_draft_prompt(posts, persona="benchmark persona", language="ja")
+    return len(posts)
+
+
+async def _run_compacted_draft_prompt(state) -> int:
+    posts, _ = state
+    SnsXDomain.create_draft_prompt(posts, persona="benchmark persona", language="ja", encoder=ChatLogEncoder())
+    return len(posts)
+
+
+async def _run_map_reduce(state) -> int:
+    posts, config = state
+    summarizer = SnsXSummarizer(StubLLMRepository(latency=config.llm_latency), chunk_tokens=config.chunk_tokens)
+    await summarizer.prepare_draft_prompt(posts, persona="benchmark persona", language="ja")
+    return len(posts)
+
+
+async def _setup_conversion(config: BenchmarkConfig):
+    return make_messages(config.posts, config.channel), DiscordRepository()
+
+
+async def _run_conversion(state) -> int:
+    messages, repository = state
+    # Kept alive until the end of the run, so the peak includes every post
+    posts = [repository._to_discord_post(message, thread_name="thread-0") for message in messages]
+    return len(posts)
+
+
+async def _setup_meal(config: BenchmarkConfig):
+    if Image is None:
+        raise RuntimeError('Pillow is required for this stage (pip install "anisecord[image]")')
+    images = [
+        (make_jpeg(config.image_width, config.image_height, seed=index), "image/jpeg")
+        for index in range(config.images)
+    ]
+    return images, ThreadPoolExecutor(max_workers=config.image_workers)
+
+
+async def _run_meal(state) -> int:
+    images, executor = state
+    processed = await preprocess_images(images, executor=executor)
+    urls = [f"data:{image.content_type};base64,{base64.b64encode(image.data).decode('utf-8')}" for image in processed]
+    return len(urls)
+
+
+async def _setup_llm_calls(config: BenchmarkConfig, hedge: bool = False):
+    profile = LatencyProfile(config.llm_latency, config.llm_tail_latency, config.llm_tail_fraction)
+    completion = StubCompletion({"stub/primary": profile, "stub/hedge": profile}, seed=config.channel.seed)
+    latency = LatencyTracker()
+    repository = LLMRepository(
+        model_name="stub/primary",
+        api_key="",
+        routing=RoutingPolicy(hedge_model="stub/hedge" if hedge else None, hedge_min_delay=0.0),
+        latency=latency,
+        completion=completion
+    )
+    # Fill the latency window, so hedging is active from the first measured iteration
+    while latency.count("stub/primary") < latency.min_samples:
+        await asyncio.gather(*(repository.generate_content("warmup") for _ in range(config.llm_calls)))
+    return repository, config.llm_calls
+
+
+async def _setup_llm_calls_hedged(config: BenchmarkConfig):
+    return await _setup_llm_calls(config, hedge=True)
+
+
+async def _run_llm_calls(state) -> int:
+    repository, calls = state
+    await asyncio.gather(*(repository.generate_content(f"prompt {index}") for index in range(calls)))
+    return calls
+
+
+STAGES: Dict[str, Stage] = {
+    stage.name: stage for stage in (
+        Stage(
+            "fetch_messages",
+            "DiscordRepository.fetch_messages over a synthetic channel and its threads",
+            _setup_fetch, _run_fetch
+        ),
+        Stage(
+            "create_draft_prompt",
+            "SnsXDomain.create_draft_prompt over pre-built posts",
+            _setup_posts, _run_draft_prompt
+        ),
+        Stage(
+            "create_draft_prompt_compacted",
+            "Same prompt with the chat log compacted by ChatLogEncoder",
+            _setup_posts, _run_compacted_draft_prompt
+        ),
+        Stage(
+            "prepare_draft_prompt",
+            "SnsXSummarizer map-reduce with a stub LLM",
+            _setup_posts, _run_map_reduce
+        ),
+        Stage(
+            "discord_posts",
+            "Converting fetched messages to DiscordPost and keeping them alive (peak = window memory)",
+            _setup_conversion, _run_conversion
+        ),
+        Stage(
+            "meal_encode",
+            "/meal image preprocessing and base64 encoding",
+            _setup_meal, _run_meal,
+            teardown=lambda state: state[1].shutdown()
+        ),
+        Stage(
+            "llm_calls",
+            "Concurrent LLMRepository calls against a stub backend with slow outliers",
+            _setup_llm_calls, _run_llm_calls
+        ),
+        Stage(
+            "llm_calls_hedged",
+            "Same calls, hedged to a second stub model past the p95 latency",
+            _setup_llm_calls_hedged, _run_llm_calls
+        ),
+    )
+}
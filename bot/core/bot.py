@@ -1,16 +1,44 @@
+import time
+_IMPORT_STARTED = time.perf_counter() # Startup is timed from before the imports below
+
+import asyncio
+import importlib
+import math
 import os
+import httpx
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
 from discord import Intents, Interaction, app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 
-from bot.core.health_server import start_health_server
+from bot.core import metrics
+from bot.core.startup import StartupTimer, command_tree_fingerprint, load_fingerprint, save_fingerprint
+from bot.services.discord.store import MessageStore
+from bot.services.llm.cache import ResponseCache
+from bot.services.llm.prompt_cache import PromptCacheTracker
+from bot.services.llm.latency import LatencyTracker
+from bot.services.llm.repository import prewarm as prewarm_llm
+from bot.services.llm.routing import RoutingPolicy
+from bot.services.llm.scheduler import LLMScheduler
 
 from bot.core.user.decorators import handle_permission_error
+from bot.core.user.repository import UserRepository
+
+_IMPORTS_DONE = time.perf_counter()
 
 class AnisecordBot(commands.Bot):
     """Anisecord Discord Bot with Extension support."""
     
-    def __init__(self):
+    def __init__(self, **options):
+        """
+        Args:
+            **options: Extra client options (e.g. `shard_ids`, `shard_count`).
+        """
+        self.startup = StartupTimer(started=_IMPORT_STARTED)
+        self.startup.record("imports", _IMPORTS_DONE - _IMPORT_STARTED)
+        init_started = time.perf_counter()
+
         # Load environment variables
         load_dotenv()
         
@@ -18,16 +46,160 @@ class AnisecordBot(commands.Bot):
         self.token = os.environ.get("DISCORD_BOT_TOKEN")
         self.gemini_api_key = os.environ.get("GEMINI_API_KEY")
         self.port = int(os.environ.get("PORT", 8080))
+        # "loop": health server runs on the bot's event loop (started in setup_hook)
+        # "thread": separate thread started before the bot connects
+        self.health_server_mode = os.environ.get("HEALTH_SERVER_MODE", "loop")
+        self.health_server = None
+        self._health_server_task = None
+
+        # Command tree sync is skipped while the registered commands match the stored fingerprint
+        self.command_fingerprint_path = os.environ.get("COMMAND_TREE_FINGERPRINT_PATH", ".command_tree_fingerprint")
+        self.force_command_sync = os.environ.get("FORCE_COMMAND_SYNC", "").lower() in ("1", "true", "yes")
+        # Commands are global: in a cluster only one process syncs them
+        self.command_sync_enabled = os.environ.get("COMMAND_SYNC", "on").lower() != "off"
+        self._ready_once = False
+        self._prewarm_task = None
+        self.discord_fetch_concurrency = int(os.environ.get("DISCORD_FETCH_CONCURRENCY", 4))
+
+        # SNS-X budgets: history reading stops once either is reached
+        self.snsx_max_messages = int(os.environ.get("SNSX_MAX_MESSAGES", 5000))
+        self.snsx_max_prompt_tokens = int(os.environ.get("SNSX_MAX_PROMPT_TOKENS", 200000))
+        # Larger logs are summarized chunk by chunk (map-reduce)
+        self.snsx_chunk_tokens = int(os.environ.get("SNSX_CHUNK_TOKENS", 30000))
+        self.snsx_summary_concurrency = int(os.environ.get("SNSX_SUMMARY_CONCURRENCY", 4))
+        # Chat logs are compacted before prompting (grouped, short replies and repeats
+        # folded, long messages cut); over SNSX_COMPACT_MAX_TOKENS the log is thinned
+        # instead of summarized chunk by chunk (0 disables the budget)
+        self.snsx_compaction = os.environ.get("SNSX_COMPACTION", "on").lower() != "off"
+        self.snsx_compact_max_message_chars = int(os.environ.get("SNSX_COMPACT_MAX_MESSAGE_CHARS", 400))
+        self.snsx_compact_max_tokens = int(os.environ.get("SNSX_COMPACT_MAX_TOKENS", 0)) or None
+        # Seconds a finished draft is reused by identical requests
+        self.snsx_coalesce_ttl = float(os.environ.get("SNSX_COALESCE_TTL_SECONDS", 30))
+        # Multi-channel drafts: SNSX_MAX_MESSAGES is shared by all channels, and the
+        # whole fetch stops after this many seconds
+        self.snsx_max_channels = int(os.environ.get("SNSX_MAX_CHANNELS", 25))
+        self.snsx_fetch_timeout = float(os.environ.get("SNSX_FETCH_TIMEOUT_SECONDS", 60)) or None
+        # Opt-in background digests: these channels are summarized bucket by bucket
+        # during the day, so /sns-x-today only summarizes the latest partial bucket
+        self.snsx_digest_channel_ids = [
+            int(channel_id) for channel_id in os.environ.get("SNSX_DIGEST_CHANNEL_IDS", "").split(",") if channel_id.strip()
+        ]
+        self.snsx_digest_bucket_minutes = int(os.environ.get("SNSX_DIGEST_BUCKET_MINUTES", 60))
+        self.snsx_digest_store_path = os.environ.get("SNSX_DIGEST_STORE_PATH", ":memory:")
+        self.snsx_digest_language = os.environ.get("SNSX_DIGEST_LANGUAGE", "ja")
+
+        # User settings store shared by feature checks and cogs
+        self.user_repository = UserRepository(
+            path=os.environ.get("USER_DB_PATH", ":memory:"),
+            cache_ttl=float(os.environ.get("USER_CACHE_TTL_SECONDS", 300))
+        )
+
+        # Optional local message store (SQLite) shared by features reading channel history
+        message_store_path = os.environ.get("DISCORD_MESSAGE_STORE_PATH")
+        self.message_store = MessageStore(message_store_path) if message_store_path else None
+
+        # LLM response cache (memory tier always on, disk tier if a path is set)
+        self.llm_cache = ResponseCache(
+            max_entries=int(os.environ.get("LLM_CACHE_MAX_ENTRIES", 256)),
+            ttl=float(os.environ.get("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60)),
+            path=os.environ.get("LLM_CACHE_PATH")
+        )
+
+        # Process-wide LLM scheduler shared by every feature (rate limits unset = disabled)
+        self.llm_scheduler = LLMScheduler(
+            max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", 4)),
+            requests_per_minute=float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 0)) or None,
+            tokens_per_minute=float(os.environ.get("LLM_TOKENS_PER_MINUTE", 0)) or None
+        )
+
+        # LLM model of every feature; prompts up to LLM_SMALL_PROMPT_TOKENS go to LLM_SMALL_MODEL (unset = disabled)
+        self.llm_model = os.environ.get("LLM_MODEL", "gemini/gemini-2.5-flash")
+        # Hedging: an interactive call slower than its model's LLM_HEDGE_PERCENTILE latency
+        # is sent again to LLM_HEDGE_MODEL (unset = disabled); the first answer wins
+        self.llm_routing = RoutingPolicy(
+            small_model=os.environ.get("LLM_SMALL_MODEL") or None,
+            small_prompt_tokens=int(os.environ.get("LLM_SMALL_PROMPT_TOKENS", 2000)),
+            hedge_model=os.environ.get("LLM_HEDGE_MODEL") or None,
+            hedge_percentile=float(os.environ.get("LLM_HEDGE_PERCENTILE", 0.95)),
+            hedge_min_delay=float(os.environ.get("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0))
+        )
+        # Recent latencies per model behind the hedging delays (no hedging before LLM_HEDGE_MIN_SAMPLES)
+        self.llm_latency = LatencyTracker(
+            window=int(os.environ.get("LLM_LATENCY_WINDOW", 200)),
+            min_samples=int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+        )
+        # Share of prompt tokens the provider served from its implicit prefix cache
+        self.llm_prompt_cache = PromptCacheTracker()
+
+        # Min seconds between progressive edits of a streamed response
+        self.discord_edit_interval = float(os.environ.get("DISCORD_EDIT_INTERVAL_SECONDS", 1.0))
+
+        # Shared HTTP client (connection pooling + keep-alive), created in setup_hook
+        self.http_client = None
+        self.http_max_connections = int(os.environ.get("HTTP_MAX_CONNECTIONS", 20))
+
+        # /meal attachment downloads
+        self.meal_download_concurrency = int(os.environ.get("MEAL_DOWNLOAD_CONCURRENCY", 3))
+        self.meal_max_image_bytes = int(os.environ.get("MEAL_MAX_IMAGE_BYTES", 10 * 1024 * 1024))
+
+        # /meal result cache: identical or near-identical submissions (0 entries disables it)
+        self.meal_cache_max_entries = int(os.environ.get("MEAL_CACHE_MAX_ENTRIES", 512))
+        self.meal_cache_ttl = float(os.environ.get("MEAL_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60)) or None
+        # Max differing perceptual-hash bits (of 64) per image for a near-identical photo, -1 for exact only
+        self.meal_cache_max_distance = int(os.environ.get("MEAL_CACHE_MAX_DISTANCE", 5))
+        self.meal_cache_path = os.environ.get("MEAL_CACHE_PATH")
+
+        # /meal output: "json" asks for structured numbers and renders the message locally, "text" streams it
+        self.nutrition_output_mode = os.environ.get("NUTRITION_OUTPUT_MODE", "json").lower()
+        # Logged meal numbers behind /meal-summary (JSON mode only)
+        self.meal_log_path = os.environ.get("MEAL_LOG_PATH", ":memory:")
+
+        # /meal image preprocessing (downscale + re-encode), 0 disables it
+        self.meal_image_max_dimension = int(os.environ.get("MEAL_IMAGE_MAX_DIMENSION", 1536))
+        self.meal_image_format = os.environ.get("MEAL_IMAGE_FORMAT", "WEBP")
+        self.meal_image_quality = int(os.environ.get("MEAL_IMAGE_QUALITY", 85))
+        image_workers = int(os.environ.get("IMAGE_WORKERS", 2))
+        if os.environ.get("IMAGE_EXECUTOR", "thread") == "process":
+            self.image_executor = ProcessPoolExecutor(max_workers=image_workers)
+        else:
+            self.image_executor = ThreadPoolExecutor(max_workers=image_workers, thread_name_prefix="image")
+
+        # Metrics: event loop lag sampling interval (0 disables the monitor)
+        self.loop_lag_interval = float(os.environ.get("METRICS_LOOP_LAG_INTERVAL_SECONDS", 0.5))
+        self._loop_lag_task = None
+        metrics.REGISTRY.add_collector(self._collect_metrics)
         
         # Initialize bot
         intents = Intents.default()
         intents.message_content = True
-        super().__init__(command_prefix=None, intents=intents)
+        super().__init__(command_prefix=None, intents=intents, **options)
+        self.startup.record("init", time.perf_counter() - init_started)
+
+    async def login(self, token: str):
+        with self.startup.phase("login"):
+            await super().login(token)
     
     async def setup_hook(self):
         """Called when the bot is starting up. Load extensions here."""
+        # Serve health checks alongside the rest of startup: FastAPI is imported in a
+        # worker thread while extensions load and the gateway connects
+        if self.health_server_mode == "loop":
+            self._health_server_task = asyncio.create_task(self._serve_health_checks())
+
         print("Setting up bot extensions...")
+
+        # Create the shared HTTP client on the bot's event loop
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.http_max_connections,
+                max_keepalive_connections=self.http_max_connections
+            ),
+            timeout=httpx.Timeout(30.0)
+        )
         
+        if self.loop_lag_interval > 0:
+            self._loop_lag_task = asyncio.create_task(metrics.monitor_event_loop_lag(self.loop_lag_interval))
+
         # Set global error handler for app commands
         self.tree.on_error = self.on_app_command_error
         
@@ -38,19 +210,44 @@ class AnisecordBot(commands.Bot):
             'bot.features.sns_x.cog'
         ]
         
-        for extension in oss_extensions:
-            try:
-                await self.load_extension(extension)
-                print(f"Loaded extension: {extension}")
-            except Exception as e:
-                print(f"Failed to load extension {extension}: {e}")
+        with self.startup.phase("extensions"):
+            for extension in oss_extensions:
+                try:
+                    await self.load_extension(extension)
+                    print(f"Loaded extension: {extension}")
+                except Exception as e:
+                    print(f"Failed to load extension {extension}: {e}")
         
         # Sync application commands
+        if self.command_sync_enabled:
+            with self.startup.phase("command_sync"):
+                await self._sync_commands()
+
+    async def _sync_commands(self):
+        """Sync the command tree unless it is unchanged since the last successful sync."""
+        fingerprint = command_tree_fingerprint(self.tree, self.application_id)
+        if not self.force_command_sync and load_fingerprint(self.command_fingerprint_path) == fingerprint:
+            print("Application commands unchanged, skipping sync.")
+            return
         try:
             synced = await self.tree.sync()
             print(f"Synced {len(synced)} application commands.")
         except Exception as e:
             print(f"Failed to sync commands: {e}")
+            return
+        try:
+            save_fingerprint(self.command_fingerprint_path, fingerprint)
+        except OSError as e:
+            print(f"Failed to store the command tree fingerprint: {e}")
+
+    async def _serve_health_checks(self):
+        """Import and start the in-loop health server, then keep serving until close()."""
+        started = time.perf_counter()
+        health_server = await asyncio.to_thread(importlib.import_module, "bot.core.health_server")
+        print(f"Starting health check server on port {self.port}...")
+        self.health_server, task = await health_server.serve_health_server(self.port, self)
+        self.startup.record("health_server", time.perf_counter() - started)
+        await task
 
     async def on_app_command_error(self, interaction: Interaction, error: app_commands.AppCommandError):
         """Global error handler for application commands."""
@@ -63,15 +260,102 @@ class AnisecordBot(commands.Bot):
     async def on_ready(self):
         """Called when the bot is ready."""
         print(f'Logged in as: {self.user}')
+        if not self._ready_once:
+            # on_ready fires again after reconnects; startup is only reported once
+            self._ready_once = True
+            self.startup.record("total", self.startup.elapsed())
+            print(self.startup.summary())
+            self._prewarm_task = asyncio.create_task(prewarm_llm())
+
+    def _collect_metrics(self):
+        """Copy component stats into gauges (runs on each /metrics scrape)."""
+        if not math.isnan(self.latency) and not math.isinf(self.latency):
+            metrics.GATEWAY_LATENCY_SECONDS.set(self.latency)
+        scheduler_stats = self.llm_scheduler.stats()
+        metrics.LLM_QUEUE_DEPTH.set(scheduler_stats.queue_depth)
+        metrics.LLM_ACTIVE_CALLS.set(scheduler_stats.active)
+        metrics.CACHE_HIT_RATE.set(self.llm_cache.stats().hit_rate, cache="llm_response")
+        metrics.CACHE_HIT_RATE.set(self.user_repository.stats().hit_rate, cache="user")
+        metrics.CACHE_HIT_RATE.set(self.llm_prompt_cache.stats().cached_ratio, cache="llm_prompt")
+
+    async def close(self):
+        """Release shared resources before disconnecting."""
+        if self._loop_lag_task is not None:
+            self._loop_lag_task.cancel()
+        await super().close()
+        if self.health_server is not None:
+            self.health_server.should_exit = True
+        if self._health_server_task is not None:
+            if self.health_server is None:
+                self._health_server_task.cancel() # Still starting
+            await asyncio.gather(self._health_server_task, return_exceptions=True)
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        if self.message_store is not None:
+            self.message_store.close()
+        self.user_repository.close()
+        self.llm_cache.close()
+        self.image_executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AnisecordShardedBot(AnisecordBot, commands.AutoShardedBot):
+    """
+    AnisecordBot on several gateway shards in one process.
+
+    Without `shard_ids` it runs every shard; with them (and `shard_count`)
+    only those, which is how a cluster process runs its share.
+    """
+
+
+def parse_shard_ids(value: str) -> List[int]:
+    """Parse shard IDs like "0,1,4-7"."""
+    shard_ids = []
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            shard_ids.extend(range(int(first), int(last) + 1))
+        else:
+            shard_ids.append(int(part))
+    return shard_ids
+
+
+def create_bot(shard_ids: Optional[List[int]] = None, shard_count: Optional[int] = None) -> AnisecordBot:
+    """
+    Create the bot for the configured sharding mode.
+
+    BOT_SHARDING=auto selects AnisecordShardedBot. SHARD_COUNT and SHARD_IDS
+    (e.g. "0-3") are used unless passed explicitly; without them discord.py
+    uses the recommended shard count and runs every shard.
+    """
+    if os.environ.get("BOT_SHARDING", "off").lower() != "auto" and shard_ids is None:
+        return AnisecordBot()
+
+    if shard_count is None and os.environ.get("SHARD_COUNT"):
+        shard_count = int(os.environ["SHARD_COUNT"])
+    if shard_ids is None and os.environ.get("SHARD_IDS"):
+        shard_ids = parse_shard_ids(os.environ["SHARD_IDS"])
+    options = {}
+    if shard_count is not None:
+        options["shard_count"] = shard_count
+    if shard_ids is not None:
+        options["shard_ids"] = shard_ids
+    return AnisecordShardedBot(**options)
 
 
 def main():
     """Main entry point for the bot."""
-    bot = AnisecordBot()
+    bot = create_bot()
     
-    # Start health check server
-    print(f"Starting health check server on port {bot.port}...")
-    start_health_server(bot.port)
+    # Threaded health server: answers even before the bot logs in
+    if bot.health_server_mode == "thread":
+        from bot.core.health_server import start_health_server
+
+        print(f"Starting health check server on port {bot.port}...")
+        with bot.startup.phase("health_server"):
+            start_health_server(bot.port, bot)
     
     try:
         # Start the Discord bot
@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, List, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    """Counters of a cache tier."""
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TTLCache(Generic[K, V]):
+    """
+    In-process LRU cache with an optional time-to-live per entry.
+
+    Not thread-safe: meant to be used from the bot's event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            max_entries: Least recently used entries are evicted beyond this size.
+            ttl: Seconds an entry stays valid. None keeps entries until evicted.
+            clock: Time source, overridable for tests and benchmarks.
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[K, tuple[float, V]]" = OrderedDict()
+        self._stats = CacheStats()
+
+    def get(self, key: K, default: Optional[V] = None) -> Optional[V]:
+        """Return the cached value (refreshing its LRU position) or `default`."""
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl is not None and self._clock() - entry[0] > self.ttl:
+            del self._entries[key]
+            self._stats.evictions += 1
+            entry = None
+        if entry is None:
+            self._stats.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self._stats.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V):
+        """Store a value, evicting the least recently used entries if needed."""
+        self._entries[key] = (self._clock(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats.evictions += 1
+
+    def invalidate(self, key: K):
+        """Drop a single entry if present."""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def values(self) -> List[V]:
+        """Unexpired values, least recently used first (does not count as lookups)."""
+        now = self._clock()
+        return [value for stored_at, value in self._entries.values() if self.ttl is None or now - stored_at <= self.ttl]
+
+    def __contains__(self, key: K) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and (self.ttl is None or self._clock() - entry[0] <= self.ttl)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the counters."""
+        return CacheStats(
+            hits=self._stats.hits,
+            misses=self._stats.misses,
+            evictions=self._stats.evictions,
+            size=len(self._entries)
+        )
@@ -0,0 +1,256 @@
+"""
+Run the bot as several processes ("clusters"), each owning a range of shards.
+
+    python -m bot.core.cluster
+
+Every cluster is an AnisecordShardedBot with its own event loop and health
+server (on CLUSTER_BASE_PORT + cluster id). The launcher supervises the
+processes and serves the aggregated per-shard health on PORT.
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from bot.core.metrics import REGISTRY
+
+DISCORD_API = "https://discord.com/api/v10"
+
+# Seconds a cluster waits before being restarted, doubled per consecutive crash
+RESTART_BACKOFF = 1.0
+MAX_RESTART_BACKOFF = 60.0
+# A cluster that stayed up this long has its backoff reset
+STABLE_AFTER = 300.0
+
+CLUSTER_UP = REGISTRY.gauge(
+    "anisecord_cluster_up",
+    "Whether the cluster process is running.",
+    ("cluster",)
+)
+CLUSTER_RESTARTS = REGISTRY.counter(
+    "anisecord_cluster_restarts_total",
+    "Cluster processes restarted after exiting.",
+    ("cluster",)
+)
+
+
+@dataclass
+class ClusterSpec:
+    """Shards run by one cluster process."""
+    cluster_id: int
+    shard_ids: List[int]
+    shard_count: int
+    port: int
+
+
+def plan_clusters(shard_count: int, clusters: int, base_port: int) -> List[ClusterSpec]:
+    """Split shards 0..shard_count-1 into contiguous, evenly sized ranges."""
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    specs = []
+    start = 0
+    for cluster_id in range(clusters):
+        end = start + size + (1 if cluster_id < extra else 0)
+        specs.append(ClusterSpec(cluster_id, list(range(start, end)), shard_count, base_port + cluster_id))
+        start = end
+    return specs
+
+
+def fetch_recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should run (GET /gateway/bot)."""
+    response = httpx.get(f"{DISCORD_API}/gateway/bot", headers={"Authorization": f"Bot {token}"}, timeout=10.0)
+    response.raise_for_status()
+    return int(response.json()["shards"])
+
+
+def run_cluster(spec: ClusterSpec, clusters: int):
+    """Process entry point: run one cluster's shards until the process is stopped."""
+    os.environ["PORT"] = str(spec.port)
+    os.environ["HEALTH_SERVER_MODE"] = "loop"
+    if spec.cluster_id != 0:
+        # Commands are global; the first cluster syncs them for everyone
+        os.environ["COMMAND_SYNC"] = "off"
+    # Provider rate limits are per API key: give every cluster its share
+    for name in ("LLM_REQUESTS_PER_MINUTE", "LLM_TOKENS_PER_MINUTE"):
+        if os.environ.get(name):
+            os.environ[name] = str(float(os.environ[name]) / clusters)
+
+    from bot.core.bot import create_bot
+
+    bot = create_bot(shard_ids=spec.shard_ids, shard_count=spec.shard_count)
+    print(f"[cluster {spec.cluster_id}] Starting shards {spec.shard_ids} of {spec.shard_count} (health on port {spec.port})")
+    bot.run(bot.token)
+
+
+class ClusterLauncher:
+    """Start, supervise and health-check the cluster processes."""
+
+    def __init__(self, specs: List[ClusterSpec], health_timeout: float = 2.0):
+        """
+        Args:
+            specs: Clusters to run.
+            health_timeout: Timeout of each cluster's /ready request when aggregating.
+        """
+        self.specs = specs
+        self.health_timeout = health_timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self._started_at: dict[int, float] = {}
+        self._failures: dict[int, int] = {}
+        self._restarts: dict[int, int] = {spec.cluster_id: 0 for spec in specs}
+        self._stopping = False
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        for spec in self.specs:
+            self._start(spec)
+
+    def stop(self, timeout: float = 10.0):
+        """Terminate every cluster (SIGTERM, then SIGKILL after `timeout`)."""
+        self._stopping = True
+        for process in self._processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+
+    async def supervise(self, interval: float = 1.0):
+        """Restart clusters that exited, with exponential backoff for crash loops."""
+        pending: dict[int, float] = {}
+        while not self._stopping:
+            now = time.monotonic()
+            for spec in self.specs:
+                process = self._processes[spec.cluster_id]
+                CLUSTER_UP.set(1 if process.is_alive() else 0, cluster=str(spec.cluster_id))
+                if process.is_alive() or self._stopping:
+                    continue
+                if spec.cluster_id not in pending:
+                    if now - self._started_at[spec.cluster_id] >= STABLE_AFTER:
+                        self._failures[spec.cluster_id] = 0
+                    failures = self._failures.get(spec.cluster_id, 0)
+                    delay = min(MAX_RESTART_BACKOFF, RESTART_BACKOFF * 2 ** failures)
+                    print(f"[cluster {spec.cluster_id}] Exited with code {process.exitcode}, restarting in {delay:.0f}s")
+                    pending[spec.cluster_id] = now + delay
+                elif now >= pending[spec.cluster_id]:
+                    del pending[spec.cluster_id]
+                    self._failures[spec.cluster_id] = self._failures.get(spec.cluster_id, 0) + 1
+                    self._restarts[spec.cluster_id] += 1
+                    CLUSTER_RESTARTS.inc(cluster=str(spec.cluster_id))
+                    self._start(spec)
+            await asyncio.sleep(interval)
+
+    async def status(self) -> dict:
+        """Aggregate the /ready reports of every cluster into one per-shard view."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.health_timeout)
+        clusters = await asyncio.gather(*(self._cluster_status(spec) for spec in self.specs))
+
+        shard_count = self.specs[0].shard_count if self.specs else 0
+        shards_ready = sum(len(cluster["shard_ids"]) for cluster in clusters if cluster["status"] == "ready")
+        if shards_ready == shard_count and shard_count:
+            status = "ready"
+        elif shards_ready:
+            status = "degraded"
+        else:
+            status = "not_ready"
+        return {
+            "status": status,
+            "shard_count": shard_count,
+            "shards_ready": shards_ready,
+            "clusters": clusters,
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def _cluster_status(self, spec: ClusterSpec) -> dict:
+        process = self._processes.get(spec.cluster_id)
+        result = {
+            "cluster_id": spec.cluster_id,
+            "shard_ids": spec.shard_ids,
+            "pid": process.pid if process else None,
+            "alive": bool(process and process.is_alive()),
+            "restarts": self._restarts[spec.cluster_id],
+            "status": "down",
+            "shards": [],
+        }
+        if not result["alive"]:
+            return result
+        try:
+            response = await self._client.get(f"http://127.0.0.1:{spec.port}/ready")
+            report = response.json()
+        except (httpx.HTTPError, ValueError):
+            result["status"] = "unreachable"
+            return result
+        result["status"] = report.get("status", "unknown")
+        result["latency"] = report.get("latency")
+        result["shards"] = report.get("shards", [])
+        return result
+
+    def _start(self, spec: ClusterSpec):
+        process = self._context.Process(
+            target=run_cluster,
+            args=(spec, len(self.specs)),
+            name=f"anisecord-cluster-{spec.cluster_id}",
+            daemon=False
+        )
+        process.start()
+        self._processes[spec.cluster_id] = process
+        self._started_at[spec.cluster_id] = time.monotonic()
+
+
+async def serve(launcher: ClusterLauncher, port: int):
+    """Serve the aggregated health on `port` while supervising the clusters, until SIGINT/SIGTERM."""
+    from bot.core.health_server import serve_cluster_health_server
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    server, server_task = await serve_cluster_health_server(port, launcher)
+    supervisor = asyncio.create_task(launcher.supervise())
+    try:
+        await stop.wait()
+    finally:
+        print("Stopping clusters...")
+        supervisor.cancel()
+        server.should_exit = True
+        await asyncio.gather(supervisor, server_task, return_exceptions=True)
+        await asyncio.to_thread(launcher.stop)
+        await launcher.close()
+
+
+def main():
+    load_dotenv()
+    token = os.environ.get("DISCORD_BOT_TOKEN")
+    port = int(os.environ.get("PORT", 8080))
+    shard_count = int(os.environ.get("SHARD_COUNT", 0)) or fetch_recommended_shard_count(token)
+    clusters = int(os.environ.get("CLUSTER_COUNT", 0)) or os.cpu_count() or 1
+    base_port = int(os.environ.get("CLUSTER_BASE_PORT", port + 1))
+
+    specs = plan_clusters(shard_count, clusters, base_port)
+    print(f"Launching {len(specs)} clusters for {shard_count} shards")
+    launcher = ClusterLauncher(specs)
+    launcher.start()
+    try:
+        asyncio.run(serve(launcher, port))
+    except KeyboardInterrupt:
+        launcher.stop()
+
+
+if __name__ == "__main__":
+    main()
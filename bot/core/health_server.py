@@ -1,53 +1,232 @@
 import asyncio
+import contextlib
+import math
 import threading
 import time
+from typing import Callable, Optional
+
 import uvicorn
 from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from bot.core.metrics import REGISTRY
+
+# Seconds without a heartbeat ACK after which the gateway is reported stale
+# (discord.py reconnects after the same delay)
+DEFAULT_HEARTBEAT_TIMEOUT = 60.0
+
 
+def create_health_server(port: int = 8080, bot=None) -> FastAPI:
+    """
+    Create FastAPI health check server.
 
-def create_health_server(port: int = 8080) -> FastAPI:
-    """Create FastAPI health check server."""
+    Args:
+        port (int): Port the server will listen on.
+        bot: The Discord client whose gateway state `/ready` reports. Without it
+            `/ready` always answers 503.
+    """
     app = FastAPI()
 
+    # Handlers are coroutines, so FastAPI runs them on the server's event loop
+    # (the bot's, in `loop` mode) rather than in its threadpool
     @app.get("/")
-    def health_check_get():
-        # bot.is_ready() can only be used in an async context,
-        # so we return a simple static response here.
+    async def health_check_get():
+        # Liveness only: answers as long as the process serves HTTP.
+        # Gateway state is reported by /ready.
         return {"status": "ok"}
 
     @app.head("/")
-    def health_check_head():
+    async def health_check_head():
         """
         Health check for HEAD requests.
         Responds to monitoring services like UptimeRobot.
         Returns only status code 200 OK without response body.
         """
         return Response(status_code=200)
-    
+
+    @app.get("/ready")
+    async def readiness_check():
+        """Readiness: 200 while the gateway is connected and heartbeats are acknowledged, 503 otherwise."""
+        if bot is None:
+            return JSONResponse({"status": "unknown"}, status_code=503)
+        status = gateway_status(bot)
+        return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Prometheus text exposition of the bot's metrics."""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def create_cluster_health_server(launcher) -> FastAPI:
+    """
+    Create the health server of the cluster launcher.
+
+    Args:
+        launcher: The `ClusterLauncher` whose clusters `/ready` aggregates.
+    """
+    app = FastAPI()
+
+    @app.get("/")
+    async def health_check_get():
+        return {"status": "ok"}
+
+    @app.head("/")
+    async def health_check_head():
+        return Response(status_code=200)
+
+    @app.get("/ready")
+    async def readiness_check():
+        """Per-shard readiness of every cluster: 200 only when all shards are ready."""
+        status = await launcher.status()
+        return JSONResponse(status, status_code=200 if status["status"] == "ready" else 503)
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Launcher metrics; each cluster serves its own on its health port."""
+        return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
     return app
 
 
-def run_fastapi_server(app: FastAPI, port: int):
+def gateway_status(bot) -> dict:
+    """
+    Describe the bot's gateway connection, per shard.
+
+    The last heartbeat is read from discord.py internals (`ws._keep_alive`,
+    and `ShardInfo._parent.ws` for sharded bots), so every attribute is looked
+    up defensively and reported as None if missing.
+    """
+    shard_infos = getattr(bot, "shards", None)
+    if isinstance(shard_infos, dict):
+        # AutoShardedClient: one websocket per shard (none until the shards are launched)
+        sockets = [getattr(getattr(info, "_parent", None), "ws", None) for info in shard_infos.values()]
+    else:
+        sockets = [getattr(bot, "ws", None)]
+    shards = [_websocket_status(ws) for ws in sockets]
+
+    client_ready = bot.is_ready() and not bot.is_closed()
+    healthy = bool(shards) and all(shard["connected"] and not shard["stale"] for shard in shards)
+    acks = [shard["last_heartbeat_ack_seconds_ago"] for shard in shards]
+
+    latency = bot.latency
+    latency = None if math.isnan(latency) or math.isinf(latency) else round(latency, 4)
+    return {
+        "status": "ready" if client_ready and healthy else "not_ready",
+        "connected": client_ready and bool(shards) and all(shard["connected"] for shard in shards),
+        "shard_id": shards[0]["shard_id"] if len(shards) == 1 else None,
+        "latency": latency,
+        # The oldest ACK across shards
+        "last_heartbeat_ack_seconds_ago": None if None in acks or not acks else max(acks),
+        "shards": shards,
+    }
+
+
+def _websocket_status(ws) -> dict:
+    socket = getattr(ws, "socket", None)
+    keep_alive = getattr(ws, "_keep_alive", None)
+
+    last_heartbeat_ack = None
+    last_ack = getattr(keep_alive, "_last_ack", None)
+    if isinstance(last_ack, float):
+        last_heartbeat_ack = round(time.perf_counter() - last_ack, 3)
+
+    latency = getattr(ws, "latency", None)
+    if not isinstance(latency, float) or math.isnan(latency) or math.isinf(latency):
+        latency = None
+
+    heartbeat_timeout = getattr(keep_alive, "heartbeat_timeout", DEFAULT_HEARTBEAT_TIMEOUT)
+    return {
+        "shard_id": getattr(ws, "shard_id", None),
+        "connected": socket is not None and not getattr(socket, "closed", True),
+        "latency": None if latency is None else round(latency, 4),
+        "last_heartbeat_ack_seconds_ago": last_heartbeat_ack,
+        "stale": last_heartbeat_ack is None or last_heartbeat_ack > heartbeat_timeout,
+    }
+
+
+class HealthServer(uvicorn.Server):
+    """
+    Uvicorn server that reports when it is listening.
+
+    Signal handling is left to the bot: when the server runs on the bot's
+    event loop, uvicorn must not take over SIGINT/SIGTERM.
+    """
+
+    def __init__(self, config: uvicorn.Config, on_started: Optional[Callable[[], None]] = None):
+        super().__init__(config)
+        self._on_started = on_started
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if self.started and self._on_started is not None:
+            self._on_started()
+
+
+def run_fastapi_server(app: FastAPI, port: int, on_started: Optional[Callable[[], None]] = None):
     """Function to run the FastAPI server using Uvicorn."""
     config = uvicorn.Config(app, host="0.0.0.0", port=port, log_level="warning")
-    server = uvicorn.Server(config)
+    server = HealthServer(config, on_started=on_started)
     asyncio.run(server.serve())
 
 
-def start_health_server(port: int = 8080) -> threading.Thread:
+def start_health_server(port: int = 8080, bot=None, startup_timeout: float = 5.0) -> threading.Thread:
     """
     Start the FastAPI health server in a background thread.
-    
+
     DESIGN PRINCIPLE: The health check server must not block the main bot process.
     Using a daemon thread is crucial. A daemon thread will exit automatically
     when the main thread (the bot) exits. This prevents a "zombie process"
     where the health check server stays alive after the bot has crashed.
+
+    Returns as soon as the server is listening (or after `startup_timeout` seconds).
     """
-    app = create_health_server(port)
-    api_thread = threading.Thread(target=run_fastapi_server, args=(app, port), daemon=True)
+    app = create_health_server(port, bot)
+    started = threading.Event()
+    api_thread = threading.Thread(target=run_fastapi_server, args=(app, port, started.set), daemon=True)
     api_thread.start()
-    
-    time.sleep(2)  # Allow time for the server to start
-    
+
+    if not started.wait(startup_timeout):
+        print(f"Health check server did not start within {startup_timeout}s")
+
     return api_thread
 
+
+async def serve_health_server(port: int, bot) -> tuple[HealthServer, asyncio.Task]:
+    """
+    Start the FastAPI health server on the running event loop (the bot's).
+
+    Returns once the server is listening, with the server (set `should_exit`
+    to stop it) and the task serving it.
+    """
+    return await _serve_app(create_health_server(port, bot), port)
+
+
+async def serve_cluster_health_server(port: int, launcher) -> tuple[HealthServer, asyncio.Task]:
+    """Like `serve_health_server`, for the cluster launcher's aggregated health."""
+    return await _serve_app(create_cluster_health_server(launcher), port)
+
+
+async def _serve_app(app: FastAPI, port: int) -> tuple[HealthServer, asyncio.Task]:
+    started = asyncio.Event()
+    config = uvicorn.Config(app, host="0.0.0.0", port=port, log_level="warning")
+    server = HealthServer(config, on_started=started.set)
+
+    async def serve():
+        try:
+            await server.serve()
+        except SystemExit:
+            # uvicorn exits on startup failures (e.g. port in use); keep the bot running
+            print(f"Health check server failed to start on port {port}")
+
+    task = asyncio.create_task(serve())
+    started_wait = asyncio.create_task(started.wait())
+    await asyncio.wait({task, started_wait}, return_when=asyncio.FIRST_COMPLETED)
+    started_wait.cancel()
+    return server, task
@@ -0,0 +1,263 @@
+import asyncio
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets (seconds) covering Discord REST calls up to long LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in list(self._values.items()):
+            lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, per label set."""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str):
+        self._values[self._key(labels)] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in list(self._values.items()):
+            lines.append(f"{self.name}{self._format_labels(key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in fixed buckets, per label set."""
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), list(counts)):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = self._format_labels(key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered in the Prometheus text format.
+
+    Recording is a dict update on the event loop; collectors (callbacks that
+    refresh gauges from other components' stats) only run when scraped.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callback run before each render (e.g. to copy stats into gauges)."""
+        self._collectors.append(collector)
+
+    def remove_collector(self, collector: Callable[[], None]):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: _Metric):
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+REGISTRY = MetricsRegistry()
+
+# Hot-path metrics shared across the bot
+COMMAND_PHASE_SECONDS = REGISTRY.histogram(
+    "anisecord_command_phase_seconds",
+    "Time spent per command phase (discord_fetch, prompt_build, llm_call, send).",
+    ("command", "phase")
+)
+COMMAND_ERRORS = REGISTRY.counter(
+    "anisecord_command_errors_total",
+    "Commands that ended with an error.",
+    ("command",)
+)
+FETCHED_MESSAGES = REGISTRY.histogram(
+    "anisecord_fetched_messages",
+    "Messages read from Discord per fetch.",
+    ("command",),
+    buckets=(0, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+LLM_REQUEST_SECONDS = REGISTRY.histogram(
+    "anisecord_llm_request_seconds",
+    "Latency of LLM provider calls.",
+    ("model",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "anisecord_llm_tokens_total",
+    "Tokens reported by the LLM provider.",
+    ("model", "kind")
+)
+LLM_ERRORS = REGISTRY.counter(
+    "anisecord_llm_errors_total",
+    "Failed LLM calls by provider and error type.",
+    ("provider", "error")
+)
+LLM_HEDGED_CALLS = REGISTRY.counter(
+    "anisecord_llm_hedged_calls_total",
+    "LLM calls duplicated to the hedge model, by routed model and which call answered first.",
+    ("model", "winner")
+)
+SNSX_COMPACTION_TOKENS = REGISTRY.counter(
+    "anisecord_snsx_compaction_tokens_total",
+    "Estimated tokens of SNS-X chat logs before (original) and after (compacted) compaction.",
+    ("kind",)
+)
+SNSX_DIGEST_BUCKETS = REGISTRY.counter(
+    "anisecord_snsx_digest_buckets_total",
+    "SNS-X digest buckets used by drafts or the background task, by where they came from.",
+    ("source",)
+)
+GATEWAY_LATENCY_SECONDS = REGISTRY.gauge(
+    "anisecord_gateway_latency_seconds",
+    "Discord gateway heartbeat latency."
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "anisecord_event_loop_lag_seconds",
+    "Delay between when the loop monitor should have woken up and when it did.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+LLM_QUEUE_DEPTH = REGISTRY.gauge(
+    "anisecord_llm_queue_depth",
+    "LLM calls waiting for a scheduler slot."
+)
+LLM_ACTIVE_CALLS = REGISTRY.gauge(
+    "anisecord_llm_active_calls",
+    "LLM calls holding a scheduler slot."
+)
+STARTUP_PHASE_SECONDS = REGISTRY.gauge(
+    "anisecord_startup_phase_seconds",
+    "Duration of each startup phase of the current process.",
+    ("phase",)
+)
+CACHE_HIT_RATE = REGISTRY.gauge(
+    "anisecord_cache_hit_rate",
+    "Hit rate of the in-process caches since startup.",
+    ("cache",)
+)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """
+    Sample event loop lag until cancelled.
+
+    Sleeps `interval` seconds at a time; anything beyond that between the
+    sleep and the wake-up is time the loop was busy with other callbacks.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started - interval))
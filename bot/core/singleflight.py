@@ -0,0 +1,80 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+from .cache import TTLCache
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class SingleFlightStats:
+    """How many calls ran a job versus reused one."""
+    started: int = 0
+    joined: int = 0      # Awaited a job that was still running
+    reused: int = 0      # Served from a recently finished job
+
+    @property
+    def coalesced(self) -> int:
+        return self.joined + self.reused
+
+
+class SingleFlight(Generic[K, V]):
+    """
+    Coalesce concurrent identical calls into one shared job.
+
+    The first call for a key starts the job; calls with the same key await it
+    instead of starting their own. A successful result stays available for
+    `ttl` seconds so calls arriving right after it finished reuse it too.
+    Failures are propagated to every waiter and never kept.
+    """
+
+    def __init__(self, ttl: float = 30.0, name: str = "singleflight"):
+        """
+        Args:
+            ttl: Seconds a finished result is reused. 0 only coalesces in-flight calls.
+            name: Label used in log lines.
+        """
+        self.name = name
+        self._inflight: Dict[K, asyncio.Task] = {}
+        self._results: TTLCache[K, V] = TTLCache(max_entries=256, ttl=ttl)
+        self._stats = SingleFlightStats()
+
+    async def do(self, key: K, factory: Callable[[], Awaitable[V]]) -> Tuple[V, bool]:
+        """
+        Run `factory()` once per key, sharing the result.
+
+        Returns:
+            The result and whether it came from another caller's job.
+        """
+        if key in self._results:
+            self._stats.reused += 1
+            print(f"[{self.name}] Reused a recent result ({self._stats.coalesced} coalesced so far)")
+            return self._results.get(key), True
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats.joined += 1
+            print(f"[{self.name}] Joined an in-flight job ({self._stats.coalesced} coalesced so far)")
+            # Shielded: a waiter giving up must not cancel the job for the others
+            return await asyncio.shield(task), True
+
+        self._stats.started += 1
+        task = asyncio.create_task(factory())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task), False
+
+    def stats(self) -> SingleFlightStats:
+        """Return a snapshot of the counters."""
+        return SingleFlightStats(
+            started=self._stats.started,
+            joined=self._stats.joined,
+            reused=self._stats.reused
+        )
+
+    def _finish(self, key: K, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and self._results.ttl:
+            self._results.set(key, task.result())
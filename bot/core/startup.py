@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from discord import app_commands
+
+from bot.core.metrics import STARTUP_PHASE_SECONDS
+
+
+class StartupTimer:
+    """Time the startup phases and report them once the bot is ready."""
+
+    def __init__(self, started: Optional[float] = None):
+        """
+        Args:
+            started: `time.perf_counter()` value startup is measured from
+                (e.g. taken before the bot's imports). Defaults to now.
+        """
+        self.started = started if started is not None else time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the block as a startup phase."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+        STARTUP_PHASE_SECONDS.set(seconds, phase=name)
+        print(f"Startup: {name} took {seconds * 1000:.0f}ms")
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        phases = ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items())
+        return f"Ready {self.elapsed():.2f}s after start ({phases})"
+
+
+def command_tree_fingerprint(tree: app_commands.CommandTree, application_id: Optional[int] = None) -> str:
+    """
+    Hash of the global application commands as they would be sent by `tree.sync()`.
+
+    The application ID is part of the hash, so switching bots (tokens) always syncs.
+    """
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: (command.get("type", 1), command["name"])
+    )
+    data = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def load_fingerprint(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_fingerprint(path: str, fingerprint: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write then rename, so a crash never leaves a truncated fingerprint behind
+    temporary = f"{path}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(fingerprint + "\n")
+    os.replace(temporary, path)
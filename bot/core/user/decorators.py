@@ -2,6 +2,9 @@ from discord import Interaction, app_commands
 from discord.ext import commands
 from .repository import UserRepository
 
+# Shared by checks on clients without a `user_repository` (serves the `User` defaults)
+_fallback_repository = None
+
 class FeatureAccessDenied(app_commands.CheckFailure):
     """Exception raised when a user does not have access to a feature."""
     def __init__(self, feature_name: str):
@@ -26,10 +29,11 @@ def feature_enabled(feature_name: str):
     """
     async def predicate(interaction: Interaction) -> bool:
         # NOTE: app_commands.check predicate receives Interaction, not Context
-        repo = UserRepository()
+        # Use the bot-wide repository (and its cache) so the cog's lookup is a cache hit
+        repo = getattr(interaction.client, "user_repository", None) or _get_fallback_repository()
         
         user_id = str(interaction.user.id)
-        user = repo.get_user(user_id)
+        user = await repo.get_user(user_id)
         
         if feature_name in user.allowed_features:
             return True
@@ -38,3 +42,9 @@ def feature_enabled(feature_name: str):
         raise FeatureAccessDenied(feature_name)
         
     return app_commands.check(predicate)
+
+def _get_fallback_repository() -> UserRepository:
+    global _fallback_repository
+    if _fallback_repository is None:
+        _fallback_repository = UserRepository()
+    return _fallback_repository
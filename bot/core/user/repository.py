@@ -1,12 +1,114 @@
-from typing import Optional
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from bot.core.cache import CacheStats, TTLCache
 from .domain import User
 
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    timezone TEXT NOT NULL,
+    language TEXT NOT NULL,
+    allowed_features TEXT NOT NULL
+);
+"""
+
+# SQLite's default limit on bound parameters is 999
+_PRELOAD_BATCH_SIZE = 500
+
+
 class UserRepository:
-    def get_user(self, user_id: str) -> User:
+    """
+    User settings store (SQLite) with an in-process read-through cache.
+
+    One instance is shared by the `feature_enabled` check and the cogs, so a
+    command resolves its user from the database at most once per cache TTL.
+    Users without a stored row get the `User` defaults. Cache hits are served
+    on the event loop; queries run in a worker thread.
+    """
+
+    def __init__(self, path: str = ":memory:", cache_ttl: Optional[float] = 300, cache_max_entries: int = 1024):
+        """
+        Args:
+            path: SQLite database file. The default in-memory database only serves defaults.
+            cache_ttl: Seconds a user stays cached. None caches until evicted or invalidated.
+            cache_max_entries: Size of the LRU cache.
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+        self._cache: TTLCache[str, User] = TTLCache(max_entries=cache_max_entries, ttl=cache_ttl)
+
+    async def get_user(self, user_id: str) -> User:
         """
-        Fetch user settings.
-        Currently returns dummy data with fixed timezone.
-        In real app, this would fetch from DB.
+        Fetch user settings, from the cache when possible.
         """
-        # TODO: Implement DB fetch
-        return User(user_id=user_id, language="ja")
+        user = self._cache.get(user_id)
+        if user is None:
+            user = await asyncio.to_thread(self._get_user, user_id)
+            self._cache.set(user_id, user)
+        return user
+
+    async def save_user(self, user: User):
+        """Persist user settings and drop the stale cache entry."""
+        await asyncio.to_thread(self._save_user, user)
+        self.invalidate(user.user_id)
+
+    def invalidate(self, user_id: str):
+        """Forget the cached settings of a user (e.g. after they were changed elsewhere)."""
+        self._cache.invalidate(user_id)
+
+    async def preload(self, user_ids: Iterable[str]):
+        """Warm the cache for several users with batched queries."""
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in self._cache]
+        for start in range(0, len(missing), _PRELOAD_BATCH_SIZE):
+            batch = missing[start:start + _PRELOAD_BATCH_SIZE]
+            found = await asyncio.to_thread(self._get_users, batch)
+            for user_id in batch:
+                self._cache.set(user_id, found.get(user_id) or User(user_id=user_id, language="ja"))
+
+    def stats(self) -> CacheStats:
+        """Return cache hit/miss counters."""
+        return self._cache.stats()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_user(self, user_id: str) -> User:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT user_id, timezone, language, allowed_features FROM users WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        return self._to_user(row) if row else User(user_id=user_id, language="ja")
+
+    def _get_users(self, user_ids: List[str]) -> Dict[str, User]:
+        placeholders = ", ".join("?" for _ in user_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT user_id, timezone, language, allowed_features FROM users WHERE user_id IN ({placeholders})",
+                user_ids
+            ).fetchall()
+        return {row[0]: self._to_user(row) for row in rows}
+
+    def _save_user(self, user: User):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO users (user_id, timezone, language, allowed_features) VALUES (?, ?, ?, ?)",
+                (user.user_id, user.timezone, user.language, json.dumps(list(user.allowed_features)))
+            )
+
+    @staticmethod
+    def _to_user(row: tuple) -> User:
+        user_id, timezone, language, allowed_features = row
+        return User(
+            user_id=user_id,
+            timezone=timezone,
+            language=language,
+            allowed_features=tuple(json.loads(allowed_features))
+        )
@@ -0,0 +1,228 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from bot.core.cache import TTLCache
+from bot.services.llm.image import PreprocessedImage, hamming_distance
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meals (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    content_hashes TEXT NOT NULL,
+    perceptual_hashes TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meals_accessed_at ON meals (accessed_at);
+"""
+
+
+@dataclass(frozen=True)
+class MealCacheEntry:
+    """A stored coaching result and the submission it answered."""
+    key: str
+    scope: str                                     # Hash of model, user and description
+    content_hashes: Tuple[str, ...]                # Sorted SHA-256 of the original images
+    perceptual_hashes: Tuple[Optional[int], ...]   # dHash per image
+    result: str
+    created_at: float                              # Unix time
+
+
+@dataclass
+class MealCacheStats:
+    """Hit/miss counters of a MealResultCache."""
+    exact_hits: int = 0
+    near_hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return (self.exact_hits + self.near_hits) / lookups if lookups else 0.0
+
+
+class MealResultCache:
+    """
+    Cache of /meal coaching results keyed by what was submitted.
+
+    A submission is the user, the description and the downloaded images. The
+    same images (by SHA-256, in any order) hit exactly; otherwise a stored
+    submission with the same user and description whose images all lie within
+    `max_distance` bits of the new ones (dHash, Hamming distance) is a near
+    hit, e.g. the same photo re-encoded or slightly cropped.
+
+    Entries live in memory (LRU, TTL) and, if `path` is set, in a SQLite file
+    that is loaded back on startup.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: Optional[float] = 7 * 24 * 60 * 60,
+        max_distance: int = 5,
+        path: Optional[str] = None
+    ):
+        """
+        Args:
+            max_entries: Least recently used results are evicted beyond this count (memory and disk).
+            ttl: Seconds a result stays valid. None keeps results until evicted.
+            max_distance: Max differing dHash bits (of 64) per image for a near hit. Negative disables near hits.
+            path: SQLite file that persists the cache. None keeps it in memory only.
+        """
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._memory: TTLCache[str, MealCacheEntry] = TTLCache(max_entries=self.max_entries)
+        self._stats = MealCacheStats()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                self._conn.executescript(_SCHEMA)
+            for entry in self._load():
+                self._memory.set(entry.key, entry)
+
+    @staticmethod
+    def make_scope(model: str, user_id: str, description: Optional[str]) -> str:
+        """Hash what must match exactly: the model, the user and the description (whitespace and case ignored)."""
+        normalized = " ".join((description or "").split()).casefold()
+        payload = json.dumps([model, user_id, normalized], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, scope: str, images: Sequence[PreprocessedImage]) -> Optional[str]:
+        """Return the stored result of an identical or near-identical submission."""
+        content_hashes = tuple(sorted(image.content_hash for image in images))
+        key = self._make_key(scope, content_hashes)
+
+        entry = self._memory.get(key)
+        if entry is not None and not self._expired(entry):
+            self._stats.exact_hits += 1
+            await self._touch(key)
+            return entry.result
+
+        perceptual_hashes = [image.perceptual_hash for image in images]
+        if images and self.max_distance >= 0 and None not in perceptual_hashes:
+            for candidate in reversed(self._memory.values()): # Most recently used first
+                if (
+                    candidate.scope == scope
+                    and not self._expired(candidate)
+                    and self._images_match(perceptual_hashes, candidate.perceptual_hashes)
+                ):
+                    self._stats.near_hits += 1
+                    self._memory.get(candidate.key) # Refresh its LRU position
+                    await self._touch(candidate.key)
+                    return candidate.result
+
+        self._stats.misses += 1
+        return None
+
+    async def set(self, scope: str, images: Sequence[PreprocessedImage], result: str):
+        content_hashes = tuple(sorted(image.content_hash for image in images))
+        entry = MealCacheEntry(
+            key=self._make_key(scope, content_hashes),
+            scope=scope,
+            content_hashes=content_hashes,
+            perceptual_hashes=tuple(image.perceptual_hash for image in images),
+            result=result,
+            created_at=time.time()
+        )
+        self._memory.set(entry.key, entry)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_set, entry)
+
+    def stats(self) -> MealCacheStats:
+        """Return a snapshot of the counters."""
+        return MealCacheStats(
+            exact_hits=self._stats.exact_hits,
+            near_hits=self._stats.near_hits,
+            misses=self._stats.misses
+        )
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _make_key(scope: str, content_hashes: Tuple[str, ...]) -> str:
+        return hashlib.sha256("\0".join((scope,) + content_hashes).encode("utf-8")).hexdigest()
+
+    def _images_match(self, hashes: List[int], stored: Tuple[Optional[int], ...]) -> bool:
+        """Whether every image is within max_distance of a different stored image (in any order)."""
+        if len(hashes) != len(stored) or None in stored:
+            return False
+        remaining = list(stored)
+        for value in hashes:
+            match = next((other for other in remaining if hamming_distance(value, other) <= self.max_distance), None)
+            if match is None:
+                return False
+            remaining.remove(match)
+        return True
+
+    def _expired(self, entry: MealCacheEntry) -> bool:
+        # Wall-clock TTL, so entries loaded from disk keep their age across restarts
+        return self.ttl is not None and time.time() - entry.created_at > self.ttl
+
+    async def _touch(self, key: str):
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_touch, key)
+
+    def _load(self) -> List[MealCacheEntry]:
+        """Read the most recently used, unexpired rows, oldest first (so LRU order is kept)."""
+        oldest = time.time() - self.ttl if self.ttl is not None else 0
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, scope, content_hashes, perceptual_hashes, result, created_at FROM meals "
+                "WHERE created_at >= ? ORDER BY accessed_at DESC LIMIT ?",
+                (oldest, self.max_entries)
+            ).fetchall()
+        return [
+            MealCacheEntry(
+                key=key,
+                scope=scope,
+                content_hashes=tuple(json.loads(content_hashes)),
+                perceptual_hashes=tuple(json.loads(perceptual_hashes)),
+                result=result,
+                created_at=created_at
+            )
+            for key, scope, content_hashes, perceptual_hashes, result, created_at in reversed(rows)
+        ]
+
+    def _disk_set(self, entry: MealCacheEntry):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meals "
+                "(key, scope, content_hashes, perceptual_hashes, result, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.key,
+                    entry.scope,
+                    json.dumps(list(entry.content_hashes)),
+                    json.dumps(list(entry.perceptual_hashes)),
+                    entry.result,
+                    entry.created_at,
+                    now
+                )
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM meals WHERE created_at < ?", (now - self.ttl,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM meals").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM meals WHERE key IN (SELECT key FROM meals ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def _disk_touch(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE meals SET accessed_at = ? WHERE key = ?", (time.time(), key))
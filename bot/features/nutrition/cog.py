@@ -1,9 +1,17 @@
+import base64
+import datetime
+import time
 import traceback
+import zoneinfo
+from typing import Optional, Tuple
 from discord import Interaction, app_commands, Attachment
 from discord.ext import commands
 
+from bot.core.metrics import CACHE_HIT_RATE, COMMAND_ERRORS, COMMAND_PHASE_SECONDS, REGISTRY
+from bot.services.discord.streaming import ProgressiveMessage
 from bot.services.llm.repository import LLMRepository
-from bot.services.llm.utils import download_and_encode_image
+from bot.services.llm.image import OUTPUT_FORMATS, preprocess_images
+from bot.services.llm.utils import ImageTooLargeError, download_images
 
 
 def create_nutrition_coaching_prompt(description: str = None, image_count: int = 0) -> str:
@@ -43,6 +51,25 @@ Format your response EXACTLY as follows:
 
 
 from bot.core.user.decorators import feature_enabled
+from .cache import MealResultCache
+from .domain import (
+    MEAL_ANALYSIS_RESPONSE_FORMAT,
+    MealAnalysis,
+    MealTotals,
+    create_meal_analysis_prompt,
+    render_meal_analysis,
+    render_meal_totals,
+)
+from .store import MealLogStore
+
+
+def _is_meal_analysis(text: str) -> bool:
+    """Whether a model response parses as a `MealAnalysis` (only those are cached)."""
+    try:
+        MealAnalysis.from_json(text)
+    except ValueError:
+        return False
+    return True
 
 class NutritionCoachCog(commands.Cog):
     """Nutrition coaching functionality using Gemini AI."""
@@ -50,9 +77,42 @@ class NutritionCoachCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.llm_repository = LLMRepository(
-            model_name="gemini/gemini-2.5-flash",
-            api_key=self.bot.gemini_api_key
+            model_name=self.bot.llm_model,
+            api_key=self.bot.gemini_api_key,
+            cache=self.bot.llm_cache,
+            scheduler=self.bot.llm_scheduler,
+            routing=self.bot.llm_routing,
+            latency=self.bot.llm_latency,
+            prompt_cache=self.bot.llm_prompt_cache
         )
+        self.meal_cache = None
+        if self.bot.meal_cache_max_entries > 0:
+            self.meal_cache = MealResultCache(
+                max_entries=self.bot.meal_cache_max_entries,
+                ttl=self.bot.meal_cache_ttl,
+                max_distance=self.bot.meal_cache_max_distance,
+                path=self.bot.meal_cache_path
+            )
+        self.image_format = self.bot.meal_image_format.upper()
+        if self.image_format not in OUTPUT_FORMATS:
+            print(f"MEAL_IMAGE_FORMAT must be one of {', '.join(OUTPUT_FORMATS)}; using WEBP instead of {self.bot.meal_image_format}")
+            self.image_format = "WEBP"
+        self.json_mode = self.bot.nutrition_output_mode == "json"
+        self.meal_log = MealLogStore(self.bot.meal_log_path) if self.json_mode else None
+
+    async def cog_load(self):
+        REGISTRY.add_collector(self._collect_metrics)
+
+    async def cog_unload(self):
+        REGISTRY.remove_collector(self._collect_metrics)
+        if self.meal_cache is not None:
+            self.meal_cache.close()
+        if self.meal_log is not None:
+            self.meal_log.close()
+
+    def _collect_metrics(self):
+        if self.meal_cache is not None:
+            CACHE_HIT_RATE.set(self.meal_cache.stats().hit_rate, cache="meal_result")
 
     @app_commands.command(name="meal", description="Get nutrition coaching for your meal photos and/or description.")
     @feature_enabled("nutrition")
@@ -93,20 +153,36 @@ class NutritionCoachCog(commands.Cog):
                 await interaction.followup.send(f"❌ Unsupported image format: {image.filename}. Please use JPG, PNG, or WebP.")
                 return
 
+        # Validate image sizes before downloading anything
+        max_bytes = self.bot.meal_max_image_bytes
+        for image in images:
+            if image.size > max_bytes:
+                await interaction.followup.send(f"❌ Image too large: {image.filename}. Max {max_bytes // (1024 * 1024)}MB per image.")
+                return
+
         try:
             # Prepare message content
             content = []
             
             # Add text description if provided
-            prompt_text = create_nutrition_coaching_prompt(description, len(images))
+            if self.json_mode:
+                prompt_text = create_meal_analysis_prompt(description, len(images))
+            else:
+                prompt_text = create_nutrition_coaching_prompt(description, len(images))
             content.append({"type": "text", "text": prompt_text})
 
-            # Process and add images
+            # Download all images concurrently through the shared HTTP client
             print(f"Processing {len(images)} images for meal coaching")
-            for i, image in enumerate(images):
-                print(f"Downloading and encoding image {i+1}: {image.filename}")
-                base64_image = await download_and_encode_image(image.url)
-                
+            with COMMAND_PHASE_SECONDS.time(command="meal", phase="discord_fetch"):
+                image_data_list = await download_images(
+                    [image.url for image in images],
+                    client=self.bot.http_client,
+                    max_concurrency=self.bot.meal_download_concurrency,
+                    max_bytes=max_bytes
+                )
+
+            downloaded = []
+            for image, image_data in zip(images, image_data_list):
                 # Determine content type from filename
                 if image.filename.lower().endswith(('.jpg', '.jpeg')):
                     content_type = "image/jpeg"
@@ -116,24 +192,154 @@ class NutritionCoachCog(commands.Cog):
                     content_type = "image/webp"
                 else:
                     content_type = "image/jpeg"  # fallback
-                
+                downloaded.append((image_data, content_type))
+
+            # Downscale and re-encode off the event loop (also hashes the originals)
+            build_started = time.perf_counter()
+            processed_images = await preprocess_images(
+                downloaded,
+                executor=self.bot.image_executor,
+                max_dimension=self.bot.meal_image_max_dimension,
+                output_format=self.image_format,
+                quality=self.bot.meal_image_quality
+            )
+
+            # An identical or near-identical earlier submission skips encoding and the LLM call
+            cache_scope = None
+            if self.meal_cache is not None:
+                # JSON mode stores the analysis, text mode the message: keep them apart
+                cache_scope = MealResultCache.make_scope(
+                    f"{self.llm_repository.model_name}:{self.bot.nutrition_output_mode}",
+                    str(interaction.user.id),
+                    description
+                )
+                cached = await self.meal_cache.get(cache_scope, processed_images)
+                if cached is not None and self.json_mode:
+                    try:
+                        cached = render_meal_analysis(MealAnalysis.from_json(cached), len(images))
+                    except ValueError:
+                        cached = None
+                if cached is not None:
+                    print("Meal coaching served from the result cache")
+                    COMMAND_PHASE_SECONDS.observe(time.perf_counter() - build_started, command="meal", phase="prompt_build")
+                    with COMMAND_PHASE_SECONDS.time(command="meal", phase="send"):
+                        await ProgressiveMessage(interaction).finish(fallback=cached)
+                    return
+
+            for processed in processed_images:
+                base64_image = base64.b64encode(processed.data).decode('utf-8')
                 content.append({
                     "type": "image_url",
-                    "image_url": {"url": f"data:{content_type};base64,{base64_image}"}
+                    "image_url": {"url": f"data:{processed.content_type};base64,{base64_image}"}
                 })
+            COMMAND_PHASE_SECONDS.observe(time.perf_counter() - build_started, command="meal", phase="prompt_build")
 
-            # Call Gemini API
+            if self.json_mode:
+                analysis, from_cache = await self._analyze(content)
+                if analysis is not None:
+                    with COMMAND_PHASE_SECONDS.time(command="meal", phase="send"):
+                        await ProgressiveMessage(interaction).finish(fallback=render_meal_analysis(analysis, len(images)))
+                    # A cache hit is a re-posted meal, already logged when it was first analysed
+                    if not from_cache:
+                        await self.meal_log.add(str(interaction.user.id), analysis, interaction.created_at)
+                    if cache_scope is not None:
+                        await self.meal_cache.set(cache_scope, processed_images, analysis.to_json())
+                    return
+                # Unusable JSON: stream the free-text coaching instead (not logged nor cached)
+                content[0] = {"type": "text", "text": create_nutrition_coaching_prompt(description, len(images))}
+                cache_scope = None
+
+            # Call Gemini API, streaming the coaching into the followup as it arrives
             print("Calling Gemini API for meal coaching via Repository")
-            response_text = await self.llm_repository.generate_content(content)
+            progress = ProgressiveMessage(interaction, min_edit_interval=self.bot.discord_edit_interval)
+            started = time.perf_counter()
+            async for chunk in self.llm_repository.stream_content(content, use_cache=True):
+                await progress.append(chunk)
+            await progress.finish()
+            elapsed = time.perf_counter() - started
+            COMMAND_PHASE_SECONDS.observe(elapsed - progress.send_seconds, command="meal", phase="llm_call")
+            COMMAND_PHASE_SECONDS.observe(progress.send_seconds, command="meal", phase="send")
             print("Received meal coaching from Gemini")
 
+            if cache_scope is not None and progress.body.strip():
+                await self.meal_cache.set(cache_scope, processed_images, progress.body)
+
+        except ImageTooLargeError as e:
+            COMMAND_ERRORS.inc(command="meal")
+            await interaction.followup.send(f"❌ Image too large. Max {e.max_bytes // (1024 * 1024)}MB per image.")
+            return
         except Exception as e:
             print("An error occurred with the meal coaching API call.")
+            COMMAND_ERRORS.inc(command="meal")
             traceback.print_exc()
             await interaction.followup.send("❌ An error occurred while providing coaching for your meal. Please try again later.")
             return
 
-        await interaction.followup.send(response_text)
+    async def _analyze(self, content: list) -> Tuple[Optional[MealAnalysis], bool]:
+        """
+        Request the structured analysis.
+
+        Returns the analysis (None if the model's response is empty or unusable)
+        and whether it came from the LLM response cache.
+        """
+        response = await self.llm_repository.cached_content(content, response_format=MEAL_ANALYSIS_RESPONSE_FORMAT)
+        from_cache = response is not None
+        if from_cache:
+            print("Meal analysis served from the LLM response cache")
+        else:
+            print("Calling Gemini API for a structured meal analysis via Repository")
+            with COMMAND_PHASE_SECONDS.time(command="meal", phase="llm_call"):
+                response = await self.llm_repository.generate_content(
+                    content,
+                    use_cache=True,
+                    response_format=MEAL_ANALYSIS_RESPONSE_FORMAT,
+                    cacheable=_is_meal_analysis
+                )
+        try:
+            return MealAnalysis.from_json(response), from_cache
+        except ValueError as e:
+            print(f"Invalid meal analysis, falling back to text coaching: {e}")
+            return None, from_cache
+
+    @app_commands.command(name="meal-summary", description="Show your logged calories and protein for today or the last 7 days.")
+    @feature_enabled("nutrition")
+    @app_commands.describe(period="Today or the last 7 days (default: today)")
+    @app_commands.choices(period=[
+        app_commands.Choice(name="Today", value="day"),
+        app_commands.Choice(name="Last 7 days", value="week"),
+    ])
+    async def meal_summary(self, interaction: Interaction, period: str = "day"):
+        """Sum the meals logged by /meal, without calling the LLM."""
+        if self.meal_log is None:
+            await interaction.response.send_message("❌ Meal logging requires NUTRITION_OUTPUT_MODE=json.", ephemeral=True)
+            return
+
+        try:
+            user = await self.bot.user_repository.get_user(str(interaction.user.id))
+            tz = zoneinfo.ZoneInfo(user.timezone)
+            today = datetime.datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+            days = 7 if period == "week" else 1
+            start = today - datetime.timedelta(days=days - 1)
+            end = today + datetime.timedelta(days=1)
+
+            daily = await self.meal_log.daily_totals(str(interaction.user.id), start, end, tz)
+            totals = MealTotals()
+            for day in daily.values():
+                totals.add(day)
+            if days == 1:
+                message = render_meal_totals(f"今日の記録 ({today.strftime('%Y-%m-%d')})", totals)
+            else:
+                message = render_meal_totals(
+                    f"過去7日間の記録 ({start.strftime('%Y-%m-%d')} - {today.strftime('%Y-%m-%d')})",
+                    totals,
+                    {date.strftime("%m-%d"): day for date, day in daily.items()}
+                )
+            await interaction.response.send_message(message)
+        except Exception:
+            print("An error occurred while summarizing logged meals.")
+            COMMAND_ERRORS.inc(command="meal-summary")
+            traceback.print_exc()
+            await interaction.response.send_message("❌ An error occurred while summarizing your meals.")
 
 
 async def setup(bot):
@@ -0,0 +1,193 @@
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """A point estimate with its plausible range."""
+    value: float
+    low: float
+    high: float
+
+
+@dataclass(frozen=True)
+class MealAnalysis:
+    """Structured result of a meal analysis (JSON output mode)."""
+    kcal: Estimate
+    protein_g: Estimate
+    foods: Tuple[str, ...]
+    advice: str
+    basis: str
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> "MealAnalysis":
+        """
+        Parse and validate a model response following `MEAL_ANALYSIS_SCHEMA`.
+
+        Estimates are normalized so that `low <= value <= high`.
+        Raises ValueError if the response is not usable.
+        """
+        if not text or not text.strip():
+            raise ValueError("Empty response")
+        text = text.strip()
+        if text.startswith("```"):
+            # Some models still fence JSON despite the response format
+            text = text.strip("`").removeprefix("json").strip()
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}") from None
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+
+        foods = data.get("foods", [])
+        if not isinstance(foods, list) or not all(isinstance(food, str) for food in foods):
+            raise ValueError("foods must be a list of strings")
+        return cls(
+            kcal=_parse_estimate(data, "kcal"),
+            protein_g=_parse_estimate(data, "protein_g"),
+            foods=tuple(food.strip() for food in foods if food.strip()),
+            advice=_parse_text(data, "advice"),
+            basis=_parse_text(data, "basis")
+        )
+
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["foods"] = list(self.foods)
+        return json.dumps(data, ensure_ascii=False)
+
+
+@dataclass
+class MealTotals:
+    """Sum of the logged meals of a period."""
+    meals: int = 0
+    kcal: float = 0.0
+    kcal_low: float = 0.0
+    kcal_high: float = 0.0
+    protein_g: float = 0.0
+    protein_low: float = 0.0
+    protein_high: float = 0.0
+
+    def add(self, other: "MealTotals"):
+        self.meals += other.meals
+        self.kcal += other.kcal
+        self.kcal_low += other.kcal_low
+        self.kcal_high += other.kcal_high
+        self.protein_g += other.protein_g
+        self.protein_low += other.protein_low
+        self.protein_high += other.protein_high
+
+
+_ESTIMATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "value": {"type": "number"},
+        "low": {"type": "number"},
+        "high": {"type": "number"},
+    },
+    "required": ["value", "low", "high"],
+}
+
+MEAL_ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "kcal": _ESTIMATE_SCHEMA,
+        "protein_g": _ESTIMATE_SCHEMA,
+        "foods": {"type": "array", "items": {"type": "string"}},
+        "advice": {"type": "string"},
+        "basis": {"type": "string"},
+    },
+    "required": ["kcal", "protein_g", "foods", "advice", "basis"],
+}
+
+# OpenAI-style structured output request, translated by litellm for each provider
+MEAL_ANALYSIS_RESPONSE_FORMAT: Dict[str, Any] = {
+    "type": "json_schema",
+    "json_schema": {"name": "meal_analysis", "schema": MEAL_ANALYSIS_SCHEMA, "strict": True},
+}
+
+
+def create_meal_analysis_prompt(description: Optional[str] = None, image_count: int = 0) -> str:
+    """Create the prompt of the JSON output mode. The message itself is rendered locally."""
+    prompt = """As a nutrition coach, analyze the meal(s) and answer with JSON only:
+- kcal: calories estimate with a reasonable range (low, high)
+- protein_g: protein estimate in grams with a reasonable range (low, high)
+- foods: the foods you identified
+- advice: practical coaching to improve the nutritional balance (2-3 short sentences)
+- basis: one sentence on what the estimate is based on
+
+Write foods, advice and basis in Japanese."""
+    if description:
+        prompt = f"User description: {description}\n\n" + prompt
+    if image_count == 0:
+        prompt += "\nNo photos: coach from the description only."
+    return prompt
+
+
+def render_meal_analysis(analysis: MealAnalysis, image_count: int = 0) -> str:
+    """Render an analysis as the /meal Discord message."""
+    basis = analysis.basis
+    if analysis.foods:
+        basis += f"\n特定した食品: {'、'.join(analysis.foods)}"
+    footer = f"📸 **分析画像数: {image_count}枚**" if image_count else "📸 **テキスト説明のみでコーチング**"
+    return (
+        "🍽️ **栄養コーチング結果**\n\n"
+        "📊 **栄養情報**\n"
+        f"• カロリー: {_format_estimate(analysis.kcal, ' kcal')}\n"
+        f"• タンパク質: {_format_estimate(analysis.protein_g, 'g')}\n\n"
+        "💡 **コーチングアドバイス**\n"
+        f"{analysis.advice}\n\n"
+        "📝 **分析内容**\n"
+        f"{basis}\n\n"
+        f"{footer}"
+    )
+
+
+def render_meal_totals(title: str, totals: MealTotals, days: Optional[Dict[str, MealTotals]] = None) -> str:
+    """Render logged totals, optionally with one line per day and a daily average."""
+    lines = [
+        f"📊 **{title}**",
+        f"• 食事数: {totals.meals}",
+        f"• カロリー: {totals.kcal:.0f} kcal (推定範囲: {totals.kcal_low:.0f}-{totals.kcal_high:.0f} kcal)",
+        f"• タンパク質: {totals.protein_g:.0f}g (推定範囲: {totals.protein_low:.0f}-{totals.protein_high:.0f}g)",
+    ]
+    if days:
+        logged_days = [day for day in days.values() if day.meals]
+        if logged_days:
+            lines.append(
+                f"• 1日平均 (記録した{len(logged_days)}日): "
+                f"{sum(day.kcal for day in logged_days) / len(logged_days):.0f} kcal / "
+                f"{sum(day.protein_g for day in logged_days) / len(logged_days):.0f}g"
+            )
+        lines.append("")
+        lines.extend(
+            f"`{label}` {day.kcal:.0f} kcal / {day.protein_g:.0f}g ({day.meals}食)" for label, day in days.items()
+        )
+    return "\n".join(lines)
+
+
+def _parse_estimate(data: Dict[str, Any], name: str) -> Estimate:
+    value = data.get(name)
+    if not isinstance(value, dict):
+        raise ValueError(f"{name} must be an object")
+    numbers = []
+    for key in ("value", "low", "high"):
+        number = value.get(key)
+        if isinstance(number, bool) or not isinstance(number, (int, float)) or number < 0:
+            raise ValueError(f"{name}.{key} must be a non-negative number")
+        numbers.append(float(number))
+    point, low, high = numbers
+    low, high = min(low, high, point), max(low, high, point)
+    return Estimate(value=point, low=low, high=high)
+
+
+def _parse_text(data: Dict[str, Any], name: str) -> str:
+    value = data.get(name)
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"{name} must be a non-empty string")
+    return value.strip()
+
+
+def _format_estimate(estimate: Estimate, unit: str) -> str:
+    return f"{estimate.value:.0f}{unit} (推定範囲: {estimate.low:.0f}-{estimate.high:.0f}{unit})"
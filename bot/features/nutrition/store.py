@@ -0,0 +1,103 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import threading
+from typing import Dict
+from zoneinfo import ZoneInfo
+
+from .domain import MealAnalysis, MealTotals
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meal_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    logged_at INTEGER NOT NULL,
+    kcal REAL NOT NULL,
+    kcal_low REAL NOT NULL,
+    kcal_high REAL NOT NULL,
+    protein_g REAL NOT NULL,
+    protein_low REAL NOT NULL,
+    protein_high REAL NOT NULL,
+    foods TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meal_logs_user_time ON meal_logs (user_id, logged_at);
+"""
+
+
+class MealLogStore:
+    """
+    SQLite store of the numbers of each analyzed meal, per user.
+
+    Daily and weekly totals are computed from it without calling the LLM.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: SQLite database file. The default in-memory store is lost on restart.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    async def add(self, user_id: str, analysis: MealAnalysis, logged_at: datetime.datetime):
+        await asyncio.to_thread(self._add, user_id, analysis, int(logged_at.timestamp()))
+
+    async def daily_totals(
+        self,
+        user_id: str,
+        start: datetime.datetime,
+        end: datetime.datetime,
+        tz: ZoneInfo
+    ) -> Dict[datetime.date, MealTotals]:
+        """
+        Return the user's totals of `[start, end)` per local date in `tz`.
+
+        Every date of the range is present, including days without logged meals.
+        """
+        rows = await asyncio.to_thread(self._get_range, user_id, int(start.timestamp()), int(end.timestamp()))
+        days: Dict[datetime.date, MealTotals] = {}
+        day = start.astimezone(tz).date()
+        last_day = (end - datetime.timedelta(microseconds=1)).astimezone(tz).date()
+        while day <= last_day:
+            days[day] = MealTotals()
+            day += datetime.timedelta(days=1)
+
+        for logged_at, *numbers in rows:
+            date = datetime.datetime.fromtimestamp(logged_at, tz).date()
+            days.setdefault(date, MealTotals()).add(MealTotals(1, *numbers))
+        return days
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _add(self, user_id: str, analysis: MealAnalysis, logged_at: int):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meal_logs "
+                "(user_id, logged_at, kcal, kcal_low, kcal_high, protein_g, protein_low, protein_high, foods) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    user_id,
+                    logged_at,
+                    analysis.kcal.value,
+                    analysis.kcal.low,
+                    analysis.kcal.high,
+                    analysis.protein_g.value,
+                    analysis.protein_g.low,
+                    analysis.protein_g.high,
+                    json.dumps(list(analysis.foods), ensure_ascii=False)
+                )
+            )
+
+    def _get_range(self, user_id: str, start: int, end: int) -> list:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT logged_at, kcal, kcal_low, kcal_high, protein_g, protein_low, protein_high FROM meal_logs "
+                "WHERE user_id = ? AND logged_at >= ? AND logged_at < ? ORDER BY logged_at",
+                (user_id, start, end)
+            ).fetchall()
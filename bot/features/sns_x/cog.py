@@ -1,14 +1,45 @@
+import discord
 from discord import Interaction, app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+import asyncio
 import datetime
+import re
+import time
 import zoneinfo
 
+from bot.services.llm.prompt import Prompt
 from bot.services.llm.repository import LLMRepository
+from bot.services.llm.scheduler import Priority
+from bot.services.discord.domain import DiscordPost, FetchReport
 from bot.services.discord.repository import DiscordRepository
+from bot.services.discord.streaming import ProgressiveMessage
+from bot.core.metrics import COMMAND_ERRORS, COMMAND_PHASE_SECONDS, FETCHED_MESSAGES, SNSX_DIGEST_BUCKETS
+from bot.core.singleflight import SingleFlight
 from bot.core.user.decorators import feature_enabled
-from bot.core.user.repository import UserRepository
-from .domain import SnsXDomain, SnsXDraft
+from .compaction import ChatLogEncoder
+from .domain import SnsXDigest, SnsXDomain, SnsXDraft
 from .repository import SnsXConfigRepository
+from .store import DigestStore
+from .summarizer import SnsXSummarizer
+
+# Background digests cover the last day (any user's "today") and are kept for a week
+DIGEST_BACKFILL = datetime.timedelta(hours=24)
+DIGEST_RETENTION = datetime.timedelta(days=7)
+# Buckets are summarized this long after they close, so late messages are included
+DIGEST_DELAY_MINUTES = 1
+
+
+@dataclass
+class _Segment:
+    """A time range of a digest-based draft: a stored digest, or messages still to summarize."""
+    start: datetime.datetime
+    end: datetime.datetime
+    complete: bool # A whole bucket, fully read, whose summary is stored once made
+    digest: Optional[SnsXDigest] = None
+    messages: List[DiscordPost] = field(default_factory=list)
+
 
 class SnsxCog(commands.Cog):
     """Generate X (Twitter) drafts from channel history."""
@@ -18,12 +49,363 @@ class SnsxCog(commands.Cog):
         
         # Dependencies
         self.llm_repository = LLMRepository(
-            model_name="gemini/gemini-2.5-flash",
-            api_key=self.bot.gemini_api_key
+            model_name=self.bot.llm_model,
+            api_key=self.bot.gemini_api_key,
+            cache=self.bot.llm_cache,
+            scheduler=self.bot.llm_scheduler,
+            routing=self.bot.llm_routing,
+            latency=self.bot.llm_latency,
+            prompt_cache=self.bot.llm_prompt_cache
+        )
+        self.discord_repository = DiscordRepository(
+            max_concurrency=self.bot.discord_fetch_concurrency,
+            store=self.bot.message_store
         )
-        self.discord_repository = DiscordRepository()
-        self.user_repository = UserRepository()
+        self.user_repository = self.bot.user_repository
         self.config_repository = SnsXConfigRepository()
+        self.summarizer = SnsXSummarizer(
+            self.llm_repository,
+            chunk_tokens=self.bot.snsx_chunk_tokens,
+            max_concurrency=self.bot.snsx_summary_concurrency,
+            encoder=ChatLogEncoder(
+                max_message_chars=self.bot.snsx_compact_max_message_chars,
+                max_tokens=self.bot.snsx_compact_max_tokens
+            ) if self.bot.snsx_compaction else None
+        )
+        # Identical concurrent drafts share one job
+        self.coalescer = SingleFlight(ttl=self.bot.snsx_coalesce_ttl, name="sns-x")
+
+        # Background digests (opt-in, see SNSX_DIGEST_CHANNEL_IDS)
+        self.digest_store = None
+        if self.bot.snsx_digest_channel_ids:
+            minutes = self.bot.snsx_digest_bucket_minutes
+            if minutes <= 0 or (24 * 60) % minutes:
+                print(f"SNSX_DIGEST_BUCKET_MINUTES must divide a day; using 60 instead of {minutes}")
+                minutes = 60
+            self.digest_bucket = datetime.timedelta(minutes=minutes)
+            self.digest_store = DigestStore(self.bot.snsx_digest_store_path)
+            self.update_digests.change_interval(time=[
+                datetime.time(hour=m // 60, minute=m % 60, tzinfo=datetime.timezone.utc)
+                for m in ((start + DIGEST_DELAY_MINUTES) % (24 * 60) for start in range(0, 24 * 60, minutes))
+            ])
+
+    async def cog_load(self):
+        if self.digest_store is not None:
+            self.update_digests.start()
+
+    async def cog_unload(self):
+        if self.digest_store is not None:
+            self.update_digests.cancel()
+            self.digest_store.close()
+
+    @tasks.loop(hours=1) # Rescheduled to the bucket boundaries in __init__
+    async def update_digests(self):
+        """Summarize the closed buckets of every digest channel that are not stored yet."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for channel_id in self.bot.snsx_digest_channel_ids:
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue # Not visible from this process (e.g. handled by another cluster)
+            try:
+                segments = await self._collect_segments(channel, now - DIGEST_BACKFILL, now, partial=False)
+                await self._summarize_segments(channel.id, segments, priority=Priority.BULK)
+                missing = sum(1 for segment in segments if segment.digest is None)
+                if missing:
+                    print(f"Stored {missing} SNS-X digests for channel {channel_id}")
+            except Exception as e:
+                print(f"Failed to update SNS-X digests of channel {channel_id}: {e}")
+        await self.digest_store.prune(now - DIGEST_RETENTION)
+
+    @update_digests.before_loop
+    async def before_update_digests(self):
+        await self.bot.wait_until_ready()
+        # The loop first fires at the next bucket boundary: catch up on the day so far now
+        await self.update_digests()
+
+    def _uses_digests(self, channel) -> bool:
+        return self.digest_store is not None and channel.id in self.bot.snsx_digest_channel_ids
+
+    async def _collect_segments(
+        self,
+        channel,
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+        partial: bool = True
+    ) -> List[_Segment]:
+        """
+        Split a time range into buckets and read what is not stored yet.
+
+        Stored buckets keep their digest; the messages of missing buckets (and,
+        with `partial`, of the incomplete edges of the range) are fetched segment
+        by segment, in full: a digest must cover its whole bucket, so no draft
+        budget or per-source limit applies.
+        """
+        buckets = SnsXDomain.complete_buckets(start_dt, end_dt, self.digest_bucket)
+        stored = {digest.start: digest for digest in await self.digest_store.get_range(channel.id, start_dt, end_dt)}
+
+        segments = []
+        cursor = start_dt
+        for bucket_start, bucket_end in buckets:
+            if partial and cursor < bucket_start:
+                segments.append(_Segment(cursor, bucket_start, complete=False))
+            segments.append(_Segment(bucket_start, bucket_end, complete=True, digest=stored.get(bucket_start)))
+            cursor = bucket_end
+        if partial and cursor < end_dt:
+            segments.append(_Segment(cursor, end_dt, complete=False))
+
+        semaphore = asyncio.Semaphore(self.discord_repository.max_concurrency)
+
+        async def fetch(segment: _Segment):
+            async with semaphore:
+                report = FetchReport()
+                segment.messages = await self.discord_repository.fetch_messages(
+                    channel, after=segment.start, before=segment.end, limit=None, report=report
+                )
+            if report.errors:
+                # Some threads could not be read: summarize what we have, but never store it as the bucket's digest
+                segment.complete = False
+
+        await asyncio.gather(*(fetch(segment) for segment in segments if segment.digest is None))
+        return segments
+
+    async def _summarize_segments(self, channel_id: int, segments: List[_Segment], priority: Priority) -> List[str]:
+        """Return the summary of every segment (empty when it has no messages), storing those of whole buckets."""
+        async def summarize(segment: _Segment) -> str:
+            if segment.digest is not None:
+                return segment.digest.summary
+            summary = ""
+            if segment.messages:
+                summary = await self.summarizer.summarize_messages(
+                    segment.messages, language=self.bot.snsx_digest_language, use_cache=True, priority=priority
+                )
+            if segment.complete:
+                SNSX_DIGEST_BUCKETS.inc(source="summarized")
+                await self.digest_store.save(
+                    SnsXDigest(channel_id, segment.start, segment.end, summary, len(segment.messages))
+                )
+            return summary
+
+        return await asyncio.gather(*(summarize(segment) for segment in segments))
+
+    async def _collect_messages(self, channel, start_dt: datetime.datetime, end_dt: datetime.datetime):
+        """Stream the channel history, keeping the newest messages within the configured message/token budget."""
+        stream = self.discord_repository.iter_messages(channel=channel, after=start_dt, before=end_dt, limit=None)
+        return await SnsXDomain.collect_messages(
+            stream,
+            max_messages=self.bot.snsx_max_messages,
+            max_tokens=self.bot.snsx_max_prompt_tokens,
+            keep_newest=True
+        )
+
+    async def _respond_with_draft(
+        self,
+        interaction: Interaction,
+        title: str,
+        time_range_str: str,
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+        persona: str,
+        language: str,
+        empty_text: str,
+        use_digests: bool = False
+    ) -> SnsXDraft:
+        """
+        Fetch messages and stream the draft into progressively edited followup messages.
+
+        Identical concurrent requests (same command, channel, time range to the minute,
+        persona and language) share one job; callers that joined it receive the finished draft.
+        With `use_digests`, the draft is written from the stored bucket digests plus
+        a summary of the messages they do not cover yet.
+        """
+        command = interaction.command.name if interaction.command else "sns-x"
+        # The command is part of the key: each one has its own title, empty text and digest path
+        key = (
+            command,
+            use_digests,
+            interaction.channel.id,
+            int(start_dt.timestamp()) // 60,
+            int(end_dt.timestamp()) // 60,
+            persona,
+            language
+        )
+        heading = f"**{title}**\nTime: {time_range_str}\n"
+
+        async def job() -> SnsXDraft:
+            with COMMAND_PHASE_SECONDS.time(command=command, phase="discord_fetch"):
+                if use_digests:
+                    segments = await self._collect_segments(interaction.channel, start_dt, end_dt)
+                    messages = [message for segment in segments for message in segment.messages]
+                    stored = [segment.digest for segment in segments if segment.digest is not None]
+                    SNSX_DIGEST_BUCKETS.inc(len(stored), source="stored")
+                    message_count = len(messages) + sum(digest.message_count for digest in stored)
+                else:
+                    messages = await self._collect_messages(interaction.channel, start_dt, end_dt)
+                    message_count = len(messages)
+            FETCHED_MESSAGES.observe(len(messages), command=command)
+            if not message_count:
+                with COMMAND_PHASE_SECONDS.time(command=command, phase="send"):
+                    await interaction.followup.send(f"{heading}\n{empty_text}")
+                return SnsXDraft(content="", source_posts_count=0)
+
+            progress = ProgressiveMessage(
+                interaction,
+                header=f"{heading}Messages: {message_count}\n\n",
+                min_edit_interval=self.bot.discord_edit_interval
+            )
+            await progress.flush() # Show the header while the draft is being generated
+
+            with COMMAND_PHASE_SECONDS.time(command=command, phase="prompt_build"):
+                if use_digests:
+                    # Only the latest partial bucket (and any bucket not stored yet) is summarized here
+                    summaries = await self._summarize_segments(
+                        interaction.channel.id, segments, priority=Priority.INTERACTIVE
+                    )
+                    prompt = await self.summarizer.prepare_draft_prompt_from_summaries(
+                        [summary for summary in summaries if summary], persona=persona, language=language, use_cache=True
+                    )
+                else:
+                    prompt = await self.summarizer.prepare_draft_prompt(
+                        messages, persona=persona, language=language, use_cache=True
+                    )
+
+            content = await self._stream_draft(command, progress, prompt)
+            return SnsXDraft(content=content, source_posts_count=message_count)
+
+        draft, shared = await self.coalescer.do(key, job)
+        if shared:
+            await self._send_shared_draft(interaction, heading, draft, empty_text)
+        return draft
+
+    async def _respond_with_multi_channel_draft(
+        self,
+        interaction: Interaction,
+        title: str,
+        time_range_str: str,
+        channels: List[discord.TextChannel],
+        start_dt: datetime.datetime,
+        end_dt: datetime.datetime,
+        persona: str,
+        language: str
+    ) -> SnsXDraft:
+        """
+        Fetch several channels under one budget and stream a single combined draft.
+
+        The channels are read concurrently; `SNSX_MAX_MESSAGES` is split across
+        them by activity and `SNSX_FETCH_TIMEOUT_SECONDS` bounds the whole fetch.
+        """
+        key = (
+            tuple(sorted(channel.id for channel in channels)),
+            int(start_dt.timestamp()) // 60,
+            int(end_dt.timestamp()) // 60,
+            persona,
+            language
+        )
+        command = interaction.command.name if interaction.command else "sns-x-channels"
+        heading = f"**{title}**\nTime: {time_range_str}\nChannels: {', '.join(channel.mention for channel in channels)}\n"
+        empty_text = "No messages found in these channels."
+
+        async def job() -> SnsXDraft:
+            with COMMAND_PHASE_SECONDS.time(command=command, phase="discord_fetch"):
+                streams = {
+                    channel: self.discord_repository.iter_messages(channel=channel, after=start_dt, before=end_dt)
+                    for channel in channels
+                }
+                ranked = await SnsXDomain.collect_ranked(
+                    streams,
+                    start_dt,
+                    end_dt,
+                    max_messages=self.bot.snsx_max_messages,
+                    timeout=self.bot.snsx_fetch_timeout
+                )
+            names = [channel.name for channel in ranked]
+            sources = {
+                channel.name if names.count(channel.name) == 1 else f"{channel.name} ({channel.id})": messages
+                for channel, messages in ranked.items()
+            }
+            message_count = sum(len(messages) for messages in sources.values())
+            FETCHED_MESSAGES.observe(message_count, command=command)
+            if not message_count:
+                with COMMAND_PHASE_SECONDS.time(command=command, phase="send"):
+                    await interaction.followup.send(f"{heading}\n{empty_text}")
+                return SnsXDraft(content="", source_posts_count=0)
+
+            progress = ProgressiveMessage(
+                interaction,
+                header=f"{heading}Messages: {message_count}\n\n",
+                min_edit_interval=self.bot.discord_edit_interval
+            )
+            await progress.flush() # Show the header while the draft is being generated
+
+            with COMMAND_PHASE_SECONDS.time(command=command, phase="prompt_build"):
+                prompt = await self.summarizer.prepare_multi_channel_draft_prompt(
+                    sources, persona=persona, language=language, use_cache=True
+                )
+
+            content = await self._stream_draft(command, progress, prompt)
+            return SnsXDraft(content=content, source_posts_count=message_count)
+
+        draft, shared = await self.coalescer.do(key, job)
+        if shared:
+            await self._send_shared_draft(interaction, heading, draft, empty_text)
+        return draft
+
+    async def _stream_draft(self, command: str, progress: ProgressiveMessage, prompt: Prompt) -> str:
+        """Stream the draft into `progress` and return it."""
+        # Streaming interleaves generation and Discord edits; split the two afterwards
+        started = time.perf_counter()
+        async for chunk in self.llm_repository.stream_content(prompt, use_cache=True):
+            await progress.append(chunk)
+        await progress.finish()
+        elapsed = time.perf_counter() - started
+        COMMAND_PHASE_SECONDS.observe(elapsed - progress.send_seconds, command=command, phase="llm_call")
+        COMMAND_PHASE_SECONDS.observe(progress.send_seconds, command=command, phase="send")
+        return progress.body
+
+    async def _send_shared_draft(self, interaction: Interaction, heading: str, draft: SnsXDraft, empty_text: str):
+        """Send a draft produced by another caller's job."""
+        if draft.source_posts_count == 0:
+            await interaction.followup.send(f"{heading}\n{empty_text}")
+        else:
+            progress = ProgressiveMessage(interaction, header=f"{heading}Messages: {draft.source_posts_count}\n\n")
+            await progress.finish(fallback=draft.content)
+
+    @staticmethod
+    def _parse_time_range(
+        tz: zoneinfo.ZoneInfo,
+        date_from: Optional[str],
+        date_to: Optional[str]
+    ) -> Tuple[datetime.datetime, datetime.datetime]:
+        """
+        Resolve the YYYY-MM-DD command options in the user's timezone.
+
+        Defaults to the last 24 hours. Raises ValueError with a user-facing message.
+        """
+        now = datetime.datetime.now(tz)
+
+        if date_from:
+            try:
+                # Parse YYYY-MM-DD in User's Timezone
+                d_from = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError("Invalid date_from format. Use YYYY-MM-DD.") from None
+            # Start of that day
+            start_dt = datetime.datetime.combine(d_from, datetime.time.min, tzinfo=tz)
+        else:
+            # Default to 24 hours ago from now
+            start_dt = now - datetime.timedelta(hours=24)
+
+        if date_to:
+            try:
+                d_to = datetime.datetime.strptime(date_to, "%Y-%m-%d").date()
+            except ValueError:
+                raise ValueError("Invalid date_to format. Use YYYY-MM-DD.") from None
+            # End of that day (inclusive)
+            end_dt = datetime.datetime.combine(d_to, datetime.time.max, tzinfo=tz)
+        else:
+            # Default to Now
+            end_dt = now
+
+        return start_dt, end_dt
 
     @app_commands.command(name="sns-x", description="Generate an X post draft from messages.")
     @feature_enabled("sns-x")
@@ -46,7 +428,7 @@ class SnsxCog(commands.Cog):
 
         try:
             # Get User Settings
-            user = self.user_repository.get_user(str(interaction.user.id))
+            user = await self.user_repository.get_user(str(interaction.user.id))
             # Get Feature Config
             config = self.config_repository.get_config(str(interaction.user.id))
             
@@ -54,65 +436,30 @@ class SnsxCog(commands.Cog):
             target_lang = language or user.language
 
             # Determine Time Range
-            now = datetime.datetime.now(tz)
-            
-            # Default: Last 24 hours (UTC calculation safe, but better to be explicit)
-            start_dt = None
-            end_dt = None
-
-            if date_from:
-                try:
-                    # Parse YYYY-MM-DD in User's Timezone
-                    d_from = datetime.datetime.strptime(date_from, "%Y-%m-%d").date()
-                    # Start of that day
-                    start_dt = datetime.datetime.combine(d_from, datetime.time.min, tzinfo=tz)
-                except ValueError:
-                    await interaction.followup.send("❌ Invalid date_from format. Use YYYY-MM-DD.")
-                    return
-            else:
-                # Default to 24 hours ago from now
-                start_dt = now - datetime.timedelta(hours=24)
-
-            if date_to:
-                try:
-                    d_to = datetime.datetime.strptime(date_to, "%Y-%m-%d").date()
-                    # End of that day (or start of next day?) Usually users expect inclusive. 
-                    # Let's set it to end of day 23:59:59
-                    end_dt = datetime.datetime.combine(d_to, datetime.time.max, tzinfo=tz)
-                except ValueError:
-                    await interaction.followup.send("❌ Invalid date_to format. Use YYYY-MM-DD.")
-                    return
-            else:
-                # Default to Now
-                end_dt = now
+            try:
+                start_dt, end_dt = self._parse_time_range(tz, date_from, date_to)
+            except ValueError as e:
+                await interaction.followup.send(f"❌ {e}")
+                return
 
             # Message
             time_range_str = f"{start_dt.strftime('%Y-%m-%d %H:%M')} - {end_dt.strftime('%Y-%m-%d %H:%M')} ({user.timezone})"
             print(f"Fetching messages for {time_range_str}")
 
-            # Fetch messages
-            messages = await self.discord_repository.fetch_messages(
-                channel=interaction.channel, 
-                after=start_dt,
-                before=end_dt
+            # Fetch messages and generate draft (streamed)
+            await self._respond_with_draft(
+                interaction,
+                f"X Post Draft ({target_lang})",
+                time_range_str,
+                start_dt,
+                end_dt,
+                persona=config.persona,
+                language=target_lang,
+                empty_text="No messages found in this period."
             )
             
-            if not messages:
-                await interaction.followup.send(f"**X Post Draft**\nTime: {time_range_str}\n\nNo messages found in this period.")
-                return
-
-            # Generate draft
-            prompt = SnsXDomain.create_draft_prompt(messages, persona=config.persona, language=target_lang)
-            content = await self.llm_repository.generate_content(prompt)
-            draft = SnsXDraft(content=content, source_posts_count=len(messages))
-            
-            response_text = f"**X Post Draft ({target_lang})**\nTime: {time_range_str}\nMessages: {draft.source_posts_count}\n\n{draft.content}"
-            if len(response_text) > 2000:
-                response_text = response_text[:1900] + "\n...(truncated)"
-                
-            await interaction.followup.send(response_text)
-            
         except Exception as e:
+            COMMAND_ERRORS.inc(command="sns-x")
             await interaction.followup.send(f"❌ An error occurred: {e}")
 
     @app_commands.command(name="sns-x-today", description="Generate an X post draft for today's messages.")
@@ -127,7 +474,7 @@ class SnsxCog(commands.Cog):
         await interaction.response.defer()
 
         try:
-            user = self.user_repository.get_user(str(interaction.user.id))
+            user = await self.user_repository.get_user(str(interaction.user.id))
             # Get Feature Config
             config = self.config_repository.get_config(str(interaction.user.id))
 
@@ -142,29 +489,104 @@ class SnsxCog(commands.Cog):
             time_range_str = f"{start_dt.strftime('%Y-%m-%d %H:%M')} - {end_dt.strftime('%Y-%m-%d %H:%M')} ({user.timezone})"
             print(f"Fetching messages for {time_range_str} (Today)")
 
-            messages = await self.discord_repository.fetch_messages(
-                channel=interaction.channel, 
-                after=start_dt,
-                before=end_dt
+            await self._respond_with_draft(
+                interaction,
+                f"X Post Draft (Today, {target_lang})",
+                time_range_str,
+                start_dt,
+                end_dt,
+                persona=config.persona,
+                language=target_lang,
+                empty_text="No messages found today.",
+                use_digests=self._uses_digests(interaction.channel)
             )
             
-            if not messages:
-                await interaction.followup.send(f"**X Post Draft (Today)**\nTime: {time_range_str}\n\nNo messages found today.")
+        except Exception as e:
+            COMMAND_ERRORS.inc(command="sns-x-today")
+            await interaction.followup.send(f"❌ An error occurred: {e}")
+
+    @app_commands.command(name="sns-x-channels", description="Generate one X post draft from several channels.")
+    @app_commands.guild_only()
+    @feature_enabled("sns-x")
+    @app_commands.describe(
+        channels="Channel mentions or IDs, separated by spaces.",
+        category="Use every text channel of this category.",
+        date_from="Start date (YYYY-MM-DD). Default: 24 hours ago.",
+        date_to="End date (YYYY-MM-DD). Default: Now.",
+        language="Output language (e.g. ja, en). Default: User setting."
+    )
+    async def sns_x_channels(
+        self,
+        interaction: Interaction,
+        channels: str = None,
+        category: discord.CategoryChannel = None,
+        date_from: str = None,
+        date_to: str = None,
+        language: str = None
+    ):
+        """
+        Generate an X post draft from several channels (and their threads) at once.
+        """
+        await interaction.response.defer()
+
+        try:
+            user = await self.user_repository.get_user(str(interaction.user.id))
+            config = self.config_repository.get_config(str(interaction.user.id))
+
+            tz = zoneinfo.ZoneInfo(user.timezone)
+            target_lang = language or user.language
+
+            try:
+                start_dt, end_dt = self._parse_time_range(tz, date_from, date_to)
+            except ValueError as e:
+                await interaction.followup.send(f"❌ {e}")
                 return
 
-            # Generate draft
-            prompt = SnsXDomain.create_draft_prompt(messages, persona=config.persona, language=target_lang)
-            content = await self.llm_repository.generate_content(prompt)
-            draft = SnsXDraft(content=content, source_posts_count=len(messages))
-            
-            response_text = f"**X Post Draft (Today, {target_lang})**\nTime: {time_range_str}\nMessages: {draft.source_posts_count}\n\n{draft.content}"
-            if len(response_text) > 2000:
-                response_text = response_text[:1900] + "\n...(truncated)"
-                
-            await interaction.followup.send(response_text)
-            
+            targets = self._resolve_channels(interaction, channels, category)
+            if not targets:
+                await interaction.followup.send("❌ Specify readable text channels or a category.")
+                return
+
+            time_range_str = f"{start_dt.strftime('%Y-%m-%d %H:%M')} - {end_dt.strftime('%Y-%m-%d %H:%M')} ({user.timezone})"
+            print(f"Fetching messages of {len(targets)} channels for {time_range_str}")
+
+            await self._respond_with_multi_channel_draft(
+                interaction,
+                f"X Post Draft ({target_lang})",
+                time_range_str,
+                targets,
+                start_dt,
+                end_dt,
+                persona=config.persona,
+                language=target_lang
+            )
+
         except Exception as e:
+            COMMAND_ERRORS.inc(command="sns-x-channels")
             await interaction.followup.send(f"❌ An error occurred: {e}")
 
+    def _resolve_channels(
+        self,
+        interaction: Interaction,
+        channels: Optional[str],
+        category: Optional[discord.CategoryChannel]
+    ) -> List[discord.TextChannel]:
+        """Text channels named by the options that the invoking user can read (at most `SNSX_MAX_CHANNELS`)."""
+        candidates = list(category.text_channels) if category else []
+        for channel_id in re.findall(r"\d{15,20}", channels or ""):
+            channel = interaction.guild.get_channel(int(channel_id))
+            if channel is not None and channel not in candidates:
+                candidates.append(channel)
+
+        readable = []
+        for channel in candidates:
+            if not isinstance(channel, discord.TextChannel):
+                continue
+            # Never digest a channel the user could not read themselves
+            permissions = channel.permissions_for(interaction.user)
+            if permissions.view_channel and permissions.read_message_history:
+                readable.append(channel)
+        return readable[:self.bot.snsx_max_channels]
+
 async def setup(bot):
     await bot.add_cog(SnsxCog(bot))
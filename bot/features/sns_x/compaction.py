@@ -0,0 +1,276 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bot.services.discord.domain import DiscordPost
+from bot.services.llm.tokens import estimate_tokens
+
+_URL = re.compile(r"https?://\S+")
+_CODE_BLOCK = re.compile(r"```(?:[^\n`]*\n)?(.*?)```", re.DOTALL)
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATED = re.compile(r"(.)\1{2,}")
+_DOUBLED = re.compile(r"(.)\1+")
+
+# Replies that carry no content on their own
+TRIVIAL_REPLIES = frozenset({
+    "ok", "okay", "k", "lol", "lmao", "xd", "w", "ｗ", "草", "gg", "nice", "wow", "oh", "ah", "hmm",
+    "yes", "ye", "yeah", "yep", "yup", "no", "nope", "thx", "thanks", "ty", "np",
+    "はい", "うん", "ええ", "おk", "おけ", "りょ", "了解", "ありがとう", "あざす",
+    "それな", "たしかに", "確かに", "なるほど", "まじ", "マジ", "いいね", "わかる", "ほんと", "ね",
+})
+
+
+@dataclass
+class CompactionReport:
+    """What the encoder did to a chat log, with estimated token counts before and after."""
+    messages: int = 0
+    groups: int = 0
+    trivial: int = 0        # Short replies (see TRIVIAL_REPLIES) folded into summary lines
+    duplicates: int = 0     # Repeats of a recent message, counted on the first one
+    truncated: int = 0      # Messages cut to max_message_chars
+    links: int = 0          # URLs shortened to their host and first path segment
+    code_blocks: int = 0    # Code blocks reduced to their first line
+    omitted: int = 0        # Messages dropped to fit the token budget
+    original_tokens: int = 0
+    compacted_tokens: int = 0
+
+    @property
+    def reduction(self) -> float:
+        """Share of the original tokens saved (0.0 - 1.0)."""
+        if not self.original_tokens:
+            return 0.0
+        return max(0.0, 1 - self.compacted_tokens / self.original_tokens)
+
+    def describe(self) -> str:
+        return (
+            f"{self.original_tokens} -> {self.compacted_tokens} estimated tokens (-{self.reduction:.0%}), "
+            f"{self.messages} messages in {self.groups} groups, {self.trivial} short replies, "
+            f"{self.duplicates} duplicates, {self.truncated} truncated, {self.links} links, "
+            f"{self.code_blocks} code blocks, {self.omitted} omitted"
+        )
+
+
+@dataclass
+class CompactedLog:
+    text: str
+    report: CompactionReport
+
+
+@dataclass
+class _Group:
+    """Consecutive messages of one author in one thread (or a run of short replies when `author` is None)."""
+    author: Optional[str]
+    thread: Optional[str]
+    offset: int                     # Minutes since the start of the log
+    last_offset: int
+    lines: List[str] = field(default_factory=list)
+    counts: List[int] = field(default_factory=list)
+    size: int = 0                   # Messages represented
+
+    def render(self) -> str:
+        stamp = f"[+{self.offset // 60}:{self.offset % 60:02d}]"
+        if self.author is None:
+            samples = ", ".join(dict.fromkeys(self.lines))  # "author: reply" lines
+            replies = "1 short reply" if self.size == 1 else f"{self.size} short replies"
+            return f"{stamp} ({replies}: {samples})" if samples else f"{stamp} ({replies})"
+        where = f" in {self.thread}" if self.thread else ""
+        lines = [line if count == 1 else f"{line} (x{count})" for line, count in zip(self.lines, self.counts)]
+        if len(lines) == 1:
+            return f"{stamp} {self.author}{where}: {lines[0]}"
+        return f"{stamp} {self.author}{where}:\n" + "\n".join(f"  {line}" for line in lines)
+
+
+class ChatLogEncoder:
+    """
+    Compact a chat log for LLM prompts.
+
+    Compared with one `[YYYY-MM-DD HH:MM] author (in Thread: name): content`
+    line per message, the encoder:
+
+    * groups consecutive messages of an author in a thread under one header
+      with a time relative to the start of the log,
+    * folds runs of short replies ("ok", "lol", "草", see `TRIVIAL_REPLIES`) into
+      one line that keeps who said them,
+    * counts an author's repeats of a recent message in the same thread
+      instead of repeating it,
+    * shortens links to their host and first path segment, reduces code blocks
+      to their first line and truncates long messages (head and tail kept),
+    * and, over `max_tokens`, thins the log evenly (marking what was left out).
+
+    Tokens are counted with the local `estimate_tokens`, no tokenizer involved.
+    """
+
+    def __init__(
+        self,
+        max_message_chars: int = 400,
+        max_link_chars: int = 40,
+        trivial_replies: frozenset = TRIVIAL_REPLIES,
+        group_gap_minutes: int = 10,
+        duplicate_window: int = 50,
+        max_tokens: Optional[int] = None
+    ):
+        """
+        Args:
+            max_message_chars: Longer messages keep their beginning and end only.
+            max_link_chars: Max length of a shortened link.
+            trivial_replies: Replies folded as short replies (compared casefolded, without punctuation
+                and with doubled letters collapsed). Messages without any word character are folded too.
+            group_gap_minutes: A pause longer than this starts a new group even for the same author.
+            duplicate_window: How many earlier messages a repeat (same author and thread) is looked up in.
+            max_tokens: Budget of the encoded log. None disables it.
+        """
+        self.max_message_chars = max(40, max_message_chars)
+        self.max_link_chars = max(10, max_link_chars)
+        self.trivial_replies = frozenset(_trivial_key(reply) for reply in trivial_replies)
+        self.group_gap_minutes = group_gap_minutes
+        self.duplicate_window = duplicate_window
+        self.max_tokens = max_tokens
+
+    def encode(self, messages: List[DiscordPost]) -> CompactedLog:
+        """Encode a time-ordered chat log. The text starts with the absolute time the offsets refer to."""
+        report = CompactionReport(messages=len(messages))
+        if not messages:
+            return CompactedLog("", report)
+        report.original_tokens = sum(estimate_tokens(format_line(msg)) for msg in messages)
+
+        start = messages[0].posted_at
+        groups = self._group(messages, start, report)
+        report.groups = len(groups)
+        header = f"Times are hours:minutes since {start.strftime('%Y-%m-%d %H:%M')}."
+        lines = [group.render() for group in groups]
+        text = "\n".join([header] + lines)
+        report.compacted_tokens = estimate_tokens(text)
+
+        if self.max_tokens is not None and report.compacted_tokens > self.max_tokens:
+            text = self._fit(header, groups, lines, report)
+            report.compacted_tokens = estimate_tokens(text)
+        return CompactedLog(text, report)
+
+    def compact_text(self, content: str, report: Optional[CompactionReport] = None) -> str:
+        """Compact one message body: links, code blocks, whitespace and length."""
+        report = report if report is not None else CompactionReport()
+
+        def code(match: re.Match) -> str:
+            report.code_blocks += 1
+            body = match.group(1).strip().splitlines()
+            first = body[0].strip() if body else ""
+            return f"[code, {len(body)} lines: {first[:60]}]"
+
+        def link(match: re.Match) -> str:
+            report.links += 1
+            return self._shorten_link(match.group(0))
+
+        text = _CODE_BLOCK.sub(code, content) if "```" in content else content
+        text = _URL.sub(link, text) if "://" in text else text
+        text = " ".join(text.split())
+        if len(text) > self.max_message_chars:
+            report.truncated += 1
+            head = self.max_message_chars * 2 // 3
+            tail = self.max_message_chars - head
+            text = f"{text[:head]} [...{len(text) - head - tail} chars...] {text[-tail:]}"
+        return text
+
+    def _group(self, messages: List[DiscordPost], start, report: CompactionReport) -> List[_Group]:
+        groups: List[_Group] = []
+        recent: Dict[tuple, tuple] = {}  # Duplicate key -> (message index, group, line index)
+        for index, msg in enumerate(messages):
+            offset = int((msg.posted_at - start).total_seconds() // 60)
+            text = self.compact_text(msg.content, report)
+            words = _NON_WORD.sub("", text)
+            last = groups[-1] if groups else None
+
+            if not words or _trivial_key(words) in self.trivial_replies:
+                report.trivial += 1
+                sample = [f"{msg.author_name}: {text}"] if text else []
+                if last is not None and last.author is None and last.thread == msg.thread_name:
+                    last.size += 1
+                    if len(last.lines) < 5:
+                        last.lines.extend(sample)
+                else:
+                    groups.append(_Group(None, msg.thread_name, offset, offset, sample, [], 1))
+                continue
+
+            key = (msg.author_name, msg.thread_name, _duplicate_key(words))
+            seen = recent.get(key)
+            if seen is not None and index - seen[0] <= self.duplicate_window:
+                report.duplicates += 1
+                seen[1].counts[seen[2]] += 1
+                seen[1].size += 1
+                continue
+
+            if (
+                last is None
+                or last.author != msg.author_name
+                or last.thread != msg.thread_name
+                or offset - last.last_offset > self.group_gap_minutes
+            ):
+                last = _Group(msg.author_name, msg.thread_name, offset, offset)
+                groups.append(last)
+            last.lines.append(text)
+            last.counts.append(1)
+            last.size += 1
+            last.last_offset = offset
+            recent[key] = (index, last, len(last.lines) - 1)
+        return groups
+
+    def _fit(self, header: str, groups: List[_Group], lines: List[str], report: CompactionReport) -> str:
+        """Keep evenly spread groups within max_tokens, marking each gap with the number of messages left out."""
+        budget = self.max_tokens - estimate_tokens(header)
+        costs = [estimate_tokens(line) + 1 for line in lines]
+        keep = len(lines)
+        while keep > 0:
+            # Evenly spaced indices, so the whole period stays represented
+            kept = sorted({round(i * (len(lines) - 1) / max(1, keep - 1)) for i in range(keep)}) if keep > 1 else [len(lines) - 1]
+            gaps = sum(1 for a, b in zip([-1] + kept, kept + [len(lines)]) if b - a > 1)
+            total = sum(costs[i] for i in kept) + 8 * gaps  # ~8 tokens per omission marker
+            if total <= budget:
+                break
+            keep = min(keep - 1, int(keep * budget / total))
+        else:
+            kept = []
+
+        output = [header]
+        previous = -1
+        for index in kept:
+            omitted = sum(group.size for group in groups[previous + 1:index])
+            if omitted:
+                report.omitted += omitted
+                output.append(f"[... {omitted} messages omitted ...]")
+            output.append(lines[index])
+            previous = index
+        omitted = sum(group.size for group in groups[previous + 1:])
+        if omitted:
+            report.omitted += omitted
+            output.append(f"[... {omitted} messages omitted ...]")
+        return "\n".join(output)
+
+    def _shorten_link(self, url: str) -> str:
+        _, _, rest = url.partition("://")
+        host, _, path = rest.partition("/")
+        first = path.split("/", 1)[0].split("?", 1)[0]
+        short = f"{host}/{first}" if first else host
+        if len(short) > self.max_link_chars:
+            short = short[:self.max_link_chars - 3] + "..."
+        return f"<{short}>"
+
+
+def _trivial_key(words: str) -> str:
+    """Case and doubled letters ("www", "hmm", "草草") are ignored when spotting short replies."""
+    return _DOUBLED.sub(r"\1", words.casefold())
+
+
+def _duplicate_key(words: str) -> str:
+    """Case and stretched letters ("sooo") of the word characters are ignored when spotting repeats."""
+    return _REPEATED.sub(r"\1", words.casefold())
+
+
+def format_line(msg: DiscordPost) -> str:
+    """Format a single message as an uncompacted chat log line (also the baseline of the report)."""
+    # Format: [Time] User: Content
+    # Note: Explicitly excluding attachments here as requested.
+    base_info = f"[{msg.posted_at.strftime('%Y-%m-%d %H:%M')}] {msg.author_name}"
+
+    if msg.thread_name:
+        base_info += f" (in Thread: {msg.thread_name})"
+
+    return f"{base_info}: {msg.content}"
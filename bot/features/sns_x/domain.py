@@ -1,12 +1,32 @@
+import asyncio
+import datetime
+import math
+from collections import deque
+from contextlib import aclosing
 from dataclasses import dataclass
-from typing import List
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
 from bot.services.discord.domain import DiscordPost
+from bot.services.llm.prompt import Prompt
+from bot.services.llm.tokens import estimate_tokens
+from .compaction import ChatLogEncoder, format_line
+
+T = TypeVar("T")
+K = TypeVar("K")
 
 @dataclass
 class SnsXDraft:
     content: str
     source_posts_count: int
 
+@dataclass
+class SnsXDigest:
+    """Summary of one channel's messages in a fixed time bucket `[start, end)`."""
+    channel_id: int
+    start: datetime.datetime
+    end: datetime.datetime
+    summary: str          # Empty when the bucket had no messages
+    message_count: int
+
 @dataclass
 class SnsXConfig:
     user_id: str
@@ -14,40 +34,401 @@ class SnsXConfig:
 
 class SnsXDomain:
     @staticmethod
-    def create_draft_prompt(messages: List[DiscordPost], persona: str, language: str = "ja") -> str:
+    async def collect_messages(
+        stream: AsyncIterator[DiscordPost],
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        keep_newest: bool = False
+    ) -> List[DiscordPost]:
+        """
+        Pull messages from a time-ordered stream until a budget is reached.
+
+        By default the oldest messages are kept: the stream is closed as soon as
+        either budget is hit, so the source stops fetching history the prompt
+        would not use anyway. With `keep_newest`, the whole stream is read and
+        the oldest messages are dropped instead, which suits windows ending now
+        (the latest messages matter most for a "today" draft).
+        """
+        messages: Deque[Tuple[DiscordPost, int]] = deque()
+        tokens = 0
+        dropped = 0
+        async with aclosing(stream):
+            async for msg in stream:
+                line_tokens = estimate_tokens(SnsXDomain.format_message(msg))
+                if not keep_newest and (
+                    (max_messages is not None and len(messages) >= max_messages)
+                    or (max_tokens is not None and tokens + line_tokens > max_tokens)
+                ):
+                    dropped = -1 # Unknown: the rest of the stream is never read
+                    break
+                messages.append((msg, line_tokens))
+                tokens += line_tokens
+                while messages and (
+                    (max_messages is not None and len(messages) > max_messages)
+                    or (max_tokens is not None and tokens > max_tokens)
+                ):
+                    tokens -= messages.popleft()[1]
+                    dropped += 1
+
+        kept = [msg for msg, _ in messages]
+        if dropped < 0:
+            print(
+                f"Stopped reading history at budget: {len(kept)} messages, ~{tokens} tokens "
+                f"(dropped everything after {kept[-1].posted_at.isoformat() if kept else 'the start'})"
+            )
+        elif dropped:
+            print(
+                f"History over budget: kept the newest {len(kept)} messages, ~{tokens} tokens "
+                f"(dropped {dropped} messages before {kept[0].posted_at.isoformat() if kept else 'the end'})"
+            )
+        return kept
+
+    @staticmethod
+    async def collect_ranked(
+        streams: Dict[K, AsyncIterator[DiscordPost]],
+        start: datetime.datetime,
+        end: datetime.datetime,
+        max_messages: int,
+        timeout: Optional[float] = None,
+        sample_size: int = 100
+    ) -> Dict[K, List[DiscordPost]]:
+        """
+        Read several time-ordered streams concurrently under one message budget.
+
+        Each source's first `sample_size` messages (one API page) estimate its
+        activity in the window; the budget is then split in proportion, so busy
+        sources get most of it, and every stream stops at its quota. When
+        `timeout` expires, whatever was read so far is returned.
+
+        Returns the posts per source, busiest source first.
+        """
+        if not streams:
+            return {}
+        posts: Dict[K, List[DiscordPost]] = {key: [] for key in streams}
+        estimates: Dict[K, float] = {}
+        quotas: Dict[K, int] = {}
+        allocated = asyncio.Event()
+
+        def report(key: K, exhausted: bool):
+            estimates[key] = SnsXDomain.estimate_activity(posts[key], exhausted, start, end)
+            if len(estimates) == len(streams):
+                quotas.update(SnsXDomain.allocate_budget(estimates, max_messages))
+                allocated.set()
+
+        async def read(key: K, stream: AsyncIterator[DiscordPost]):
+            async with aclosing(stream):
+                async for post in stream:
+                    posts[key].append(post)
+                    if len(posts[key]) >= sample_size:
+                        break
+                else:
+                    report(key, exhausted=True)
+                    return
+                report(key, exhausted=False)
+                await allocated.wait()
+                if len(posts[key]) >= quotas[key]:
+                    return
+                async for post in stream:
+                    posts[key].append(post)
+                    if len(posts[key]) >= quotas[key]:
+                        break
+
+        async def read_isolated(key: K, stream: AsyncIterator[DiscordPost]):
+            # A failing source keeps what it read and never blocks the others
+            try:
+                await read(key, stream)
+            except Exception as e:
+                print(f"Failed to read {key}: {e}")
+                if key not in estimates:
+                    report(key, exhausted=True)
+
+        tasks = [asyncio.create_task(read_isolated(key, stream)) for key, stream in streams.items()]
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if len(estimates) < len(streams):
+            # Timed out while sampling: split the budget over what we know. Nothing more
+            # will be read, so no source gets more than it has, and the rest goes to the others.
+            print(f"Fetch time budget reached while sampling {len(streams) - len(estimates)} source(s)")
+            for key in streams:
+                estimates.setdefault(key, SnsXDomain.estimate_activity(posts[key], False, start, end))
+            quotas = SnsXDomain.allocate_budget(
+                estimates, max_messages, caps={key: len(posts[key]) for key in streams}
+            )
+
+        ranked = sorted(streams, key=lambda key: estimates[key], reverse=True)
+        return {key: posts[key][:quotas[key]] for key in ranked}
+
+    @staticmethod
+    def estimate_activity(
+        sample: List[DiscordPost],
+        exhausted: bool,
+        start: datetime.datetime,
+        end: datetime.datetime
+    ) -> float:
+        """
+        Estimate a source's messages in `[start, end)` from its oldest-first first messages.
+
+        An exhausted sample is exact; otherwise the sample's rate is extrapolated to the window.
+        """
+        if exhausted or not sample:
+            return float(len(sample))
+        covered = (sample[-1].posted_at - start).total_seconds()
+        window = (end - start).total_seconds()
+        return max(float(len(sample)), len(sample) * window / max(covered, 1.0))
+
+    @staticmethod
+    def allocate_budget(
+        estimates: Dict[K, float],
+        budget: int,
+        caps: Optional[Dict[K, int]] = None
+    ) -> Dict[K, int]:
+        """
+        Split a message budget across sources in proportion to their estimated activity.
+
+        Sources get at most their estimate (and their cap, e.g. the messages already
+        read); what a source cannot take is split over the others. Rounding leftovers
+        go to the busiest sources first.
+        """
+        limits = {
+            key: math.ceil(estimate if caps is None else min(estimate, caps[key]))
+            for key, estimate in estimates.items()
+        }
+        if sum(limits.values()) <= budget:
+            return limits
+
+        quotas: Dict[K, int] = {}
+        left = budget
+        open_keys = set(estimates)
+        while True:
+            # Sources whose share reaches their limit take the limit; the others share what remains
+            total = sum(estimates[key] for key in open_keys)
+            full = {key for key in open_keys if total and left * estimates[key] / total >= limits[key]}
+            if not full:
+                break
+            for key in full:
+                quotas[key] = limits[key]
+                left -= limits[key]
+            open_keys -= full
+
+        total = sum(estimates[key] for key in open_keys)
+        shares = {key: left * estimates[key] / total if total else 0.0 for key in open_keys}
+        floors = {key: math.floor(share) for key, share in shares.items()}
+        leftover = left - sum(floors.values()) if total else 0
+        for key in sorted(shares, key=lambda key: (shares[key] - floors[key], estimates[key]), reverse=True)[:leftover]:
+            floors[key] += 1
+        quotas.update(floors)
+        return quotas
+
+    @staticmethod
+    def complete_buckets(
+        start: datetime.datetime,
+        end: datetime.datetime,
+        bucket: datetime.timedelta
+    ) -> List[Tuple[datetime.datetime, datetime.datetime]]:
+        """
+        Return the `[start, end)` buckets lying entirely within the range.
+
+        Buckets are aligned on the unix epoch (so hourly buckets start on the
+        hour, UTC), which lets every request reuse the same stored digests.
+        """
+        size = int(bucket.total_seconds())
+        first = -(-int(start.timestamp()) // size) * size # Round up to a bucket boundary
+        last = int(end.timestamp()) // size * size
+        return [
+            (
+                datetime.datetime.fromtimestamp(bucket_start, datetime.timezone.utc),
+                datetime.datetime.fromtimestamp(bucket_start + size, datetime.timezone.utc)
+            )
+            for bucket_start in range(first, last, size)
+        ]
+
+    @staticmethod
+    def format_message(msg: DiscordPost) -> str:
+        """Format a single message as a chat log line."""
+        return format_line(msg)
+
+    @staticmethod
+    def format_log(messages: List[DiscordPost], encoder: Optional[ChatLogEncoder] = None) -> str:
+        """Format a chat log one line per message, or compacted by `encoder`."""
+        if encoder is not None:
+            return encoder.encode(messages).text
+        return "\n".join(SnsXDomain.format_message(msg) for msg in messages)
+
+    @staticmethod
+    def create_draft_prompt(
+        messages: List[DiscordPost],
+        persona: str,
+        language: str = "ja",
+        encoder: Optional[ChatLogEncoder] = None,
+        log: Optional[str] = None
+    ) -> Prompt:
         """
         Create the LLM prompt for generating an X post draft.
+
+        `log` is the chat log already formatted (e.g. compacted while sizing it);
+        `messages` are only formatted when it is None.
         """
-        formatted_lines = []
-        for msg in messages:
-            # Format: [Time] User: Content
-            # Note: Explicitly excluding attachments here as requested.
-            base_info = f"[{msg.posted_at.strftime('%Y-%m-%d %H:%M')}] {msg.author_name}"
-            
-            if msg.thread_name:
-                base_info += f" (in Thread: {msg.thread_name})"
-                
-            line = f"{base_info}: {msg.content}"
-            formatted_lines.append(line)
-        
-        formatted_log = "\n".join(formatted_lines)
-        
-        prompt = f"""
-You are a skilled social media manager. 
-Create an engaging post for X (formerly Twitter) based on the following chat log from a Discord server.
+        formatted_log = log if log is not None else SnsXDomain.format_log(messages, encoder)
+        return Prompt(
+            system=SnsXDomain._draft_instructions(persona, language, "the chat log from a Discord server"),
+            user=f"Chat Log:\n{formatted_log}"
+        )
+
+    @staticmethod
+    def create_multi_channel_draft_prompt(
+        channels: Dict[str, List[DiscordPost]],
+        persona: str,
+        language: str = "ja",
+        encoder: Optional[ChatLogEncoder] = None,
+        logs: Optional[Dict[str, str]] = None
+    ) -> Prompt:
+        """
+        Create the LLM prompt for one X post draft covering several channels.
+
+        `logs` holds the chat logs already formatted, by channel name; channels
+        missing from it are formatted from their messages.
+        """
+        logs = logs or {}
+        formatted_logs = "\n\n".join(
+            f"#{name}:\n" + (logs[name] if name in logs else SnsXDomain.format_log(messages, encoder))
+            for name, messages in channels.items() if messages
+        )
+        return Prompt(
+            system=SnsXDomain._draft_instructions(
+                persona, language, "the chat logs from several channels of a Discord server", across_channels=True
+            ),
+            user=f"Chat Logs (one section per channel, busiest first):\n{formatted_logs}"
+        )
+
+    @staticmethod
+    def chunk_messages(messages: List[DiscordPost], max_tokens: int) -> List[List[DiscordPost]]:
+        """Split a chat log into consecutive chunks of at most ~max_tokens each."""
+        return _chunk_by_tokens(messages, max_tokens, SnsXDomain.format_message)
+
+    @staticmethod
+    def chunk_summaries(summaries: List[str], max_tokens: int) -> List[List[str]]:
+        """Group chunk summaries into batches of at most ~max_tokens each."""
+        return _chunk_by_tokens(summaries, max_tokens, lambda summary: summary)
+
+    @staticmethod
+    def truncate_summary(summary: str, max_tokens: int) -> str:
+        """Cut a summary to about `max_tokens` estimated tokens, marking the cut."""
+        if estimate_tokens(summary) <= max_tokens:
+            return summary
+        marker = "\n[... truncated ...]"
+        budget = max(1, max_tokens - estimate_tokens(marker))
+        text = summary
+        while text and estimate_tokens(text) > budget:
+            text = text[:min(len(text) - 1, len(text) * budget // estimate_tokens(text))]
+        return text.rstrip() + marker
+
+    @staticmethod
+    def create_chunk_summary_prompt(
+        messages: List[DiscordPost],
+        language: str = "ja",
+        source: Optional[str] = None,
+        encoder: Optional[ChatLogEncoder] = None,
+        log: Optional[str] = None
+    ) -> Prompt:
+        """
+        Create the LLM prompt summarizing one chunk of a large chat log (map step).
+
+        `source` names the channel the chunk comes from, for multi-channel drafts.
+        `log` is the chunk already formatted; `messages` are only formatted when it is None.
+        """
+        formatted_log = log if log is not None else SnsXDomain.format_log(messages, encoder)
+        source_info = f" of #{source}" if source else ""
+
+        system = f"""
+You are summarizing one part of a longer chat log from a Discord server.
+The summary will later be combined with others to write a post for X (formerly Twitter).
+
+List the notable topics, activities, announcements and achievements in this part.
+Keep concrete details (names, numbers, product or project names) that would make an interesting post.
+Skip greetings and small talk.
+
+**IMPORTANT: Write the summary in {language}.**
+
+Output format:
+- [Bullet point summary]
+        """
+        period = f"{messages[0].posted_at.strftime('%Y-%m-%d %H:%M')} - {messages[-1].posted_at.strftime('%Y-%m-%d %H:%M')}"
+        return Prompt(system=system, user=f"Chat Log{source_info} ({period}):\n{formatted_log}")
+
+    @staticmethod
+    def create_summary_merge_prompt(summaries: List[str], language: str = "ja") -> Prompt:
+        """
+        Create the LLM prompt merging several chunk summaries into one (intermediate reduce step).
+        """
+        system = f"""
+You are combining summaries of consecutive parts of a Discord chat log into a single summary.
+Merge duplicate topics, keep the most notable details and keep the chronological order.
+
+**IMPORTANT: Write the summary in {language}.**
+
+Output format:
+- [Bullet point summary]
+        """
+        return Prompt(system=system, user=f"Summaries:\n{SnsXDomain._format_summaries(summaries)}")
+
+    @staticmethod
+    def create_draft_from_summaries_prompt(summaries: List[str], persona: str, language: str = "ja") -> Prompt:
+        """
+        Create the LLM prompt for generating an X post draft from chunk summaries (final reduce step).
+        """
+        return Prompt(
+            system=SnsXDomain._draft_instructions(persona, language, "the summaries of a chat log from a Discord server"),
+            user=f"Summaries (in chronological order):\n{SnsXDomain._format_summaries(summaries)}"
+        )
+
+    @staticmethod
+    def _draft_instructions(persona: str, language: str, source: str, across_channels: bool = False) -> str:
+        """
+        The stable part of the draft prompts: it only depends on the user's persona and
+        language, so it is sent as the system prefix that providers can cache.
+        """
+        conversation = "the conversations across the channels" if across_channels else "the conversation"
+        return f"""
+You are a skilled social media manager.
+Create an engaging post for X (formerly Twitter) based on {source} given by the user.
 
 **Persona Instructions:**
 Act as: {persona}
 
-The post should summarize the interesting parts of the conversation or highlight key activities.
+The post should summarize the interesting parts of {conversation} or highlight key activities.
 Include relevant hashtags.
 
 **IMPORTANT: Write the post in {language}.**
 
-Chat Log:
-{formatted_log}
-
 Output format:
 [Post Content]
         """
-        return prompt
+
+    @staticmethod
+    def _format_summaries(summaries: List[str]) -> str:
+        return "\n\n".join(f"Part {i + 1}:\n{summary.strip()}" for i, summary in enumerate(summaries))
+
+
+def _chunk_by_tokens(items: List[T], max_tokens: int, text_of: Callable[[T], str]) -> List[List[T]]:
+    """Greedily group consecutive items so each group stays within max_tokens (an oversized item gets its own group)."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for item in items:
+        item_tokens = estimate_tokens(text_of(item))
+        if current and current_tokens + item_tokens > max_tokens:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(item)
+        current_tokens += item_tokens
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,94 @@
+import asyncio
+import datetime
+import sqlite3
+import threading
+from typing import List
+
+from .domain import SnsXDigest
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    channel_id INTEGER NOT NULL,
+    bucket_start INTEGER NOT NULL,
+    bucket_end INTEGER NOT NULL,
+    summary TEXT NOT NULL,
+    message_count INTEGER NOT NULL,
+    PRIMARY KEY (channel_id, bucket_start)
+);
+"""
+
+
+class DigestStore:
+    """
+    SQLite store of the per-bucket channel digests used by `/sns-x-today`.
+
+    Buckets are keyed by channel and start time (unix seconds). An empty
+    bucket is stored too, so it is not summarized again.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        Args:
+            path: SQLite database file. The default in-memory store is lost on restart.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    async def get_range(
+        self,
+        channel_id: int,
+        start: datetime.datetime,
+        end: datetime.datetime
+    ) -> List[SnsXDigest]:
+        """Return the channel's digests whose bucket lies within `[start, end)`, oldest first."""
+        return await asyncio.to_thread(self._get_range, channel_id, int(start.timestamp()), int(end.timestamp()))
+
+    async def save(self, digest: SnsXDigest):
+        await asyncio.to_thread(self._save, digest)
+
+    async def prune(self, before: datetime.datetime) -> int:
+        """Delete digests of buckets ending before `before`. Returns the number deleted."""
+        return await asyncio.to_thread(self._prune, int(before.timestamp()))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_range(self, channel_id: int, start: int, end: int) -> List[SnsXDigest]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT bucket_start, bucket_end, summary, message_count FROM digests "
+                "WHERE channel_id = ? AND bucket_start >= ? AND bucket_end <= ? ORDER BY bucket_start",
+                (channel_id, start, end)
+            ).fetchall()
+        return [
+            SnsXDigest(
+                channel_id=channel_id,
+                start=datetime.datetime.fromtimestamp(bucket_start, datetime.timezone.utc),
+                end=datetime.datetime.fromtimestamp(bucket_end, datetime.timezone.utc),
+                summary=summary,
+                message_count=message_count
+            )
+            for bucket_start, bucket_end, summary, message_count in rows
+        ]
+
+    def _save(self, digest: SnsXDigest):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO digests (channel_id, bucket_start, bucket_end, summary, message_count) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    digest.channel_id,
+                    int(digest.start.timestamp()),
+                    int(digest.end.timestamp()),
+                    digest.summary,
+                    digest.message_count
+                )
+            )
+
+    def _prune(self, before: int) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM digests WHERE bucket_end < ?", (before,)).rowcount
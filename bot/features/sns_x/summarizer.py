@@ -0,0 +1,262 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from bot.core.metrics import SNSX_COMPACTION_TOKENS
+from bot.services.discord.domain import DiscordPost
+from bot.services.llm.prompt import Prompt
+from bot.services.llm.repository import LLMRepository
+from bot.services.llm.scheduler import Priority
+from bot.services.llm.tokens import estimate_tokens
+from .compaction import ChatLogEncoder, CompactedLog
+from .domain import SnsXDomain
+
+
+class SnsXSummarizer:
+    """
+    Generate X drafts from chat logs of any size.
+
+    Logs that fit in one chunk go straight to a single draft prompt. Larger logs
+    are split into token-sized chunks that are summarized concurrently (map),
+    the summaries are merged level by level until they fit in one prompt
+    (reduce), and the draft is written from the final summaries.
+
+    With an `encoder`, chat logs are compacted before they are prompted: "fits
+    in one chunk" is decided on the compacted size, and chunks are sized so
+    that they fill `chunk_tokens` once compacted.
+    """
+
+    def __init__(
+        self,
+        llm_repository: LLMRepository,
+        chunk_tokens: int = 30000,
+        max_concurrency: int = 4,
+        encoder: Optional[ChatLogEncoder] = None
+    ):
+        """
+        Args:
+            llm_repository: Repository used for every LLM call.
+            chunk_tokens: Estimated token size of each chunk (and of each reduce batch).
+            max_concurrency: Max number of chunk summaries generated in parallel.
+            encoder: Compacts chat logs in prompts. None sends them one line per message.
+        """
+        self.llm_repository = llm_repository
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.max_concurrency = max(1, max_concurrency)
+        self.encoder = encoder
+
+    async def generate_draft(
+        self,
+        messages: List[DiscordPost],
+        persona: str,
+        language: str = "ja",
+        use_cache: bool = False
+    ) -> str:
+        """
+        Generate an X post draft from the given messages.
+
+        With `use_cache`, every LLM call (including chunk summaries, whose earlier
+        chunks stay identical as a window grows) goes through the response cache.
+        """
+        prompt = await self.prepare_draft_prompt(messages, persona, language=language, use_cache=use_cache)
+        return await self.llm_repository.generate_content(prompt, use_cache=use_cache)
+
+    async def prepare_draft_prompt(
+        self,
+        messages: List[DiscordPost],
+        persona: str,
+        language: str = "ja",
+        use_cache: bool = False
+    ) -> Prompt:
+        """Return the final draft prompt, running the map-reduce steps first if the log is large."""
+        log = self._compact(messages)
+        text = log.text if log is not None else None
+        if log is not None and log.report.compacted_tokens <= self.chunk_tokens:
+            return SnsXDomain.create_draft_prompt(
+                messages, persona=persona, language=language, encoder=self.encoder, log=text
+            )
+
+        chunks = SnsXDomain.chunk_messages(messages, self._chunk_budget(log))
+        if len(chunks) <= 1:
+            return SnsXDomain.create_draft_prompt(
+                messages, persona=persona, language=language, encoder=self.encoder, log=text
+            )
+
+        print(f"Summarizing {len(messages)} messages in {len(chunks)} chunks")
+        summaries = await self._generate_all(
+            [SnsXDomain.create_chunk_summary_prompt(chunk, language=language, encoder=self.encoder) for chunk in chunks],
+            use_cache=use_cache
+        )
+        return await self.prepare_draft_prompt_from_summaries(summaries, persona, language=language, use_cache=use_cache)
+
+    async def prepare_multi_channel_draft_prompt(
+        self,
+        channels: Dict[str, List[DiscordPost]],
+        persona: str,
+        language: str = "ja",
+        use_cache: bool = False
+    ) -> Prompt:
+        """
+        Return the draft prompt for the chat logs of several channels (name -> posts).
+
+        Logs that fit in one chunk together go into one prompt with a section per
+        channel; otherwise every channel is chunked and summarized separately, and
+        the draft is written from the summaries in chronological order.
+        """
+        channels = {name: messages for name, messages in channels.items() if messages}
+        logs = {name: self._compact(messages) for name, messages in channels.items()}
+        chunks = [
+            (name, chunk)
+            for name, messages in channels.items()
+            for chunk in SnsXDomain.chunk_messages(messages, self._chunk_budget(logs[name]))
+        ]
+        if self.encoder is not None:
+            total_tokens = sum(log.report.compacted_tokens for log in logs.values())
+        else:
+            total_tokens = sum(estimate_tokens(SnsXDomain.format_message(msg)) for _, chunk in chunks for msg in chunk)
+        if total_tokens <= self.chunk_tokens:
+            return SnsXDomain.create_multi_channel_draft_prompt(
+                channels,
+                persona=persona,
+                language=language,
+                encoder=self.encoder,
+                logs={name: log.text for name, log in logs.items() if log is not None}
+            )
+
+        chunks.sort(key=lambda item: item[1][0].posted_at)
+        print(f"Summarizing {len(channels)} channels in {len(chunks)} chunks")
+        summaries = await self._generate_all(
+            [
+                SnsXDomain.create_chunk_summary_prompt(chunk, language=language, source=name, encoder=self.encoder)
+                for name, chunk in chunks
+            ],
+            use_cache=use_cache
+        )
+        summaries = [f"#{name}:\n{summary.strip()}" for (name, _), summary in zip(chunks, summaries)]
+        return await self.prepare_draft_prompt_from_summaries(summaries, persona, language=language, use_cache=use_cache)
+
+    async def prepare_draft_prompt_from_summaries(
+        self,
+        summaries: List[str],
+        persona: str,
+        language: str = "ja",
+        use_cache: bool = False
+    ) -> Prompt:
+        """Return the draft prompt for chronological summaries, merging them first if they do not fit in one chunk."""
+        summaries = await self._reduce(summaries, language, use_cache=use_cache)
+        return SnsXDomain.create_draft_from_summaries_prompt(summaries, persona=persona, language=language)
+
+    async def summarize_messages(
+        self,
+        messages: List[DiscordPost],
+        language: str = "ja",
+        use_cache: bool = False,
+        priority: Priority = Priority.BULK
+    ) -> str:
+        """
+        Summarize a chat log into a single summary (used for time-bucket digests).
+
+        Args:
+            messages: Non-empty, time-ordered chat log.
+            language: Language of the summary.
+            use_cache: Send every call through the response cache.
+            priority: Scheduler lane; INTERACTIVE when a user is waiting on it.
+        """
+        log = self._compact(messages)
+        chunks = SnsXDomain.chunk_messages(messages, self._chunk_budget(log))
+        # A single chunk is the whole log: reuse its compacted text
+        text = log.text if log is not None and len(chunks) == 1 else None
+        summaries = await self._generate_all(
+            [
+                SnsXDomain.create_chunk_summary_prompt(chunk, language=language, encoder=self.encoder, log=text)
+                for chunk in chunks
+            ],
+            use_cache=use_cache,
+            priority=priority
+        )
+        summaries = await self._reduce(summaries, language, use_cache=use_cache, priority=priority)
+        if len(summaries) == 1:
+            return summaries[0]
+        merged = await self._generate_all(
+            [SnsXDomain.create_summary_merge_prompt(summaries, language=language)],
+            use_cache=use_cache,
+            priority=priority
+        )
+        return merged[0]
+
+    def _compact(self, messages: List[DiscordPost]) -> Optional[CompactedLog]:
+        """
+        Compact a chat log, reporting (and counting) how far it shrank. None without an encoder.
+
+        The text is reused in the draft prompt when the log fits in one chunk, so it is encoded once.
+        """
+        if self.encoder is None or not messages:
+            return None
+        log = self.encoder.encode(messages)
+        report = log.report
+        SNSX_COMPACTION_TOKENS.inc(report.original_tokens, kind="original")
+        SNSX_COMPACTION_TOKENS.inc(report.compacted_tokens, kind="compacted")
+        print(f"Compacted chat log: {report.describe()}")
+        return log
+
+    def _chunk_budget(self, log: Optional[CompactedLog]) -> int:
+        """Uncompacted tokens per chunk, so that a chunk is about `chunk_tokens` once compacted."""
+        report = log.report if log is not None else None
+        if report is None or not report.compacted_tokens or report.omitted:
+            return self.chunk_tokens
+        ratio = report.compacted_tokens / max(1, report.original_tokens)
+        return max(self.chunk_tokens, int(self.chunk_tokens / ratio))
+
+    async def _reduce(
+        self,
+        summaries: List[str],
+        language: str,
+        use_cache: bool = False,
+        priority: Priority = Priority.BULK
+    ) -> List[str]:
+        """
+        Merge summaries batch by batch until they fit in one chunk.
+
+        Summaries are never left over budget: when no two neighbours fit in one
+        batch (each is over half a chunk), they are cut to half a chunk first,
+        so every round merges at least two of them, and a merged summary that
+        is still larger than a chunk is cut to one.
+        """
+        summaries = self._truncate(summaries, self.chunk_tokens)
+        groups = SnsXDomain.chunk_summaries(summaries, self.chunk_tokens)
+        while len(groups) > 1:
+            if len(groups) == len(summaries):
+                summaries = self._truncate(summaries, self.chunk_tokens // 2)
+                groups = SnsXDomain.chunk_summaries(summaries, self.chunk_tokens)
+            summaries = await self._generate_all(
+                [SnsXDomain.create_summary_merge_prompt(group, language=language) for group in groups],
+                use_cache=use_cache,
+                priority=priority
+            )
+            summaries = self._truncate(summaries, self.chunk_tokens)
+            groups = SnsXDomain.chunk_summaries(summaries, self.chunk_tokens)
+        return summaries
+
+    @staticmethod
+    def _truncate(summaries: List[str], max_tokens: int) -> List[str]:
+        """Cut every summary over `max_tokens`, logging how many were."""
+        truncated = [SnsXDomain.truncate_summary(summary, max_tokens) for summary in summaries]
+        cut = sum(1 for before, after in zip(summaries, truncated) if before is not after)
+        if cut:
+            print(f"Truncated {cut} of {len(summaries)} summaries to ~{max_tokens} tokens")
+        return truncated
+
+    async def _generate_all(
+        self,
+        prompts: List[Prompt],
+        use_cache: bool = False,
+        priority: Priority = Priority.BULK
+    ) -> List[str]:
+        """Run prompts concurrently (bounded by max_concurrency), keeping their order."""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def generate(prompt: Prompt) -> str:
+            async with semaphore:
+                # Fan-out work runs as BULK by default: lets interactive calls (e.g. /meal) run first
+                return await self.llm_repository.generate_content(prompt, use_cache=use_cache, priority=priority)
+
+        return await asyncio.gather(*(generate(prompt) for prompt in prompts))
@@ -1,13 +1,39 @@
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import Dict, Optional, Tuple
 import datetime
+import sys
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DiscordPost:
-    """Class representing a single Discord message."""
+    """
+    Class representing a single Discord message.
+
+    Wide history windows keep tens of thousands of posts alive at once, so posts
+    are slotted (no per-instance __dict__), author and thread names are interned
+    (a handful of distinct strings shared by every post), and attachment URLs are
+    an immutable tuple (the shared empty tuple for most posts).
+    """
     author_name: str
     content: str
     posted_at: datetime.datetime
     message_id: str
     thread_name: Optional[str] = None
-    attachment_urls: List[str] = field(default_factory=list)
+    attachment_urls: Tuple[str, ...] = ()
+
+    def __post_init__(self):
+        object.__setattr__(self, "author_name", sys.intern(self.author_name))
+        if self.thread_name is not None:
+            object.__setattr__(self, "thread_name", sys.intern(self.thread_name))
+        if not isinstance(self.attachment_urls, tuple):
+            object.__setattr__(self, "attachment_urls", tuple(self.attachment_urls))
+
+@dataclass
+class FetchReport:
+    """Statistics collected while fetching a channel and its threads."""
+    sources_fetched: int = 0
+    # Threads whose history was read vs. threads skipped because their metadata
+    # proves they have no messages in the window
+    threads_scanned: int = 0
+    threads_skipped: int = 0
+    # Thread id -> error message (names are not unique). A failing thread never aborts the whole fetch.
+    errors: Dict[int, str] = field(default_factory=dict)
@@ -1,67 +1,302 @@
+import asyncio
+import heapq
 import discord
 import datetime
-from typing import List, Optional
-from .domain import DiscordPost
+from typing import AsyncIterator, List, Optional
+from discord.utils import time_snowflake
+from .domain import DiscordPost, FetchReport
+from .store import MessageStore, snowflake_to_ms
+
+# Marks the end of a single source stream in iter_messages
+_END_OF_SOURCE = object()
+
+# The local clock may run ahead of Discord's: the store's high-water mark never
+# goes past the newest message seen, or past now minus this margin
+SYNC_CLOCK_MARGIN = datetime.timedelta(minutes=5)
 
 class DiscordRepository:
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        store: Optional[MessageStore] = None,
+        stream_buffer_size: int = 200
+    ):
+        """
+        Initialize the Discord Repository.
+
+        Args:
+            max_concurrency: Max number of channel/thread histories fetched in parallel.
+                discord.py still serializes requests that share a rate-limit bucket and
+                waits out 429s on its own; this only bounds how many we keep in flight.
+            store: Optional local message store. When set, histories are served from it
+                and only the part of the window it has not synced yet is fetched from the API.
+            stream_buffer_size: Messages buffered per source in `iter_messages`. Keeps
+                fetches at most about two API pages ahead of the consumer.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.store = store
+        self.stream_buffer_size = max(1, stream_buffer_size)
+
     async def fetch_messages(
-        self, 
-        channel: discord.TextChannel, 
-        after: datetime.datetime, 
+        self,
+        channel: discord.TextChannel,
+        after: datetime.datetime,
         before: Optional[datetime.datetime] = None,
-        limit: int = 2000
+        limit: Optional[int] = 2000,
+        report: Optional[FetchReport] = None
     ) -> List[DiscordPost]:
         """
         Fetch messages from a Discord channel history within a date range.
-        
+
+        Thin wrapper collecting `iter_messages` into a list.
+
         Args:
             channel: The text channel to fetch from.
             after: Fetch messages after this datetime (oldest limit).
             before: Fetch messages before this datetime (newest limit). If None, fetches up to now.
-            limit: Max messages to fetch. Discord API defaults to 100 per request, library handles pagination.
+            limit: Max messages to fetch per source (channel or thread), None for the whole window.
+                Discord API defaults to 100 per request, library handles pagination.
+            report: Optional report to fill with per-source statistics and errors.
         """
-        posts = []
-        
-        # 1. Fetch from Main Channel
-        async for msg in channel.history(limit=limit, after=after, before=before, oldest_first=True):
-            if msg.author.bot:
-                continue
-            posts.append(self._to_discord_post(msg))
-
-        # 2. Identify Threads to check (Active + Archived)
-        threads_to_check = list(channel.threads) # Active threads
-        
-        # Add archived threads modified after start time
+        return [
+            post async for post in self.iter_messages(channel, after, before=before, limit=limit, report=report)
+        ]
+
+    async def iter_messages(
+        self,
+        channel: discord.TextChannel,
+        after: datetime.datetime,
+        before: Optional[datetime.datetime] = None,
+        limit: Optional[int] = 2000,
+        report: Optional[FetchReport] = None
+    ) -> AsyncIterator[DiscordPost]:
+        """
+        Stream messages from a channel and its threads, oldest first.
+
+        Every source is fetched concurrently into a small buffer and the buffers are
+        combined with a streaming k-way merge, so the first posts are yielded as soon as
+        each source has produced its oldest message. Closing the iterator early
+        (e.g. with `contextlib.aclosing`) cancels the remaining fetches.
+
+        Args are the same as `fetch_messages`.
+        """
+        if report is None:
+            report = FetchReport()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        queues = []
+        producers = []
+
+        def start(source: discord.abc.Messageable, thread_name: str = None):
+            queue = asyncio.Queue(maxsize=self.stream_buffer_size)
+            queues.append(queue)
+            producers.append(asyncio.create_task(
+                self._produce(semaphore, queue, source, after, before, limit, report, thread_name=thread_name)
+            ))
+
         try:
-             async for thread in channel.archived_threads(after=after):
-                 threads_to_check.append(thread)
-        except Exception as e:
-            print(f"Failed to fetch archived threads: {e}")
+            # 1. Start fetching the Main Channel while we look for threads
+            start(channel)
+
+            # 2. Fetch from Threads concurrently (same time range), skipping inactive ones
+            after_id = time_snowflake(after, high=True)
+            before_id = time_snowflake(before) if before else None
+
+            def consider(thread: discord.Thread):
+                if self._is_inactive(thread, after_id, before_id):
+                    report.threads_skipped += 1
+                    return
+                report.threads_scanned += 1
+                start(thread, thread_name=thread.name)
+
+            for thread in channel.threads: # Active threads
+                consider(thread)
 
-        # 3. Fetch from Threads
-        for thread in threads_to_check:
-            # We use the same time range for threads
             try:
-                async for msg in thread.history(limit=limit, after=after, before=before, oldest_first=True):
+                # Newest archive first. Posting unarchives a thread, so once threads were
+                # archived before the window starts, none of the remaining ones can be in it.
+                async for thread in channel.archived_threads(limit=None):
+                    if thread.archive_timestamp is not None and thread.archive_timestamp < after:
+                        break
+                    consider(thread)
+            except Exception as e:
+                print(f"Failed to fetch archived threads: {e}")
+
+            # 3. Each source is read oldest first, so a k-way merge keeps the order
+            async for post in self._merge(queues):
+                yield post
+        finally:
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+        if report.threads_skipped:
+            print(f"Scanned {report.threads_scanned} threads, skipped {report.threads_skipped} inactive")
+        if report.errors:
+            print(f"Fetched {report.sources_fetched} sources, {len(report.errors)} thread(s) failed")
+
+    @staticmethod
+    def _is_inactive(thread: discord.Thread, after_id: int, before_id: Optional[int]) -> bool:
+        """
+        Whether the thread's snowflakes prove it has no messages in `(after_id, before_id)`.
+
+        A thread's messages are newer than its id (its creation, or its starter
+        message), and none is newer than `last_message_id`. Unknown metadata
+        never skips a thread.
+        """
+        if before_id is not None and thread.id >= before_id:
+            return True # Created after the window
+        last_message_id = getattr(thread, "last_message_id", None)
+        return last_message_id is not None and last_message_id <= after_id # Quiet since before the window
+
+    async def _merge(self, queues: List[asyncio.Queue]) -> AsyncIterator[DiscordPost]:
+        """Merge per-source queues (each oldest first) into one oldest-first stream."""
+        heap = []
+
+        async def pull(index: int):
+            item = await queues[index].get()
+            if isinstance(item, BaseException):
+                raise item
+            if item is not _END_OF_SOURCE:
+                # Sources are unique in the heap, so ties never compare the posts themselves
+                heapq.heappush(heap, (item.posted_at, index, item))
+
+        for index in range(len(queues)):
+            await pull(index)
+
+        while heap:
+            _, index, post = heapq.heappop(heap)
+            yield post
+            await pull(index)
+
+    async def _produce(
+        self,
+        semaphore: asyncio.Semaphore,
+        queue: asyncio.Queue,
+        source: discord.abc.Messageable,
+        after: datetime.datetime,
+        before: Optional[datetime.datetime],
+        limit: Optional[int],
+        report: FetchReport,
+        thread_name: str = None
+    ):
+        """
+        Fetch a single channel or thread into its queue, ending with `_END_OF_SOURCE`.
+
+        Thread failures are recorded in the report and end the stream; a failure of
+        the main channel is forwarded to the consumer.
+        """
+        try:
+            if self.store is not None:
+                for post in await self._fetch_with_store(semaphore, source, after, before, limit, thread_name):
+                    await queue.put(post)
+            else:
+                history = source.history(limit=limit, after=after, before=before, oldest_first=True)
+                while True:
+                    # Only hold a slot while the iterator may be waiting on the API,
+                    # never while blocked on a full queue.
+                    async with semaphore:
+                        try:
+                            msg = await anext(history)
+                        except StopAsyncIteration:
+                            break
                     if msg.author.bot:
                         continue
-                    posts.append(self._to_discord_post(msg, thread_name=thread.name))
-            except discord.Forbidden:
-                continue # Skip threads we can't read
-            except Exception as e:
-                print(f"Error reading thread {thread.name}: {e}")
+                    await queue.put(self._to_discord_post(msg, thread_name=thread_name))
+            report.sources_fetched += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if thread_name is None:
+                await queue.put(e)
+                return
+            if isinstance(e, discord.Forbidden):
+                report.errors[source.id] = "forbidden" # Skip threads we can't read
+            else:
+                print(f"Error reading thread {thread_name} ({source.id}): {e}")
+                report.errors[source.id] = str(e)
+        await queue.put(_END_OF_SOURCE)
 
-        # 4. Sort by time (oldest first)
-        posts.sort(key=lambda p: p.posted_at)
-        
-        return posts
+    async def _fetch_with_store(
+        self,
+        semaphore: asyncio.Semaphore,
+        source: discord.abc.Messageable,
+        after: datetime.datetime,
+        before: Optional[datetime.datetime],
+        limit: Optional[int],
+        thread_name: str = None
+    ) -> List[DiscordPost]:
+        """Sync the missing tail of a source into the store and read the window from it."""
+        # Snowflake bounds of the window: (after_id, before_id)
+        after_id = time_snowflake(after, high=True)
+        now = datetime.datetime.now(datetime.timezone.utc)
+        now_id = time_snowflake(now)
+        before_id = min(time_snowflake(before), now_id) if before else now_id
+        settled_id = time_snowflake(now - SYNC_CLOCK_MARGIN)
+
+        synced = await self.store.get_synced_range(source.id)
+        if synced and synced[0] <= after_id <= synced[1]:
+            # Only the tail newer than the high-water mark is missing
+            fetch_after = synced[1]
+        else:
+            fetch_after = after_id
+
+        # The source's newest message is an activity index: nothing newer than the
+        # store's high-water mark means the store already holds the whole window
+        last_message_id = getattr(source, "last_message_id", None)
+        if last_message_id is not None and last_message_id <= fetch_after:
+            fetch_after = before_id
+
+        if fetch_after < before_id - 1:
+            posts, last_seen_id, reached_limit = await self._fetch_from_api(
+                semaphore, source, discord.Object(id=fetch_after), discord.Object(id=before_id), limit, thread_name
+            )
+            if reached_limit:
+                # Coverage stops at the last message we saw if the limit cut the fetch short
+                synced_to = last_seen_id
+            else:
+                # If our clock runs ahead of Discord's, later messages can still get ids below before_id
+                synced_to = min(before_id - 1, max(last_seen_id or fetch_after, settled_id))
+            if synced_to > fetch_after:
+                await self.store.save(source.id, posts, fetch_after, synced_to)
+
+        return await self.store.query(
+            source.id, snowflake_to_ms(after_id), snowflake_to_ms(before_id), limit, thread_name=thread_name
+        )
+
+    async def _fetch_from_api(
+        self,
+        semaphore: asyncio.Semaphore,
+        source: discord.abc.Messageable,
+        after,
+        before,
+        limit: Optional[int],
+        thread_name: str = None
+    ) -> tuple[List[DiscordPost], Optional[int], bool]:
+        """
+        Fetch history through the Discord API.
+
+        Returns the posts, the id of the last message seen (bot messages included;
+        None if there was none) and whether `limit` was reached, so callers know
+        how far the fetch actually got.
+        """
+        posts = []
+        seen = 0
+        last_id = None
+        async with semaphore:
+            async for msg in source.history(limit=limit, after=after, before=before, oldest_first=True):
+                seen += 1
+                last_id = msg.id
+                if msg.author.bot:
+                    continue
+                posts.append(self._to_discord_post(msg, thread_name=thread_name))
+        return posts, last_id, limit is not None and seen >= limit
 
     def _to_discord_post(self, msg: discord.Message, thread_name: str = None) -> DiscordPost:
         """Helper to convert discord.Message to DiscordPost."""
         content = msg.content
-            
-        attachment_urls = [a.url for a in msg.attachments]
-            
+
+        attachment_urls = tuple(a.url for a in msg.attachments) if msg.attachments else ()
+
         return DiscordPost(
             author_name=msg.author.display_name,
             content=content,
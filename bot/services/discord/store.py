@@ -0,0 +1,148 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from discord.utils import snowflake_time
+
+from .domain import DiscordPost
+
+DISCORD_EPOCH_MS = 1420070400000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    source_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    posted_at INTEGER NOT NULL,
+    author_name TEXT NOT NULL,
+    content TEXT NOT NULL,
+    attachment_urls TEXT NOT NULL,
+    PRIMARY KEY (source_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_source_posted_at ON messages (source_id, posted_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    source_id INTEGER PRIMARY KEY,
+    synced_from INTEGER NOT NULL,
+    synced_to INTEGER NOT NULL
+);
+"""
+
+
+def snowflake_to_ms(snowflake: int) -> int:
+    """Return the unix timestamp (milliseconds) encoded in a Discord snowflake."""
+    return (snowflake >> 22) + DISCORD_EPOCH_MS
+
+
+class MessageStore:
+    """
+    On-disk (SQLite) cache of channel and thread histories.
+
+    Each source (channel or thread id) has a synced range of snowflakes
+    `(synced_from, synced_to]` that is known to be complete, so repeated
+    fetches only have to ask the API for messages newer than `synced_to`
+    (the high-water mark). Edits and deletions after a message was stored
+    are not tracked.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite database file. Use ":memory:" for a throwaway store.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    async def get_synced_range(self, source_id: int) -> Optional[Tuple[int, int]]:
+        """Return the `(synced_from, synced_to)` snowflakes for a source, if any."""
+        return await asyncio.to_thread(self._get_synced_range, source_id)
+
+    async def save(self, source_id: int, posts: List[DiscordPost], synced_from: int, synced_to: int):
+        """
+        Store fetched posts and extend the synced range of the source.
+
+        The new range is merged with the existing one when they overlap,
+        otherwise it replaces it (the older range is no longer contiguous).
+        """
+        await asyncio.to_thread(self._save, source_id, posts, synced_from, synced_to)
+
+    async def query(
+        self,
+        source_id: int,
+        after_ms: int,
+        before_ms: int,
+        limit: Optional[int],
+        thread_name: str = None
+    ) -> List[DiscordPost]:
+        """Return stored posts with `after_ms < posted_at < before_ms`, oldest first (at most `limit`, None for all)."""
+        return await asyncio.to_thread(self._query, source_id, after_ms, before_ms, limit, thread_name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _get_synced_range(self, source_id: int) -> Optional[Tuple[int, int]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT synced_from, synced_to FROM sync_state WHERE source_id = ?", (source_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _save(self, source_id: int, posts: List[DiscordPost], synced_from: int, synced_to: int):
+        rows = [
+            (
+                source_id,
+                int(post.message_id),
+                snowflake_to_ms(int(post.message_id)),
+                post.author_name,
+                post.content,
+                json.dumps(list(post.attachment_urls))
+            )
+            for post in posts
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO messages "
+                "(source_id, message_id, posted_at, author_name, content, attachment_urls) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            row = self._conn.execute(
+                "SELECT synced_from, synced_to FROM sync_state WHERE source_id = ?", (source_id,)
+            ).fetchone()
+            if row and synced_from <= row[1] and synced_to >= row[0]:
+                synced_from, synced_to = min(synced_from, row[0]), max(synced_to, row[1])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state (source_id, synced_from, synced_to) VALUES (?, ?, ?)",
+                (source_id, synced_from, synced_to)
+            )
+
+    def _query(
+        self,
+        source_id: int,
+        after_ms: int,
+        before_ms: int,
+        limit: Optional[int],
+        thread_name: str
+    ) -> List[DiscordPost]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT message_id, author_name, content, attachment_urls FROM messages "
+                "WHERE source_id = ? AND posted_at > ? AND posted_at < ? "
+                "ORDER BY posted_at, message_id LIMIT ?",
+                (source_id, after_ms, before_ms, -1 if limit is None else limit) # SQLite: -1 means no limit
+            ).fetchall()
+        return [
+            DiscordPost(
+                author_name=author_name,
+                content=content,
+                posted_at=snowflake_time(message_id),
+                message_id=str(message_id),
+                thread_name=thread_name,
+                attachment_urls=tuple(json.loads(attachment_urls)) if attachment_urls != "[]" else ()
+            )
+            for message_id, author_name, content, attachment_urls in rows
+        ]
@@ -0,0 +1,93 @@
+import time
+from typing import List
+
+from discord import Interaction, WebhookMessage
+
+DISCORD_MESSAGE_LIMIT = 1900
+
+
+def split_message(text: str, max_length: int = DISCORD_MESSAGE_LIMIT) -> List[str]:
+    """
+    Split text into Discord-sized segments, preferring to cut at line breaks.
+
+    A segment's boundaries only depend on the text inside it, so segments that
+    are already complete never change while more text is appended.
+    """
+    segments = []
+    start = 0
+    while len(text) - start > max_length:
+        end = start + max_length
+        newline = text.rfind("\n", start, end)
+        if newline > start:
+            end = newline + 1
+        segments.append(text[start:end])
+        start = end
+    segments.append(text[start:])
+    return segments
+
+
+class ProgressiveMessage:
+    """
+    Show growing text (e.g. a streamed LLM response) as interaction followups.
+
+    The first text is sent right away, later text is applied with edits that
+    are throttled to `min_edit_interval` seconds to stay within Discord's edit
+    rate limits. Text longer than one message spills into new followups.
+    """
+
+    def __init__(
+        self,
+        interaction: Interaction,
+        header: str = "",
+        min_edit_interval: float = 1.0,
+        max_length: int = DISCORD_MESSAGE_LIMIT
+    ):
+        self.interaction = interaction
+        self.header = header
+        self.min_edit_interval = min_edit_interval
+        self.max_length = max_length
+        self.body = ""
+        self._messages: List[WebhookMessage] = []
+        self._sent: List[str] = []
+        self._last_flush = 0.0
+        # Time spent in Discord sends/edits, so callers can tell it apart from generation time
+        self.send_seconds = 0.0
+
+    @property
+    def text(self) -> str:
+        return self.header + self.body
+
+    async def append(self, chunk: str):
+        """Add text, updating Discord if the throttle interval has passed."""
+        self.body += chunk
+        if not self._messages or time.monotonic() - self._last_flush >= self.min_edit_interval:
+            await self.flush()
+
+    async def finish(self, fallback: str = ""):
+        """Send whatever is still pending (or `fallback` if no text was produced)."""
+        if not self.body and fallback:
+            self.body = fallback
+        await self.flush()
+
+    async def flush(self):
+        """Bring the Discord messages in sync with the current text."""
+        if not self.text.strip():
+            return
+        self._last_flush = time.monotonic()
+        started = time.perf_counter()
+        try:
+            await self._sync()
+        finally:
+            self.send_seconds += time.perf_counter() - started
+
+    async def _sync(self):
+        for index, segment in enumerate(split_message(self.text, self.max_length)):
+            if not segment.strip():
+                break # Discord rejects blank messages; only a trailing segment can be blank
+            if index < len(self._messages):
+                if self._sent[index] != segment:
+                    await self._messages[index].edit(content=segment)
+                    self._sent[index] = segment
+            else:
+                self._messages.append(await self.interaction.followup.send(segment, wait=True))
+                self._sent.append(segment)
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from bot.core.cache import TTLCache
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+"""
+
+
+@dataclass
+class ResponseCacheStats:
+    """Hit/miss counters of a ResponseCache."""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    memory_size: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """
+    Content-addressed cache of LLM responses.
+
+    Keys are a hash of the model and the normalized messages, so byte-identical
+    requests (e.g. re-running /sns-x on a past date range) are answered locally.
+    Entries live in an in-memory LRU tier and, if `path` is set, in a SQLite
+    disk tier that survives restarts. Both tiers expire entries after `ttl`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: Optional[float] = 24 * 60 * 60,
+        path: Optional[str] = None,
+        max_disk_entries: int = 10000
+    ):
+        """
+        Args:
+            max_entries: Size of the in-memory LRU tier.
+            ttl: Seconds a response stays valid. None keeps responses until evicted.
+            path: SQLite file of the disk tier. None disables it.
+            max_disk_entries: Least recently used rows are deleted beyond this count.
+        """
+        self.ttl = ttl
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._memory: TTLCache[str, str] = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._stats = ResponseCacheStats()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock:
+                self._conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def make_key(model: str, messages: List[dict], options: Optional[dict] = None) -> str:
+        """Hash the model, messages and request options that change the output (e.g. `response_format`) into a cache key."""
+        request = {"model": model, "messages": _normalize(messages)}
+        if options:
+            request["options"] = options
+        payload = json.dumps(
+            request,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return a cached response, checking memory first and then disk."""
+        value = self._memory.get(key)
+        if value is not None:
+            self._stats.memory_hits += 1
+            return value
+        if self._conn is not None:
+            value = await asyncio.to_thread(self._disk_get, key)
+            if value is not None:
+                self._stats.disk_hits += 1
+                self._memory.set(key, value)
+                return value
+        self._stats.misses += 1
+        return None
+
+    async def set(self, key: str, value: str):
+        """Store a response in every tier."""
+        self._memory.set(key, value)
+        if self._conn is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def stats(self) -> ResponseCacheStats:
+        """Return a snapshot of the counters."""
+        return ResponseCacheStats(
+            memory_hits=self._stats.memory_hits,
+            disk_hits=self._stats.disk_hits,
+            misses=self._stats.misses,
+            memory_size=len(self._memory)
+        )
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+            self._conn = None
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _disk_set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_disk_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_disk_entries,)
+                )
+
+
+def _normalize(value: Any) -> Any:
+    """Strip surrounding whitespace from text so formatting-only differences share a key."""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, list):
+        return [_normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    return value
@@ -0,0 +1,136 @@
+import asyncio
+import dataclasses
+import hashlib
+import io
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Optional dependency: pip install "anisecord[image]"
+    Image = None
+    ImageOps = None
+
+_OUTPUT_CONTENT_TYPES = {
+    "WEBP": "image/webp",
+    "JPEG": "image/jpeg",
+    "PNG": "image/png",
+}
+# Formats images can be re-encoded to
+OUTPUT_FORMATS = tuple(_OUTPUT_CONTENT_TYPES)
+
+
+@dataclass(frozen=True)
+class PreprocessedImage:
+    """An image ready to be sent to the LLM."""
+    data: bytes
+    content_type: str
+    original_bytes: int
+    content_hash: str = ""                  # SHA-256 of the original bytes
+    perceptual_hash: Optional[int] = None   # dHash of the picture (None if it could not be decoded)
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - len(self.data)
+
+
+def preprocess_image(
+    data: bytes,
+    content_type: str,
+    max_dimension: int = 1536,
+    output_format: str = "WEBP",
+    quality: int = 85
+) -> PreprocessedImage:
+    """
+    Downscale an image to max_dimension, drop its metadata and re-encode it.
+
+    CPU heavy: call it through `preprocess_images` to keep it off the event loop.
+    The original is kept when Pillow is missing, `output_format` is not one
+    of `OUTPUT_FORMATS`, the image cannot be decoded, or re-encoding would not
+    make it smaller. The hashes of the original are
+    filled in either way (the perceptual hash needs Pillow).
+    """
+    original = PreprocessedImage(
+        data=data,
+        content_type=content_type,
+        original_bytes=len(data),
+        content_hash=hashlib.sha256(data).hexdigest()
+    )
+    if Image is None:
+        return original
+
+    output_format = output_format.upper()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # Apply the EXIF orientation before the metadata is dropped
+            image = ImageOps.exif_transpose(image)
+            # Unknown formats keep the original bytes, so the content type still matches them
+            if max_dimension <= 0 or output_format not in _OUTPUT_CONTENT_TYPES:
+                return dataclasses.replace(original, perceptual_hash=difference_hash(image))
+            image.thumbnail((max_dimension, max_dimension))
+            # Hashed after downscaling (cheaper); the 9x8 hash hardly depends on the input size
+            original = dataclasses.replace(original, perceptual_hash=difference_hash(image))
+            if output_format == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            buffer = io.BytesIO()
+            # Saving without exif/icc arguments strips the metadata
+            image.save(buffer, format=output_format, quality=quality, optimize=True)
+    except Exception as e:
+        print(f"Image preprocessing skipped: {e}")
+        return original
+
+    processed = buffer.getvalue()
+    if len(processed) >= len(data):
+        return original
+    return dataclasses.replace(
+        original,
+        data=processed,
+        content_type=_OUTPUT_CONTENT_TYPES[output_format]
+    )
+
+
+def difference_hash(image: "Image.Image") -> int:
+    """
+    64-bit difference hash (dHash) of a decoded image.
+
+    The picture is reduced to 9x8 grayscale and each bit tells whether a pixel
+    is brighter than its right neighbour, so re-encoding, resizing and small
+    edits only flip a few bits. Compare hashes with `hamming_distance`.
+    """
+    small = image.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+async def preprocess_images(
+    images: List[Tuple[bytes, str]],
+    executor: Optional[Executor] = None,
+    max_dimension: int = 1536,
+    output_format: str = "WEBP",
+    quality: int = 85
+) -> List[PreprocessedImage]:
+    """
+    Preprocess `(data, content_type)` pairs concurrently in an executor.
+
+    Uses the loop's default thread pool unless an executor (thread or process pool) is given.
+    """
+    loop = asyncio.get_running_loop()
+    results = await asyncio.gather(*(
+        loop.run_in_executor(executor, preprocess_image, data, content_type, max_dimension, output_format, quality)
+        for data, content_type in images
+    ))
+
+    before = sum(result.original_bytes for result in results)
+    after = sum(len(result.data) for result in results)
+    print(f"Preprocessed {len(results)} images: {before} -> {after} bytes")
+    return list(results)
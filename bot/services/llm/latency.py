@@ -0,0 +1,40 @@
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent LLM call latencies per model.
+
+    Kept per `kind` too: complete calls ("complete") and the time to the first
+    chunk of a stream ("first_chunk") are not comparable.
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Args:
+            window: Latest latencies kept per model and kind.
+            min_samples: Samples needed before `percentile` returns a value.
+        """
+        self.window = max(1, window)
+        self.min_samples = max(1, min_samples)
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def observe(self, model: str, seconds: float, kind: str = "complete"):
+        samples = self._samples.get((model, kind))
+        if samples is None:
+            samples = self._samples[(model, kind)] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def percentile(self, model: str, fraction: float, kind: str = "complete") -> Optional[float]:
+        """Nearest-rank percentile of the window, or None while there are fewer than `min_samples`."""
+        samples = self._samples.get((model, kind))
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+    def count(self, model: str, kind: str = "complete") -> int:
+        samples = self._samples.get((model, kind))
+        return len(samples) if samples is not None else 0
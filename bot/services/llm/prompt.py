@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Union
+
+
+@dataclass(frozen=True)
+class Prompt:
+    """
+    A prompt split into a stable prefix and a variable suffix.
+
+    `system` holds the instructions shared by many calls (sent first, as the
+    system message, so providers with implicit prefix caching can reuse it); `user` holds what changes
+    every call, e.g. the chat log.
+    """
+    system: str
+    user: Union[str, List[Dict[str, Any]]]
+
@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class PromptCacheStats:
+    """Prompt tokens sent and the share the provider reported as read from its cache."""
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PromptCacheTracker:
+    """
+    Adds up the cached prompt tokens reported by the provider.
+
+    Nothing is cached explicitly: a `Prompt` sends its stable prefix first, and
+    providers with implicit prefix caching (Gemini 2.5, OpenAI) reuse a prefix
+    they have already seen once it reaches their minimum size (1024 tokens for
+    Gemini). This only measures how often that happens.
+    """
+
+    def __init__(self):
+        self._stats = PromptCacheStats()
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int):
+        self._stats.prompt_tokens += prompt_tokens
+        self._stats.cached_tokens += cached_tokens
+
+    def stats(self) -> PromptCacheStats:
+        """Return a snapshot of the counters."""
+        return PromptCacheStats(**vars(self._stats))
@@ -1,41 +1,450 @@
-import litellm
-from typing import Union, List, Dict, Any
+import asyncio
+import time
+from contextlib import contextmanager, nullcontext
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple, TypeVar, Union, List, Dict, Any
+
+from bot.core.metrics import LLM_ERRORS, LLM_HEDGED_CALLS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from .cache import ResponseCache
+from .latency import LatencyTracker
+from .prompt import Prompt
+from .prompt_cache import PromptCacheTracker
+from .routing import RoutingPolicy
+from .scheduler import LLMScheduler, Priority
+from .tokens import estimate_tokens
+
+T = TypeVar("T")
+
+# Rough input cost of one image part, used for rate limiting only
+IMAGE_TOKEN_ESTIMATE = 258
+
+def _litellm():
+    """Import litellm on first use: importing it takes seconds and would slow down startup."""
+    import litellm
+    return litellm
+
+
+async def prewarm():
+    """Import litellm in a worker thread so the first LLM call does not block the event loop on it."""
+    await asyncio.to_thread(_litellm)
+
 
 class LLMRepository:
-    def __init__(self, model_name: str, api_key: str):
+    def __init__(
+        self,
+        model_name: str,
+        api_key: str,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        routing: Optional[RoutingPolicy] = None,
+        latency: Optional[LatencyTracker] = None,
+        prompt_cache: Optional[PromptCacheTracker] = None,
+        completion: Optional[Callable[..., Awaitable[Any]]] = None
+    ):
         """
         Initialize the LLM Repository.
-        
+
         Args:
             model_name (str): The model identifier for litellm (e.g. 'gemini/gemini-2.5-flash').
-            api_key (str): The API key for the LLM provider.
+            api_key (str): The API key for the LLM provider. Models of other providers
+                (routing, hedging) get their key from litellm's environment variables.
+            cache (Optional[ResponseCache]): Response cache used by calls that opt in with `use_cache`.
+            scheduler (Optional[LLMScheduler]): Shared scheduler every call goes through
+                (concurrency, rate limits, priorities and retries).
+            routing (Optional[RoutingPolicy]): Small-prompt model and hedging. None always uses `model_name`.
+            latency (Optional[LatencyTracker]): Shared per-model latencies that set the hedging delays.
+            prompt_cache (Optional[PromptCacheTracker]): Adds up the prompt tokens the provider served from its cache.
+            completion (Optional[Callable[..., Awaitable[Any]]]): Backend with the signature of
+                `litellm.acompletion` (e.g. a stub in benchmarks). Defaults to litellm.
         """
         self.model_name = model_name
         self.api_key = api_key
+        self.cache = cache
+        self.scheduler = scheduler
+        self.routing = routing
+        self.latency = latency
+        self.prompt_cache = prompt_cache
+        self.completion = completion
 
-    async def generate_content(self, input_content: Union[str, List[Dict[str, Any]]]) -> str:
+    async def generate_content(
+        self,
+        input_content: Union[str, List[Dict[str, Any]], Prompt],
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE,
+        response_format: Optional[Dict[str, Any]] = None,
+        cacheable: Optional[Callable[[str], bool]] = None
+    ) -> str:
         """
         Generate content using the configured LLM.
 
         Args:
-            input_content (Union[str, List[Dict[str, Any]]]): The prompt (string) or complex content (list of dicts) to send.
+            input_content (Union[str, List[Dict[str, Any]], Prompt]): The prompt (string), complex content
+                (list of dicts) or a Prompt (stable system prefix + variable user content) to send.
+            use_cache (bool): Answer identical requests (same model and messages) from the response cache.
+            priority (Priority): Scheduler lane of the call.
+            response_format (Optional[Dict[str, Any]]): OpenAI-style structured output request
+                (e.g. `{"type": "json_schema", "json_schema": {...}}`), translated by litellm.
+            cacheable (Optional[Callable[[str], bool]]): Only responses it accepts are stored in the
+                response cache (e.g. structured output that parses).
 
         Returns:
             str: The generated response text.
         """
         try:
-            # Wrap string prompt in list of dicts for litellm consistency if needed, 
-            # but litellm handles string prompt too. 
-            # However, for consistency with 'messages' format:
-            messages = [{"role": "user", "content": input_content}]
-            
-            response = await litellm.acompletion(
-                model=self.model_name,
-                messages=messages,
-                api_key=self.api_key,
-                num_retries=3  # Retry on 503/Overload errors
-            )
-            return response.choices[0].message.content
+            messages = self._build_messages(input_content)
+            options = {"response_format": response_format} if response_format else {}
+            model = self._route(messages)
+
+            cache_key = self._cache_key(model, messages, options) if use_cache else None
+            if cache_key is not None:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    print(f"LLM response cache hit ({model})")
+                    return cached
+
+            delay = self._hedge_delay(model, priority, "complete")
+            if delay is None:
+                content = await self._complete(model, messages, options, priority)
+            else:
+                content = await self._hedge(
+                    lambda hedged_model: self._complete(hedged_model, messages, options, priority), model, delay
+                )
+
+            if cache_key is not None and content and (cacheable is None or cacheable(content)):
+                await self.cache.set(cache_key, content)
+            return content
         except Exception as e:
             print(f"Error generating content via LLMRepository: {e}")
             raise
+
+    async def cached_content(
+        self,
+        input_content: Union[str, List[Dict[str, Any]], Prompt],
+        response_format: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Return the response cache entry of a `generate_content` call, without calling the LLM.
+
+        Lets callers tell a cached answer from a fresh one. None on a miss or without a cache.
+        """
+        messages = self._build_messages(input_content)
+        options = {"response_format": response_format} if response_format else {}
+        cache_key = self._cache_key(self._route(messages), messages, options)
+        if cache_key is None:
+            return None
+        return await self.cache.get(cache_key)
+
+    async def stream_content(
+        self,
+        input_content: Union[str, List[Dict[str, Any]], Prompt],
+        use_cache: bool = False,
+        priority: Priority = Priority.INTERACTIVE
+    ) -> AsyncIterator[str]:
+        """
+        Generate content using the configured LLM, yielding text chunks as they arrive.
+
+        Args:
+            input_content (Union[str, List[Dict[str, Any]], Prompt]): The prompt (string), complex content
+                (list of dicts) or a Prompt (stable system prefix + variable user content) to send.
+            use_cache (bool): Answer identical requests from the response cache (as a single chunk)
+                and store the complete streamed text.
+            priority (Priority): Scheduler lane of the call. The scheduler slot is held
+                until the stream is consumed.
+
+        Yields:
+            str: Chunks of the generated response text.
+        """
+        try:
+            messages = self._build_messages(input_content)
+            model = self._route(messages)
+
+            cache_key = self._cache_key(model, messages) if use_cache else None
+            if cache_key is not None:
+                cached = await self.cache.get(cache_key)
+                if cached is not None:
+                    print(f"LLM response cache hit ({model})")
+                    yield cached
+                    return
+
+            # A stream is hedged on its first chunk: once it flows, the model is committed
+            delay = self._hedge_delay(model, priority, "first_chunk")
+            if delay is None:
+                stream = self._stream(model, messages, priority)
+                first = None
+            else:
+                stream, first = await self._hedge(
+                    lambda hedged_model: self._open_stream(hedged_model, messages, priority), model, delay
+                )
+
+            parts = []
+            try:
+                if first:
+                    parts.append(first)
+                    yield first
+                async for delta in stream:
+                    parts.append(delta)
+                    yield delta
+            finally:
+                await stream.aclose()
+
+            if cache_key is not None and parts:
+                await self.cache.set(cache_key, "".join(parts))
+        except Exception as e:
+            print(f"Error streaming content via LLMRepository: {e}")
+            raise
+
+    async def _complete(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Dict[str, Any],
+        priority: Priority
+    ) -> str:
+        """Run one completion call on `model` and return its text."""
+        with self._recording_errors(model):
+            if self.scheduler is None:
+                with self._timed(model, "complete"):
+                    response = await self._acompletion(
+                        model=model,
+                        messages=messages,
+                        api_key=self._api_key(model),
+                        num_retries=3,  # Retry on 503/Overload errors
+                        **options
+                    )
+            else:
+                # The scheduler retries 429/503 with jittered backoff instead of litellm
+                estimated = self._estimate_tokens(messages)
+
+                async def call():
+                    with self._timed(model, "complete"):
+                        return await self._acompletion(
+                            model=model,
+                            messages=messages,
+                            api_key=self._api_key(model),
+                            num_retries=0,
+                            **options
+                        )
+
+                response = await self.scheduler.run(call, priority=priority, estimated_tokens=estimated)
+                usage = getattr(response, "usage", None)
+                if usage is not None and usage.prompt_tokens:
+                    self.scheduler.record_usage(estimated, usage.prompt_tokens)
+            self._record_usage(model, getattr(response, "usage", None))
+            return response.choices[0].message.content
+
+    async def _stream(self, model: str, messages: List[Dict[str, Any]], priority: Priority) -> AsyncIterator[str]:
+        """Stream one completion of `model`, holding a scheduler slot until the stream is consumed."""
+        with self._recording_errors(model):
+            estimated = self._estimate_tokens(messages)
+
+            def call() -> Awaitable[Any]:
+                return self._acompletion(
+                    model=model,
+                    messages=messages,
+                    api_key=self._api_key(model),
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    num_retries=3 if self.scheduler is None else 0  # Retry on 503/Overload errors
+                )
+
+            usage = None
+            started = time.perf_counter()
+            with self._timed(model, "first_chunk") as first_chunk:
+                if self.scheduler is None:
+                    opened = nullcontext(await call())
+                else:
+                    # The scheduler retries 429/503 with jittered backoff outside the slot, like complete calls
+                    opened = self.scheduler.hold(call, priority=priority, estimated_tokens=estimated)
+                async with opened as response:
+                    async for chunk in response:
+                        usage = getattr(chunk, "usage", None) or usage # Sent with the last chunk
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            first_chunk.stop()
+                            yield delta
+            # Whole stream, including the time the consumer spent between chunks
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, model=model)
+            if self.scheduler is not None and usage is not None and usage.prompt_tokens:
+                self.scheduler.record_usage(estimated, usage.prompt_tokens)
+            self._record_usage(model, usage)
+
+    async def _open_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        priority: Priority
+    ) -> Tuple[AsyncIterator[str], Optional[str]]:
+        """Start a stream and wait for its first chunk (None if the response is empty)."""
+        stream = self._stream(model, messages, priority)
+        try:
+            return stream, await stream.__anext__()
+        except StopAsyncIteration:
+            return stream, None
+        except BaseException:
+            await stream.aclose()
+            raise
+
+    async def _hedge(self, call: Callable[[str], Awaitable[T]], model: str, delay: float) -> T:
+        """
+        Run `call(model)`; if it has not finished after `delay` seconds, also run
+        `call(hedge_model)`. The first successful result wins and the other call
+        is cancelled. Fails only if both calls fail (with the primary's error).
+        """
+        primary = asyncio.create_task(call(model))
+        tasks = [primary]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                winner = primary
+                return primary.result()
+
+            hedge_model = self.routing.hedge_model
+            print(f"LLM call to {model} slower than {delay:.1f}s, hedging with {hedge_model}")
+            tasks.append(asyncio.create_task(call(hedge_model)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in tasks if task in done and task.exception() is None), None)
+                if winner is not None:
+                    LLM_HEDGED_CALLS.inc(model=model, winner="primary" if winner is primary else "hedge")
+                    return winner.result()
+            LLM_HEDGED_CALLS.inc(model=model, winner="none")
+            raise primary.exception()
+        finally:
+            losers = [task for task in tasks if task is not winner]
+            for task in losers:
+                task.cancel()
+            for result in await asyncio.gather(*losers, return_exceptions=True):
+                # A loser that also got its answer: close its stream (and release its slot)
+                if isinstance(result, tuple) and hasattr(result[0], "aclose"):
+                    await result[0].aclose()
+
+    def _route(self, messages: List[Dict[str, Any]]) -> str:
+        if self.routing is None:
+            return self.model_name
+        return self.routing.route(self.model_name, self._estimate_tokens(messages))
+
+    def _hedge_delay(self, model: str, priority: Priority, kind: str) -> Optional[float]:
+        # Only calls a user is waiting on are worth a duplicate request
+        if self.routing is None or priority != Priority.INTERACTIVE:
+            return None
+        return self.routing.hedge_delay(model, self.latency, kind)
+
+    def _acompletion(self, **kwargs) -> Awaitable[Any]:
+        completion = self.completion or _litellm().acompletion
+        return completion(**kwargs)
+
+    def _api_key(self, model: str) -> Optional[str]:
+        """The configured key for models of the same provider; litellm's environment variables otherwise."""
+        if model == self.model_name or _provider(model) == _provider(self.model_name):
+            return self.api_key
+        return None
+
+    def _timed(self, model: str, kind: str) -> "_LatencyTimer":
+        return _LatencyTimer(self.latency, model, kind)
+
+    def _build_messages(self, input_content: Union[str, List[Dict[str, Any]], Prompt]) -> List[Dict[str, Any]]:
+        if isinstance(input_content, Prompt):
+            # Stable prefix first: providers with implicit caching reuse the start of the prompt
+            return [
+                {"role": "system", "content": input_content.system},
+                {"role": "user", "content": input_content.user},
+            ]
+        # Wrap string prompt in list of dicts for litellm consistency if needed,
+        # but litellm handles string prompt too.
+        # However, for consistency with 'messages' format:
+        return [{"role": "user", "content": input_content}]
+
+    def _record_usage(self, model: str, usage):
+        """Count the tokens the provider reported for a call."""
+        if usage is None:
+            return
+        LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, kind="prompt")
+        LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, kind="completion")
+        # Prompt tokens read from the provider's implicit prefix cache
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0) or 0
+        LLM_TOKENS.inc(cached_tokens, model=model, kind="cached")
+        if self.prompt_cache is not None:
+            self.prompt_cache.record_usage(prompt_tokens, cached_tokens)
+        if cached_tokens:
+            print(f"LLM prompt cache: {cached_tokens}/{prompt_tokens} prompt tokens cached ({model})")
+
+    @contextmanager
+    def _recording_errors(self, model: str):
+        """Count a failed call against the model it was sent to (routed or hedged), not the configured one."""
+        try:
+            yield
+        except Exception as e:
+            self._record_error(model, e)
+            raise
+
+    def _record_error(self, model: str, error: Exception):
+        LLM_ERRORS.inc(provider=_provider(model), error=type(error).__name__)
+
+    def _cache_key(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return ResponseCache.make_key(model, messages, options)
+
+    def _estimate_tokens(self, messages: List[Dict[str, Any]]) -> int:
+        """Estimate the input tokens of the messages for rate limiting."""
+        total = 0
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                total += estimate_tokens(content)
+                continue
+            for part in content:
+                if part.get("type") == "text":
+                    total += estimate_tokens(part["text"])
+                else:
+                    total += IMAGE_TOKEN_ESTIMATE
+        return total
+
+
+class _LatencyTimer:
+    """
+    Observe a call's latency in LLM_REQUEST_SECONDS ("complete" only) and the LatencyTracker.
+
+    Failed calls are not tracked. A call cancelled before it finished (e.g. the
+    loser of a hedge) is tracked with its elapsed time, a lower bound of its
+    latency, so the slow tail is not dropped from the statistics.
+    """
+
+    def __init__(self, tracker: Optional[LatencyTracker], model: str, kind: str):
+        self.tracker = tracker
+        self.model = model
+        self.kind = kind
+        self._started = 0.0
+        self._stopped = False
+
+    def __enter__(self) -> "_LatencyTimer":
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None or issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            self.stop()
+        elif self.kind == "complete":
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - self._started, model=self.model)
+
+    def stop(self):
+        """Record the latency now (once), e.g. when a stream's first chunk arrives."""
+        if self._stopped:
+            return
+        self._stopped = True
+        elapsed = time.perf_counter() - self._started
+        if self.kind == "complete":
+            LLM_REQUEST_SECONDS.observe(elapsed, model=self.model)
+        if self.tracker is not None:
+            self.tracker.observe(self.model, elapsed, self.kind)
+
+
+def _provider(model: str) -> str:
+    return model.split("/", 1)[0] if "/" in model else "unknown"
@@ -0,0 +1,43 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from .latency import LatencyTracker
+
+
+@dataclass
+class RoutingPolicy:
+    """
+    Which model serves an LLM call, and when it is hedged.
+
+    * Routing: prompts of at most `small_prompt_tokens` (estimated) go to
+      `small_model` instead of the repository's model.
+    * Hedging: an interactive call still unanswered after its model's
+      `hedge_percentile` latency (from the shared LatencyTracker, at least
+      `hedge_min_delay` seconds) is sent again to `hedge_model`. The first
+      answer wins and the other call is cancelled.
+    """
+    small_model: Optional[str] = None
+    small_prompt_tokens: int = 2000
+    hedge_model: Optional[str] = None
+    hedge_percentile: float = 0.95
+    hedge_min_delay: float = 1.0
+
+    def route(self, model: str, estimated_tokens: int) -> str:
+        """Return the model that should serve a prompt of `estimated_tokens`."""
+        if self.small_model and estimated_tokens <= self.small_prompt_tokens:
+            return self.small_model
+        return model
+
+    def hedge_delay(self, model: str, latency: Optional[LatencyTracker], kind: str = "complete") -> Optional[float]:
+        """
+        Seconds after which a call to `model` is hedged.
+
+        None disables hedging: no hedge model (or the same one), or not enough
+        latency samples of `model` yet.
+        """
+        if not self.hedge_model or self.hedge_model == model or latency is None:
+            return None
+        threshold = latency.percentile(model, self.hedge_percentile, kind)
+        if threshold is None:
+            return None
+        return max(self.hedge_min_delay, threshold)
@@ -0,0 +1,255 @@
+import asyncio
+import email.utils
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Provider errors worth retrying: rate limits, timeouts and overloads
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class Priority(IntEnum):
+    """Scheduling lanes. Lower values are served first."""
+    INTERACTIVE = 0  # A user is waiting on the response (e.g. /meal)
+    BULK = 1         # Background or fan-out work (e.g. chunk summaries)
+
+
+@dataclass
+class SchedulerStats:
+    """Snapshot of the scheduler state."""
+    queue_depth: int = 0
+    active: int = 0
+    completed: int = 0
+    retried: int = 0
+    average_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self._clock = clock
+        self._level = self.capacity
+        self._updated = clock()
+
+    def delay_for(self, amount: float) -> float:
+        """Seconds until `amount` can be consumed (requests larger than the bucket wait for a full one)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self._level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """Take `amount` out of the bucket. Negative amounts give tokens back; the level may go below zero."""
+        self._refill()
+        self._level = min(self.capacity, self._level - amount)
+
+    def _refill(self):
+        now = self._clock()
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class LLMScheduler:
+    """
+    Process-wide gate for LLM calls.
+
+    Every call waits for a slot: at most `max_concurrency` calls run at once,
+    optional token buckets enforce requests and tokens per minute, and waiting
+    calls are served by priority (then FIFO). `run` and `hold` also retry rate
+    limits and overloads with jittered backoff, honouring the provider's Retry-After.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 3,
+        base_backoff: float = 1.0,
+        max_backoff: float = 30.0
+    ):
+        """
+        Args:
+            max_concurrency: Max LLM calls in flight across the whole bot.
+            requests_per_minute: Request rate limit. None disables it.
+            tokens_per_minute: Token rate limit (estimated input tokens, corrected with
+                reported usage). None disables it.
+            max_retries: Retries of retryable errors in `run`.
+            base_backoff: Base of the exponential backoff, in seconds.
+            max_backoff: Upper bound of a single backoff, in seconds.
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._stats = SchedulerStats()
+        self._total_wait = 0.0
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority = Priority.INTERACTIVE,
+        estimated_tokens: int = 0
+    ) -> T:
+        """Run `call()` in a slot, retrying retryable provider errors outside the slot."""
+        async with self.hold(call, priority, estimated_tokens) as result:
+            return result
+
+    @asynccontextmanager
+    async def hold(
+        self,
+        call: Callable[[], Awaitable[T]],
+        priority: Priority = Priority.INTERACTIVE,
+        estimated_tokens: int = 0
+    ) -> AsyncIterator[T]:
+        """
+        Run `call()` like `run`, then keep its slot for the duration of the block
+        (e.g. while consuming the stream `call` opened).
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, estimated_tokens)
+            try:
+                result = await call()
+                break
+            except BaseException as e:
+                self._release()
+                if not isinstance(e, Exception) or attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                error = e
+                delay = self._backoff(attempt, _retry_after(e))
+            self._stats.retried += 1
+            print(f"LLM call failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        try:
+            yield result
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.INTERACTIVE, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """Hold a slot for the duration of the block (e.g. while consuming a stream)."""
+        await self._acquire(priority, estimated_tokens)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket once the provider reported the real usage."""
+        if self._tokens is not None:
+            self._tokens.consume(actual_tokens - estimated_tokens)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter[3].done())
+
+    def stats(self) -> SchedulerStats:
+        """Return a snapshot of queue depth, activity and wait times."""
+        started = self._stats.completed + self._active
+        return SchedulerStats(
+            queue_depth=self.queue_depth,
+            active=self._active,
+            completed=self._stats.completed,
+            retried=self._stats.retried,
+            average_wait=self._total_wait / started if started else 0.0,
+            max_wait=self._stats.max_wait
+        )
+
+    async def _acquire(self, priority: Priority, estimated_tokens: int):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        enqueued_at = time.monotonic()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), estimated_tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release() # Granted right before the cancellation
+            raise
+        wait = time.monotonic() - enqueued_at
+        self._total_wait += wait
+        self._stats.max_wait = max(self._stats.max_wait, wait)
+
+    def _release(self):
+        self._active -= 1
+        self._stats.completed += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant slots to the highest priority waiters the limits allow."""
+        while self._waiters and self._active < self.max_concurrency:
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters) # Cancelled while waiting
+                continue
+
+            delay = 0.0
+            if self._requests is not None:
+                delay = max(delay, self._requests.delay_for(1))
+            if self._tokens is not None:
+                delay = max(delay, self._tokens.delay_for(tokens))
+            if delay > 0:
+                # The head keeps its place; lower priorities must not overtake it
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+
+            heapq.heappop(self._waiters)
+            if self._requests is not None:
+                self._requests.consume(1)
+            if self._tokens is not None:
+                self._tokens.consume(tokens)
+            self._active += 1
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            # Spread callers that got the same Retry-After instead of retrying in lockstep
+            return retry_after + random.uniform(0, self.base_backoff)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+
+def _is_retryable(error: Exception) -> bool:
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Read the Retry-After header (seconds or HTTP date) from a provider error, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        headers = getattr(error, "litellm_response_headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,12 @@
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local estimate of how many tokens a text costs.
+
+    No tokenizer is loaded: ASCII averages roughly 4 characters per token,
+    while CJK and other non-ASCII characters are closer to one token each.
+    Good enough for budgeting, not for billing.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
@@ -1,16 +1,76 @@
+import asyncio
 import base64
 import httpx
+from typing import List, Optional
 
-async def download_and_encode_image(url: str) -> str:
+DEFAULT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+
+class ImageTooLargeError(Exception):
+    """Raised when an image exceeds the allowed download size."""
+    def __init__(self, url: str, max_bytes: int):
+        self.url = url
+        self.max_bytes = max_bytes
+        super().__init__(f"Image exceeds {max_bytes} bytes: {url}")
+
+
+async def download_image(
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    max_bytes: int = DEFAULT_MAX_IMAGE_BYTES
+) -> bytes:
+    """
+    Download an image, streaming the body and aborting once it exceeds max_bytes.
+
+    Uses the given (pooled) client if provided, otherwise a short-lived one.
+    """
+    if client is None:
+        async with httpx.AsyncClient() as own_client:
+            return await download_image(url, own_client, max_bytes)
+
+    async with client.stream("GET", url) as response:
+        if response.status_code != 200:
+            raise Exception(f"Failed to download image: HTTP {response.status_code}")
+
+        content_length = response.headers.get("Content-Length")
+        if content_length is not None and int(content_length) > max_bytes:
+            raise ImageTooLargeError(url, max_bytes)
+
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > max_bytes:
+                raise ImageTooLargeError(url, max_bytes)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+
+async def download_images(
+    urls: List[str],
+    client: Optional[httpx.AsyncClient] = None,
+    max_concurrency: int = 3,
+    max_bytes: int = DEFAULT_MAX_IMAGE_BYTES
+) -> List[bytes]:
+    """Download several images concurrently (at most max_concurrency at once), keeping their order."""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def download(url: str) -> bytes:
+        async with semaphore:
+            return await download_image(url, client, max_bytes)
+
+    return await asyncio.gather(*(download(url) for url in urls))
+
+
+async def download_and_encode_image(
+    url: str,
+    client: Optional[httpx.AsyncClient] = None,
+    max_bytes: int = DEFAULT_MAX_IMAGE_BYTES
+) -> str:
     """Download image from URL and return base64 encoded string."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            if response.status_code == 200:
-                image_data = response.content
-                return base64.b64encode(image_data).decode('utf-8')
-            else:
-                raise Exception(f"Failed to download image: HTTP {response.status_code}")
+        image_data = await download_image(url, client, max_bytes)
+        return base64.b64encode(image_data).decode('utf-8')
     except Exception as e:
         print(f"Error downloading image: {e}")
         raise